@@ -0,0 +1,177 @@
+"""Compares insert throughput and index size of measurement table layouts.
+
+- legacy: random uuid4 primary key indexed twice, separate device_id and
+  timestamp B-tree indexes and the (device_id, timestamp, id) keyset index
+  (the layout before partitioning)
+- compact: time-ordered uuid7 primary key, one (device_id, timestamp, id)
+  index and a BRIN index on timestamp
+- covering: compact with x, y and z included in the composite index, so
+  window stats are index-only scans
+
+Rows are written with COPY into temporary tables of the configured database.
+
+Run with `poetry run python -m benchmarks.ingest_benchmark [--rows N ...]`.
+"""
+
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+import random
+import time
+from typing import Any, Callable, Dict, List
+import uuid
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.settings import settings
+from src.utils import uuid7
+
+COLUMNS = ["id", "device_id", "timestamp", "x", "y", "z"]
+LAYOUTS: Dict[str, Dict[str, Any]] = {
+    "legacy": {
+        "id": uuid.uuid4,
+        "ddl": [
+            "CREATE TEMP TABLE bench_legacy (id uuid PRIMARY KEY, device_id uuid, "
+            "timestamp timestamp, x float8, y float8, z float8)",
+            "CREATE INDEX ON bench_legacy (id)",
+            "CREATE INDEX ON bench_legacy (device_id)",
+            "CREATE INDEX ON bench_legacy (timestamp)",
+            "CREATE INDEX ON bench_legacy (device_id, timestamp, id)",
+        ],
+    },
+    "compact": {
+        "id": uuid7,
+        "ddl": [
+            "CREATE TEMP TABLE bench_compact (id uuid, device_id uuid, "
+            "timestamp timestamp, x float8, y float8, z float8, "
+            "PRIMARY KEY (id, timestamp))",
+            "CREATE INDEX ON bench_compact (device_id, timestamp, id)",
+            "CREATE INDEX ON bench_compact USING brin (timestamp)",
+        ],
+    },
+    "covering": {
+        "id": uuid7,
+        "ddl": [
+            "CREATE TEMP TABLE bench_covering (id uuid, device_id uuid, "
+            "timestamp timestamp, x float8, y float8, z float8, "
+            "PRIMARY KEY (id, timestamp))",
+            "CREATE INDEX ON bench_covering (device_id, timestamp, id) "
+            "INCLUDE (x, y, z)",
+            "CREATE INDEX ON bench_covering USING brin (timestamp)",
+        ],
+    },
+}
+# Stats of one device over a tenth of the rows, as the stats endpoint runs it
+STATS_QUERY = (
+    "SELECT min(x), max(x), count(x), sum(x), "
+    "percentile_cont(0.5) WITHIN GROUP (ORDER BY x) FROM {table} "
+    "WHERE device_id = :device_id AND timestamp >= :start AND timestamp <= :end"
+)
+
+
+def make_batch(
+    new_id: Callable[[], uuid.UUID],
+    devices: List[uuid.UUID],
+    start: datetime,
+    size: int,
+) -> List[tuple]:
+    return [
+        (
+            new_id(),
+            random.choice(devices),
+            start + timedelta(milliseconds=i),
+            random.gauss(0, 1),
+            random.gauss(0, 1),
+            random.gauss(0, 1),
+        )
+        for i in range(size)
+    ]
+
+
+async def _timed(connection: Any, query: str, params: Dict[str, Any]) -> float:
+    began = time.perf_counter()
+    await connection.execute(text(query), params)
+    return time.perf_counter() - began
+
+
+async def run(rows: int, batch_size: int, devices_count: int) -> None:
+    # Autocommit: every COPY is its own transaction and VACUUM may run
+    engine = create_async_engine(
+        settings.db_connection_url, isolation_level="AUTOCOMMIT"
+    )
+    devices = [uuid.uuid4() for _ in range(devices_count)]
+    try:
+        async with engine.connect() as connection:
+            raw_connection = await connection.get_raw_connection()
+            driver_connection: Any = raw_connection.driver_connection
+            for name, layout in LAYOUTS.items():
+                table = f"bench_{name}"
+                for statement in layout["ddl"]:
+                    await connection.execute(text(statement))
+
+                elapsed = 0.0
+                start = datetime(2025, 1, 1)
+                for offset in range(0, rows, batch_size):
+                    batch = make_batch(
+                        layout["id"],
+                        devices,
+                        start + timedelta(milliseconds=offset),
+                        min(batch_size, rows - offset),
+                    )
+                    began = time.perf_counter()
+                    await driver_connection.copy_records_to_table(
+                        table, records=batch, columns=COLUMNS
+                    )
+                    elapsed += time.perf_counter() - began
+
+                await connection.execute(text(f"VACUUM ANALYZE {table}"))
+                window_start = start + timedelta(milliseconds=rows // 2)
+                window = {
+                    "device_id": devices[0],
+                    "start": window_start,
+                    "end": window_start + timedelta(milliseconds=rows // 10),
+                }
+                query_time = min(
+                    [
+                        await _timed(
+                            connection, STATS_QUERY.format(table=table), window
+                        )
+                        for _ in range(5)
+                    ]
+                )
+
+                table_size, indexes_size = (
+                    await connection.execute(
+                        text(
+                            f"SELECT pg_table_size('{table}'), "
+                            f"pg_indexes_size('{table}')"
+                        )
+                    )
+                ).one()
+                print(
+                    f"{name:>8} {rows / elapsed:>12,.0f} "
+                    f"{table_size / 2**20:>10.1f} {indexes_size / 2**20:>11.1f} "
+                    f"{query_time * 1000:>9.2f}"
+                )
+                await connection.execute(text(f"DROP TABLE {table}"))
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--devices", type=int, default=100)
+    args = parser.parse_args()
+
+    print(
+        f"{'layout':>8} {'rows/s':>12} {'table, MB':>10} {'indexes, MB':>11} "
+        f"{'stats, ms':>9}"
+    )
+    asyncio.run(run(args.rows, args.batch_size, args.devices))
+
+
+if __name__ == "__main__":
+    main()
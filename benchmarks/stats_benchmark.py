@@ -0,0 +1,74 @@
+"""Compares the NumPy stats engine with the former pure Python implementation.
+
+Run with `poetry run python -m benchmarks.stats_benchmark [--samples N ...]`.
+"""
+
+import argparse
+import random
+import timeit
+from typing import Any, Dict, List, Sequence
+
+from src.database.aggregates import AXES
+from src.stats import describe, to_columns
+
+
+def python_stats(values: List[float]) -> Dict[str, Any]:
+    """Former per-axis implementation: sort plus separate min/max/sum passes."""
+    sorted_values = sorted(values)
+    count = len(sorted_values)
+    return {
+        "min": min(sorted_values),
+        "max": max(sorted_values),
+        "count": count,
+        "sum": sum(sorted_values),
+        "median": (
+            sorted_values[count // 2]
+            if count % 2
+            else (sorted_values[count // 2 - 1] + sorted_values[count // 2]) / 2
+        ),
+    }
+
+
+def run_python(rows: Sequence[Sequence[float]]) -> Dict[str, Dict[str, Any]]:
+    return {
+        axis: python_stats([row[i] for row in rows]) for i, axis in enumerate(AXES)
+    }
+
+
+def run_numpy(rows: Sequence[Sequence[float]]) -> Dict[str, Dict[str, Any]]:
+    return describe(to_columns(rows))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--samples", type=int, nargs="+", default=[1_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'samples':>10} {'python, ms':>12} {'numpy, ms':>12} {'speedup':>8}")
+    for samples in args.samples:
+        rows = [
+            (random.gauss(0, 1), random.gauss(0, 1), random.gauss(0, 1))
+            for _ in range(samples)
+        ]
+        python_result, numpy_result = run_python(rows), run_numpy(rows)
+        for axis in AXES:
+            difference = python_result[axis]["median"] - numpy_result[axis]["median"]
+            assert abs(difference) < 1e-9
+
+        python_time = min(
+            timeit.repeat(lambda: run_python(rows), number=1, repeat=args.repeat)
+        )
+        numpy_time = min(
+            timeit.repeat(lambda: run_numpy(rows), number=1, repeat=args.repeat)
+        )
+        print(
+            f"{samples:>10} {python_time * 1000:>12.2f} {numpy_time * 1000:>12.2f} "
+            f"{python_time / numpy_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
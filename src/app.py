@@ -1,3 +1,4 @@
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
@@ -10,7 +11,13 @@ from src.settings import settings
 from src.routes.healthchecks.views import router as health_router
 from src.routes.devices.views import router as devices_router
 from src.routes.users.views import router as users_router
+from src.routes.metrics.views import router as metrics_router
+from src.routes.devices.ingest_buffer import ingest_buffer
+from src.database.archive import run_archive
+from src.database.blocks import run_compaction
 from src.database.database import sessionmanager
+from src.database.partitions import run_partition_maintenance
+from src.database.retention import run_retention
 
 
 def create_app(init_db: bool = True) -> FastAPI:
@@ -18,6 +25,11 @@ def create_app(init_db: bool = True) -> FastAPI:
 
     Initializes core application components including:
     - Database connection management
+    - Write-behind measurement ingest buffer (`ingest_mode = "buffered"`)
+    - Creation of future measurement partitions
+    - Retention of measurements and aggregates (`retention_enabled`)
+    - Parquet archive of old measurements (`archive_enabled`)
+    - Compaction of measurements into compressed blocks (`blocks_enabled`)
     - Middleware (CORS, logging)
     - API routes
 
@@ -33,7 +45,33 @@ def create_app(init_db: bool = True) -> FastAPI:
 
         @asynccontextmanager
         async def lifespan(app: FastAPI):
+            if settings.ingest_mode == "buffered":
+                ingest_buffer.start()
+            background_tasks = [
+                asyncio.create_task(
+                    run_partition_maintenance(settings.partition_maintenance_interval)
+                )
+            ]
+            if settings.retention_enabled:
+                background_tasks.append(
+                    asyncio.create_task(run_retention(settings.retention_interval))
+                )
+            if settings.blocks_enabled:
+                background_tasks.append(
+                    asyncio.create_task(
+                        run_compaction(settings.block_compaction_interval)
+                    )
+                )
+            if settings.archive_enabled:
+                background_tasks.append(
+                    asyncio.create_task(run_archive(settings.archive_interval))
+                )
             yield
+            for task in background_tasks:
+                task.cancel()
+            # Let cancelled jobs roll back before their connections are closed
+            await asyncio.gather(*background_tasks, return_exceptions=True)
+            await ingest_buffer.stop()
             if sessionmanager._engine is not None:
                 await sessionmanager.close()
 
@@ -58,5 +96,6 @@ def create_app(init_db: bool = True) -> FastAPI:
     app.include_router(users_router)
     app.include_router(devices_router)
     app.include_router(health_router)
+    app.include_router(metrics_router)
 
     return app
@@ -0,0 +1,54 @@
+from typing import Any, List
+
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import Measurement
+
+AXES = ("x", "y", "z")
+
+
+def supports_percentile(session: AsyncSession) -> bool:
+    """Whether the session backend implements `percentile_cont ... WITHIN GROUP`."""
+    return session.get_bind().dialect.name == "postgresql"
+
+
+def measurement_stats_columns(with_median: bool = True) -> List[Any]:
+    """Aggregate columns (min, max, count, sum and median) for every axis.
+
+    Columns are labeled `<axis>_<stat>`, e.g. `x_min`, so a single result row
+    can be turned into stats with `stats_from_row`.
+
+    Args:
+        with_median (bool): Include `percentile_cont(0.5)` median columns.
+            Pass False for backends without ordered-set aggregates.
+    """
+    columns: List[Any] = []
+    for axis in AXES:
+        column = getattr(Measurement, axis)
+        columns += [
+            func.min(column).label(f"{axis}_min"),
+            func.max(column).label(f"{axis}_max"),
+            func.count(column).label(f"{axis}_count"),
+            func.sum(column).label(f"{axis}_sum"),
+        ]
+        if with_median:
+            columns.append(
+                func.percentile_cont(0.5).within_group(column).label(f"{axis}_median")
+            )
+    return columns
+
+
+def stats_from_row(row: Any, axis: str) -> dict:
+    """Extracts stats of one axis from a row selected with measurement_stats_columns.
+
+    Empty groups (NULL aggregates) are reported as zeros.
+    """
+    mapping = row._mapping
+    return {
+        "min": mapping[f"{axis}_min"] or 0.0,
+        "max": mapping[f"{axis}_max"] or 0.0,
+        "count": mapping[f"{axis}_count"] or 0,
+        "sum": mapping[f"{axis}_sum"] or 0.0,
+        "median": mapping.get(f"{axis}_median") or 0.0,
+    }
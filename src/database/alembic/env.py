@@ -6,6 +6,7 @@ from sqlalchemy import Connection, engine_from_config, pool
 from sqlalchemy.ext.asyncio import AsyncEngine
 
 from src.database.models import Base
+from src.database.partitions import PARTITION_NAME_PATTERN
 from src.settings import settings
 
 # this is the Alembic Config object, which provides
@@ -24,6 +25,12 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 target_metadata = Base.metadata
 
+
+def include_name(name, type_, parent_names) -> bool:
+    # Measurement partitions are created at runtime, not part of the models
+    return not (type_ == "table" and PARTITION_NAME_PATTERN.match(name or ""))
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -46,6 +53,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_name=include_name,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -56,7 +64,12 @@ def run_migrations_offline() -> None:
 
 async def run_migrations_online() -> None:
     def run_migrations(connection: Connection) -> None:
-        context.configure(connection=connection, target_metadata=target_metadata, compare_type=True)
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_name=include_name,
+            compare_type=True,
+        )
 
         with context.begin_transaction():
             context.run_migrations()
@@ -0,0 +1,110 @@
+"""partition measurements by month
+
+Revision ID: c529eb41e687
+Revises: c3f63c71bb1e
+Create Date: 2026-10-17 02:21:37.104955
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c529eb41e687'
+down_revision: Union[str, None] = 'c3f63c71bb1e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Partitions created ahead of the current month, the application keeps
+# creating them afterwards (`partition_months_ahead`).
+MONTHS_AHEAD = 3
+
+
+def _month_index(value: datetime) -> int:
+    return value.year * 12 + value.month - 1
+
+
+def _month(index: int) -> str:
+    return f"{index // 12:04d}-{index % 12 + 1:02d}-01"
+
+
+def _create_measurements_table(name: str, **kwargs) -> None:
+    op.create_table(name,
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('device_id', sa.UUID(), nullable=False),
+    sa.Column('timestamp', sa.DateTime(), nullable=False),
+    sa.Column('x', sa.Float(), nullable=False),
+    sa.Column('y', sa.Float(), nullable=False),
+    sa.Column('z', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['device_id'], ['devices.id'], ),
+    **kwargs
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.rename_table('measurements', 'measurements_unpartitioned')
+    op.execute(
+        'ALTER TABLE measurements_unpartitioned '
+        'RENAME CONSTRAINT measurements_pkey TO measurements_unpartitioned_pkey'
+    )
+    op.drop_index('ix_measurements_device_id_timestamp_id', table_name='measurements_unpartitioned')
+    op.drop_index('ix_measurements_timestamp', table_name='measurements_unpartitioned')
+    op.drop_index('ix_measurements_id', table_name='measurements_unpartitioned')
+    op.drop_index('ix_measurements_device_id', table_name='measurements_unpartitioned')
+
+    # The partition key must be part of the primary key. The old `id` and
+    # `device_id` indexes are dropped: the first duplicated the primary key,
+    # the second is a prefix of the (device_id, timestamp, id) index.
+    _create_measurements_table(
+        'measurements',
+        postgresql_partition_by='RANGE (timestamp)',
+    )
+    op.create_primary_key('measurements_pkey', 'measurements', ['id', 'timestamp'])
+    op.create_index('ix_measurements_timestamp', 'measurements', ['timestamp'], unique=False)
+    op.create_index('ix_measurements_device_id_timestamp_id', 'measurements', ['device_id', 'timestamp', 'id'], unique=False)
+
+    first, last = op.get_bind().execute(
+        sa.text('SELECT min(timestamp), max(timestamp) FROM measurements_unpartitioned')
+    ).one()
+    now = _month_index(datetime.now())
+    start = _month_index(first) if first else now
+    end = max(_month_index(last) if last else now, now) + MONTHS_AHEAD
+    for index in range(start, end + 1):
+        op.execute(
+            f"CREATE TABLE measurements_p{index // 12:04d}{index % 12 + 1:02d} "
+            f"PARTITION OF measurements "
+            f"FOR VALUES FROM ('{_month(index)}') TO ('{_month(index + 1)}')"
+        )
+
+    op.execute(
+        'INSERT INTO measurements (id, device_id, timestamp, x, y, z) '
+        'SELECT id, device_id, timestamp, x, y, z FROM measurements_unpartitioned'
+    )
+    op.drop_table('measurements_unpartitioned')
+    op.execute('ANALYZE measurements')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _create_measurements_table('measurements_unpartitioned')
+    op.execute(
+        'INSERT INTO measurements_unpartitioned (id, device_id, timestamp, x, y, z) '
+        'SELECT id, device_id, timestamp, x, y, z FROM measurements'
+    )
+    # Dropping the parent drops all of its partitions
+    op.drop_table('measurements')
+    op.rename_table('measurements_unpartitioned', 'measurements')
+    op.execute(
+        'ALTER TABLE measurements RENAME CONSTRAINT '
+        'measurements_unpartitioned_device_id_fkey TO measurements_device_id_fkey'
+    )
+
+    op.create_primary_key('measurements_pkey', 'measurements', ['id'])
+    op.create_index(op.f('ix_measurements_device_id'), 'measurements', ['device_id'], unique=False)
+    op.create_index(op.f('ix_measurements_id'), 'measurements', ['id'], unique=False)
+    op.create_index(op.f('ix_measurements_timestamp'), 'measurements', ['timestamp'], unique=False)
+    op.create_index('ix_measurements_device_id_timestamp_id', 'measurements', ['device_id', 'timestamp', 'id'], unique=False)
@@ -0,0 +1,42 @@
+"""device serial number c collation
+
+Revision ID: 0192c7db90df
+Revises: 331cba048b91
+Create Date: 2026-10-17 02:37:51.132937
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0192c7db90df'
+down_revision: Union[str, None] = '331cba048b91'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Not detected by autogenerate. Rebuilds the unique index with the new
+    # collation.
+    op.alter_column(
+        'devices',
+        'serial_number',
+        existing_type=sa.String(length=30),
+        type_=sa.String(length=30, collation='C'),
+        existing_nullable=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.alter_column(
+        'devices',
+        'serial_number',
+        existing_type=sa.String(length=30, collation='C'),
+        type_=sa.String(length=30),
+        existing_nullable=False,
+    )
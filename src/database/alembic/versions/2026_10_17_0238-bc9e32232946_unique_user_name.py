@@ -0,0 +1,29 @@
+"""unique user name
+
+Revision ID: bc9e32232946
+Revises: 0192c7db90df
+Create Date: 2026-10-17 02:38:43.297865
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bc9e32232946'
+down_revision: Union[str, None] = '0192c7db90df'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Fails if duplicate names slipped past the old check-then-insert
+    op.create_unique_constraint('users_name_key', 'users', ['name'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('users_name_key', 'users', type_='unique')
@@ -0,0 +1,557 @@
+"""Cold-tier archive of old measurements in Parquet files.
+
+Measurements older than `archive_after_days` are moved, one day at a time,
+from the database into `<archive_path>/date=YYYY-MM-DD/part-<id>.parquet`
+files. Rows are sorted by (device_id, timestamp) and written in row groups
+of ARCHIVE_ROW_GROUP_SIZE rows, so reads of one device and time window only
+open the day directories of the window (directory pruning), only decode the
+row groups whose statistics match (row-group pruning) and only the columns
+they need (column pruning).
+
+Compacted measurement blocks (src/database/blocks.py) are archived along with
+the raw rows of their day. Late samples of an already archived day land in
+the database again and are archived into another part file of that day by
+the next run. Every read of measurements merges archived rows back in, see
+src/database/tiers.py.
+
+Requires the optional `pyarrow` package.
+"""
+
+import asyncio
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+import os
+from pathlib import Path
+from typing import Any, AsyncGenerator, Dict, List, Optional, Sequence, Tuple
+import uuid
+
+import numpy as np
+from numpy.typing import NDArray
+import structlog
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.aggregates import AXES
+from src.database.blocks import BlockRow, Samples, block_rows
+from src.database.database import sessionmanager
+from src.database.models import Measurement, MeasurementBlock
+from src.settings import settings
+from src.stats import Columns
+
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.dataset as ds  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except ImportError:
+    pa = None
+    ds = None
+    pq = None
+
+ARCHIVE_ROW_GROUP_SIZE = 65_536
+ARCHIVE_DAY_PREFIX = "date="
+
+# (id, device_id, timestamp, x, y, z)
+ArchivedRow = Tuple[uuid.UUID, uuid.UUID, datetime, float, float, float]
+
+logger = structlog.get_logger(__name__)
+
+
+def _archive_root() -> Path:
+    return Path(settings.archive_path)
+
+
+def _day_path(day: date) -> Path:
+    return _archive_root() / f"{ARCHIVE_DAY_PREFIX}{day.isoformat()}"
+
+
+def archived_days(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> List[date]:
+    """Ascending days with archived measurements, optionally within a window."""
+    root = _archive_root()
+    if not root.is_dir():
+        return []
+
+    days = []
+    for name in os.listdir(root):
+        if not name.startswith(ARCHIVE_DAY_PREFIX):
+            continue
+        day = date.fromisoformat(name[len(ARCHIVE_DAY_PREFIX):])
+        if start_date is not None and day < start_date.date():
+            continue
+        if end_date is not None and day > end_date.date():
+            continue
+        days.append(day)
+    return sorted(days)
+
+
+def _arrow_schema():
+    return pa.schema(
+        [
+            ("id", pa.string()),
+            ("device_id", pa.string()),
+            ("timestamp", pa.timestamp("us")),
+            ("x", pa.float64()),
+            ("y", pa.float64()),
+            ("z", pa.float64()),
+        ]
+    )
+
+
+def _write_segment(day: date, rows: Sequence[Any]) -> Path:
+    """Writes rows to a new part file of the day, visible only once complete."""
+    rows = sorted(rows, key=lambda row: (str(row[1]), row[2]))
+    ids, device_ids, timestamps, xs, ys, zs = zip(*rows)
+    table = pa.table(
+        [
+            pa.array([str(value) for value in ids], pa.string()),
+            pa.array([str(value) for value in device_ids], pa.string()),
+            pa.array(timestamps, pa.timestamp("us")),
+            pa.array(xs, pa.float64()),
+            pa.array(ys, pa.float64()),
+            pa.array(zs, pa.float64()),
+        ],
+        schema=_arrow_schema(),
+    )
+
+    directory = _day_path(day)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"part-{uuid.uuid4().hex}.parquet"
+    partial = path.with_suffix(".partial")
+    pq.write_table(
+        table,
+        partial,
+        row_group_size=ARCHIVE_ROW_GROUP_SIZE,
+        compression="zstd",
+        write_statistics=True,
+    )
+    with open(partial, "rb") as file:
+        os.fsync(file.fileno())
+    partial.rename(path)
+    return path
+
+
+async def _day_device_counts(
+    session: AsyncSession, start: datetime, end: datetime
+) -> Dict[uuid.UUID, int]:
+    """Number of raw and compacted measurements of every device in [start, end)."""
+    counts: Dict[uuid.UUID, int] = defaultdict(int)
+    raw = (
+        select(Measurement.device_id, func.count())
+        .where(Measurement.timestamp >= start, Measurement.timestamp < end)
+        .group_by(Measurement.device_id)
+    )
+    compacted = (
+        select(MeasurementBlock.device_id, func.sum(MeasurementBlock.count))
+        .where(
+            MeasurementBlock.block_start >= start,
+            MeasurementBlock.block_start < end,
+        )
+        .group_by(MeasurementBlock.device_id)
+    )
+    for stmt in (raw, compacted):
+        for device_id, count in (await session.execute(stmt)).all():
+            counts[device_id] += count
+    return counts
+
+
+def _device_batches(counts: Dict[uuid.UUID, int]) -> List[List[uuid.UUID]]:
+    """Groups devices in batches of about `archive_batch_size` measurements."""
+    batches: List[List[uuid.UUID]] = [[]]
+    size = 0
+    for device_id in sorted(counts):
+        if batches[-1] and size + counts[device_id] > settings.archive_batch_size:
+            batches.append([])
+            size = 0
+        batches[-1].append(device_id)
+        size += counts[device_id]
+    return batches
+
+
+async def archive_day(session: AsyncSession, day: date) -> int:
+    """Moves the measurements of one day into Parquet part files.
+
+    Devices are archived in batches of about `archive_batch_size`
+    measurements (see `archive_devices`), so memory and locks are bounded by
+    a batch and not by the day.
+
+    Returns:
+        int: Number of archived measurements
+    """
+    start = datetime.combine(day, time())
+    end = start + timedelta(days=1)
+    counts = await _day_device_counts(session, start, end)
+    await session.rollback()
+
+    archived = 0
+    for device_ids in _device_batches(counts):
+        if device_ids:
+            archived += await archive_devices(session, device_ids, start, end)
+    logger.info("archive: day archived", day=day.isoformat(), count=archived)
+    return archived
+
+
+async def archive_devices(
+    session: AsyncSession,
+    device_ids: List[uuid.UUID],
+    start: datetime,
+    end: datetime,
+) -> int:
+    """Moves measurements of some devices in [start, end) into a part file.
+
+    The rows are deleted and returned by one statement and the transaction is
+    committed only after the file is written, so every row ends up either in
+    the database or in the archive.
+
+    Returns:
+        int: Number of archived measurements
+    """
+    stmt = (
+        delete(Measurement)
+        .where(
+            Measurement.device_id.in_(device_ids),
+            Measurement.timestamp >= start,
+            Measurement.timestamp < end,
+        )
+        .returning(
+            Measurement.id,
+            Measurement.device_id,
+            Measurement.timestamp,
+            Measurement.x,
+            Measurement.y,
+            Measurement.z,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    rows: List[Any] = list((await session.execute(stmt)).all())
+    rows += await _take_block_rows(session, device_ids, start, end)
+    if not rows:
+        await session.rollback()
+        return 0
+
+    # Blocks crossing midnight contribute samples of the next day
+    days: Dict[date, List[Any]] = defaultdict(list)
+    for row in rows:
+        days[row[2].date()].append(row)
+
+    paths: List[Path] = []
+    try:
+        for segment_day, segment_rows in days.items():
+            paths.append(
+                await asyncio.to_thread(_write_segment, segment_day, segment_rows)
+            )
+        await session.commit()
+    except Exception:
+        for path in paths:
+            path.unlink()
+        raise
+    return len(rows)
+
+
+async def _take_block_rows(
+    session: AsyncSession,
+    device_ids: List[uuid.UUID],
+    start: datetime,
+    end: datetime,
+) -> List[BlockRow]:
+    """Deletes the devices' measurement blocks starting in [start, end), returns
+    their samples.
+    """
+    stmt = (
+        delete(MeasurementBlock)
+        .where(
+            MeasurementBlock.device_id.in_(device_ids),
+            MeasurementBlock.block_start >= start,
+            MeasurementBlock.block_start < end,
+        )
+        .returning(MeasurementBlock.device_id, MeasurementBlock.data)
+        .execution_options(synchronize_session=False)
+    )
+    rows: List[BlockRow] = []
+    for device_id, data in (await session.execute(stmt)).all():
+        rows += await asyncio.to_thread(block_rows, device_id, data)
+    return rows
+
+
+async def archive_measurements(session: AsyncSession, now: datetime) -> int:
+    """Archives all measurements older than `archive_after_days`, oldest first.
+
+    Returns:
+        int: Number of archived measurements
+    """
+    cutoff = datetime.combine(
+        (now - timedelta(days=settings.archive_after_days)).date(), time()
+    )
+    archived = 0
+    while True:
+        firsts = [
+            await session.scalar(
+                select(func.min(Measurement.timestamp)).where(
+                    Measurement.timestamp < cutoff
+                )
+            ),
+            await session.scalar(
+                select(func.min(MeasurementBlock.block_start)).where(
+                    MeasurementBlock.block_start < cutoff
+                )
+            ),
+        ]
+        if not any(firsts):
+            return archived
+        archived += await archive_day(
+            session, min(first for first in firsts if first).date()
+        )
+
+
+def remove_archived_days_before(cutoff: datetime) -> int:
+    """Deletes archived days that end before `cutoff` (retention).
+
+    Returns:
+        int: Number of removed days
+    """
+    removed = 0
+    for day in archived_days(end_date=cutoff - timedelta(days=1)):
+        directory = _day_path(day)
+        for path in directory.iterdir():
+            path.unlink()
+        directory.rmdir()
+        removed += 1
+    return removed
+
+
+def _filter(
+    device_ids: Sequence[uuid.UUID],
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+):
+    condition = ds.field("device_id").isin([str(device_id) for device_id in device_ids])
+    if start_date is not None:
+        condition &= ds.field("timestamp") >= pa.scalar(start_date, pa.timestamp("us"))
+    if end_date is not None:
+        condition &= ds.field("timestamp") <= pa.scalar(end_date, pa.timestamp("us"))
+    return condition
+
+
+def _read_days(
+    days: List[date],
+    columns: List[str],
+    condition: Any,
+):
+    files = [
+        str(path)
+        for day in days
+        for path in sorted(_day_path(day).glob("*.parquet"))
+    ]
+    if not files:
+        return None
+    return ds.dataset(files, schema=_arrow_schema(), format="parquet").to_table(
+        columns=columns, filter=condition
+    )
+
+
+def _read_newest(day: date, condition: Any, limit: int) -> List[Dict[str, Any]]:
+    """Newest `limit` rows of a day matching `condition`, (timestamp, id) desc.
+
+    Only the rows of the page are converted to Python objects.
+    """
+    table = _read_days([day], ["id", "timestamp", *AXES], condition)
+    if table is None:
+        return []
+    table = table.sort_by([("timestamp", "descending"), ("id", "descending")])
+    return table.slice(0, limit).to_pylist()
+
+
+def _device_groups(table: Any) -> Dict[uuid.UUID, NDArray[np.intp]]:
+    """Positions of every device's rows in a table."""
+    device_ids = table.column("device_id").to_numpy(zero_copy_only=False)
+    groups, inverse = np.unique(device_ids, return_inverse=True)
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.cumsum(np.bincount(inverse))[:-1]
+    return {
+        uuid.UUID(device_id): positions
+        for device_id, positions in zip(groups, np.split(order, bounds))
+    }
+
+
+def _table_values(table: Any) -> Columns:
+    return np.vstack(
+        [table.column(axis).to_numpy().astype(np.float64) for axis in AXES]
+    )
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise RuntimeError("Reading archived measurements requires pyarrow")
+
+
+async def _read_window(
+    device_ids: Sequence[uuid.UUID],
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    columns: List[str],
+):
+    days = archived_days(start_date, end_date)
+    if not days or not device_ids:
+        return None
+    _require_pyarrow()
+
+    table = await asyncio.to_thread(
+        _read_days, days, columns, _filter(device_ids, start_date, end_date)
+    )
+    if table is None or not table.num_rows:
+        return None
+    return table
+
+
+async def read_archived_columns(
+    device_ids: Sequence[uuid.UUID],
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+) -> Dict[uuid.UUID, Columns]:
+    """Archived x, y and z values of the devices in a window, see
+    stats.to_columns. Devices without archived rows in the window are omitted.
+    """
+    table = await _read_window(
+        device_ids, start_date, end_date, ["device_id", *AXES]
+    )
+    if table is None:
+        return {}
+    values = _table_values(table)
+    return {
+        device_id: values[:, positions]
+        for device_id, positions in _device_groups(table).items()
+    }
+
+
+async def read_archived_samples(
+    device_ids: Sequence[uuid.UUID],
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+) -> Dict[uuid.UUID, Samples]:
+    """Ascending timestamps and values of the devices' archived rows in a
+    window. Devices without archived rows in the window are omitted.
+    """
+    table = await _read_window(
+        device_ids, start_date, end_date, ["device_id", "timestamp", *AXES]
+    )
+    if table is None:
+        return {}
+    timestamps = (
+        table.column("timestamp").to_numpy().astype("datetime64[us]").view(np.int64)
+    )
+    values = _table_values(table)
+
+    result = {}
+    for device_id, positions in _device_groups(table).items():
+        positions = positions[np.argsort(timestamps[positions], kind="stable")]
+        result[device_id] = (timestamps[positions], values[:, positions])
+    return result
+
+
+async def iter_archived_rows(
+    device_id: uuid.UUID,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+) -> AsyncGenerator[List[ArchivedRow], None]:
+    """Archived rows of a device in a window ordered by (timestamp, id), one
+    batch per day.
+    """
+    days = archived_days(start_date, end_date)
+    if not days:
+        return
+    _require_pyarrow()
+
+    condition = _filter([device_id], start_date, end_date)
+    for day in days:
+        table = await asyncio.to_thread(
+            _read_days, [day], ["id", "timestamp", *AXES], condition
+        )
+        if table is None or not table.num_rows:
+            continue
+        rows: List[ArchivedRow] = [
+            (
+                uuid.UUID(row["id"]),
+                device_id,
+                row["timestamp"],
+                row["x"],
+                row["y"],
+                row["z"],
+            )
+            for row in table.to_pylist()
+        ]
+        rows.sort(key=lambda row: (row[2], row[0]))
+        yield rows
+
+
+async def read_archived_measurements(
+    device_id: uuid.UUID,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    before: Optional[Tuple[datetime, uuid.UUID]],
+    limit: int,
+) -> List[ArchivedRow]:
+    """Newest archived measurements of a device, ordered by (timestamp, id) desc.
+
+    Args:
+        device_id (uuid.UUID): Device identifier
+        start_date (Optional[datetime]): Inclusive start of the window
+        end_date (Optional[datetime]): Inclusive end of the window
+        before (Optional[Tuple[datetime, uuid.UUID]]): Keyset cursor, only rows
+            ordered before this (timestamp, id) are returned
+        limit (int): Maximum number of rows
+
+    Returns:
+        List[ArchivedRow]: (id, device_id, timestamp, x, y, z) rows
+    """
+    if before is not None:
+        end_date = min(end_date, before[0]) if end_date else before[0]
+    days = archived_days(start_date, end_date)
+    if not days:
+        return []
+    _require_pyarrow()
+
+    condition = _filter([device_id], start_date, end_date)
+    if before is not None:
+        # Canonical UUID strings sort like the UUIDs themselves
+        timestamp = pa.scalar(before[0], pa.timestamp("us"))
+        condition &= (ds.field("timestamp") < timestamp) | (
+            (ds.field("timestamp") == timestamp) & (ds.field("id") < str(before[1]))
+        )
+    result: List[ArchivedRow] = []
+    # Days do not overlap: once a day fills the page older days cannot
+    # contribute.
+    for day in reversed(days):
+        page = await asyncio.to_thread(
+            _read_newest, day, condition, limit - len(result)
+        )
+        result.extend(
+            (
+                uuid.UUID(row["id"]),
+                device_id,
+                row["timestamp"],
+                row["x"],
+                row["y"],
+                row["z"],
+            )
+            for row in page
+        )
+        if len(result) >= limit:
+            break
+    return result
+
+
+async def run_archive(interval: float) -> None:
+    """Archives old measurements every `interval` seconds until cancelled."""
+    if pa is None:
+        logger.error("archive: disabled, the optional pyarrow package is missing")
+        return
+
+    while True:
+        try:
+            async with sessionmanager.session() as session:
+                archived = await archive_measurements(session, datetime.now())
+            logger.info("archive: completed", archived=archived)
+        except Exception as e:
+            logger.error("archive: failed", error=str(e))
+        await asyncio.sleep(interval)
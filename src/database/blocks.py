@@ -0,0 +1,434 @@
+"""Compressed block storage of measurements.
+
+Optional storage layout for high-frequency devices (`blocks_enabled`): once a
+time block of `block_seconds` has been closed for `block_compact_delay`
+seconds, the raw measurements of every device in it are moved into one
+`measurement_blocks` row per device holding compressed timestamps and values
+(see src/gorilla.py). A sample costs about 10 bytes plus its values (up to
+about 30 bytes) instead of a heap tuple plus three index entries, and range scans read a
+handful of blocks instead of thousands of rows. Blocks are decoded in a
+worker thread, off the event loop. Every read of measurements merges blocks
+back in, see src/database/tiers.py.
+
+Samples keep their ids, so ids returned on ingest and page cursors stay
+valid after compaction. Late samples of a compacted block are merged into it
+by the next run.
+
+Do not change `block_seconds` once blocks exist.
+"""
+
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, AsyncGenerator, Dict, List, Optional, Sequence, Tuple
+import uuid
+
+import numpy as np
+from numpy.typing import NDArray
+import structlog
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.database import sessionmanager
+from src.database.models import Measurement, MeasurementBlock
+from src.gorilla import (
+    decode_block_ids,
+    decode_block_timestamps,
+    decode_block_values,
+    encode_block,
+)
+from src.settings import settings
+from src.stats import Columns
+
+EPOCH = datetime(1970, 1, 1)
+
+# Blocks fetched per query by iter_block_rows
+BLOCK_READ_PAGE_SIZE = 8
+
+# (id, device_id, timestamp, x, y, z)
+BlockRow = Tuple[uuid.UUID, uuid.UUID, datetime, float, float, float]
+# Ascending microsecond timestamps and their (axes, n) values
+Samples = Tuple[NDArray[np.int64], Columns]
+
+logger = structlog.get_logger(__name__)
+
+
+def block_size() -> timedelta:
+    return timedelta(seconds=settings.block_seconds)
+
+
+def block_start_of(timestamp: datetime) -> datetime:
+    size = block_size()
+    return EPOCH + (timestamp - EPOCH) // size * size
+
+
+def to_microseconds(timestamp: datetime) -> int:
+    return (timestamp - EPOCH) // timedelta(microseconds=1)
+
+
+def from_microseconds(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=int(value))
+
+
+def decode_block(data: bytes) -> Samples:
+    """Microsecond timestamps and (axes, n) values of a block."""
+    return decode_block_timestamps(data), decode_block_values(data)
+
+
+def _block_values(
+    device_id: uuid.UUID, block_start: datetime, samples: List[Any]
+) -> Dict[str, Any]:
+    # samples are (timestamp, id, x, y, z), stored in (timestamp, id) order
+    samples.sort(key=lambda sample: (sample[0], sample[1]))
+    timestamps = [sample[0] for sample in samples]
+    ids = [sample[1] for sample in samples]
+    values = np.array([sample[2:] for sample in samples], dtype=np.float64).T
+    return {
+        "device_id": device_id,
+        "block_start": block_start,
+        "count": len(samples),
+        "first_timestamp": from_microseconds(timestamps[0]),
+        "last_timestamp": from_microseconds(timestamps[-1]),
+        "data": encode_block(timestamps, values, ids),
+    }
+
+
+def _block_samples(data: bytes) -> List[Any]:
+    timestamps, values = decode_block(data)
+    return list(zip(timestamps.tolist(), decode_block_ids(data), *values.tolist()))
+
+
+async def compact_device_block(
+    session: AsyncSession, device_id: uuid.UUID, block_start: datetime
+) -> int:
+    """Moves a device's raw measurements of one time block into its block.
+
+    Returns:
+        int: Number of compacted measurements
+    """
+    stmt = (
+        delete(Measurement)
+        .where(
+            Measurement.device_id == device_id,
+            Measurement.timestamp >= block_start,
+            Measurement.timestamp < block_start + block_size(),
+        )
+        .returning(
+            Measurement.timestamp,
+            Measurement.id,
+            Measurement.x,
+            Measurement.y,
+            Measurement.z,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    rows = (await session.execute(stmt)).all()
+    if not rows:
+        await session.rollback()
+        return 0
+    samples = [
+        (to_microseconds(timestamp), id_, x, y, z) for timestamp, id_, x, y, z in rows
+    ]
+
+    # Late samples of an already compacted block are merged into it
+    existing = await session.scalar(
+        select(MeasurementBlock.data)
+        .where(
+            MeasurementBlock.device_id == device_id,
+            MeasurementBlock.block_start == block_start,
+        )
+        .with_for_update()
+    )
+    if existing is not None:
+        samples.extend(await asyncio.to_thread(_block_samples, existing))
+
+    upsert = pg_insert(MeasurementBlock)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=["device_id", "block_start"],
+        set_={
+            column: upsert.excluded[column]
+            for column in ("count", "first_timestamp", "last_timestamp", "data")
+        },
+    )
+    block = await asyncio.to_thread(_block_values, device_id, block_start, samples)
+    await session.execute(upsert, block)
+    await session.commit()
+    return len(rows)
+
+
+async def compact_block(session: AsyncSession, block_start: datetime) -> int:
+    """Moves the raw measurements of one time block into measurement blocks.
+
+    Devices are compacted one by one, each in its own transaction, so memory
+    and locks are bounded by the samples of one device in one block.
+
+    Returns:
+        int: Number of compacted measurements
+    """
+    device_ids = (
+        await session.scalars(
+            select(Measurement.device_id)
+            .where(
+                Measurement.timestamp >= block_start,
+                Measurement.timestamp < block_start + block_size(),
+            )
+            .distinct()
+            # Same order in concurrent compactions, so they lock blocks alike
+            .order_by(Measurement.device_id)
+        )
+    ).all()
+    await session.rollback()
+
+    compacted = 0
+    for device_id in device_ids:
+        compacted += await compact_device_block(session, device_id, block_start)
+    return compacted
+
+
+async def compact_measurements(session: AsyncSession, now: datetime) -> int:
+    """Compacts every block closed for `block_compact_delay` seconds, oldest first.
+
+    Returns:
+        int: Number of compacted measurements
+    """
+    cutoff = block_start_of(now - timedelta(seconds=settings.block_compact_delay))
+    compacted = 0
+    while True:
+        first = await session.scalar(
+            select(func.min(Measurement.timestamp)).where(
+                Measurement.timestamp < cutoff
+            )
+        )
+        if first is None:
+            return compacted
+        compacted += await compact_block(session, block_start_of(first))
+
+
+def _window_conditions(
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+) -> List[Any]:
+    conditions = []
+    if start_date is not None:
+        conditions += [
+            MeasurementBlock.block_start > start_date - block_size(),
+            MeasurementBlock.last_timestamp >= start_date,
+        ]
+    if end_date is not None:
+        conditions.append(MeasurementBlock.block_start <= end_date)
+    return conditions
+
+
+def _window_mask(
+    timestamps: np.ndarray,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+) -> np.ndarray:
+    mask = np.ones(len(timestamps), dtype=bool)
+    if start_date is not None:
+        mask &= timestamps >= to_microseconds(start_date)
+    if end_date is not None:
+        mask &= timestamps <= to_microseconds(end_date)
+    return mask
+
+
+def block_rows(
+    device_id: uuid.UUID,
+    data: bytes,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> List[BlockRow]:
+    """(id, device_id, timestamp, x, y, z) samples of a block, ordered by
+    (timestamp, id).
+    """
+    timestamps, values = decode_block(data)
+    ids = decode_block_ids(data)
+    mask = _window_mask(timestamps, start_date, end_date)
+    return [
+        (sample_id, device_id, from_microseconds(timestamp), x, y, z)
+        for sample_id, timestamp, x, y, z in zip(
+            [sample_id for sample_id, keep in zip(ids, mask) if keep],
+            timestamps[mask].tolist(),
+            *values[:, mask].tolist(),
+        )
+    ]
+
+
+def _window_columns(
+    blocks: Sequence[Any],
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+) -> Dict[uuid.UUID, Columns]:
+    # Timestamps are only decoded for blocks at the edges of the window
+    columns: Dict[uuid.UUID, List[Columns]] = defaultdict(list)
+    for device_id, first, last, data in blocks:
+        values = decode_block_values(data)
+        inside = (start_date is None or first >= start_date) and (
+            end_date is None or last <= end_date
+        )
+        if not inside:
+            mask = _window_mask(decode_block_timestamps(data), start_date, end_date)
+            values = values[:, mask]
+        if values.shape[1]:
+            columns[device_id].append(values)
+    return {device_id: np.hstack(parts) for device_id, parts in columns.items()}
+
+
+def _window_samples(
+    blocks: Sequence[Any],
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+) -> Dict[uuid.UUID, Samples]:
+    samples: Dict[uuid.UUID, List[Samples]] = defaultdict(list)
+    for device_id, data in blocks:
+        timestamps, values = decode_block(data)
+        mask = _window_mask(timestamps, start_date, end_date)
+        if mask.any():
+            samples[device_id].append((timestamps[mask], values[:, mask]))
+    return {
+        device_id: (
+            np.concatenate([timestamps for timestamps, _ in parts]),
+            np.hstack([values for _, values in parts]),
+        )
+        for device_id, parts in samples.items()
+    }
+
+
+async def read_block_columns(
+    session: AsyncSession,
+    device_ids: Sequence[uuid.UUID],
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+) -> Dict[uuid.UUID, Columns]:
+    """Values of the devices' block samples in a window, see stats.to_columns.
+
+    Devices without block samples in the window are omitted.
+    """
+    stmt = select(
+        MeasurementBlock.device_id,
+        MeasurementBlock.first_timestamp,
+        MeasurementBlock.last_timestamp,
+        MeasurementBlock.data,
+    ).where(
+        MeasurementBlock.device_id.in_(device_ids),
+        *_window_conditions(start_date, end_date),
+    )
+    blocks = (await session.execute(stmt)).all()
+    if not blocks:
+        return {}
+    return await asyncio.to_thread(_window_columns, blocks, start_date, end_date)
+
+
+async def read_block_samples(
+    session: AsyncSession,
+    device_ids: Sequence[uuid.UUID],
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+) -> Dict[uuid.UUID, Samples]:
+    """Ascending timestamps and values of the devices' block samples in a window.
+
+    Devices without block samples in the window are omitted.
+    """
+    stmt = (
+        select(MeasurementBlock.device_id, MeasurementBlock.data)
+        .where(
+            MeasurementBlock.device_id.in_(device_ids),
+            *_window_conditions(start_date, end_date),
+        )
+        .order_by(MeasurementBlock.device_id, MeasurementBlock.block_start)
+    )
+    blocks = (await session.execute(stmt)).all()
+    if not blocks:
+        return {}
+    return await asyncio.to_thread(_window_samples, blocks, start_date, end_date)
+
+
+async def iter_block_rows(
+    session: AsyncSession,
+    device_id: uuid.UUID,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+) -> AsyncGenerator[List[BlockRow], None]:
+    """Block samples of a device in a window ordered by (timestamp, id), one
+    batch per block.
+
+    Blocks are fetched in keyset pages instead of a server-side cursor, so the
+    session can stream other rows at the same time (see tiers.merge_row_batches).
+    """
+    conditions = [
+        MeasurementBlock.device_id == device_id,
+        *_window_conditions(start_date, end_date),
+    ]
+    while True:
+        stmt = (
+            select(MeasurementBlock.block_start, MeasurementBlock.data)
+            .where(*conditions)
+            .order_by(MeasurementBlock.block_start)
+            .limit(BLOCK_READ_PAGE_SIZE)
+        )
+        blocks = (await session.execute(stmt)).all()
+        for _, data in blocks:
+            rows = await asyncio.to_thread(
+                block_rows, device_id, data, start_date, end_date
+            )
+            if rows:
+                yield rows
+        if len(blocks) < BLOCK_READ_PAGE_SIZE:
+            return
+        conditions.append(MeasurementBlock.block_start > blocks[-1].block_start)
+
+
+async def read_block_measurements(
+    session: AsyncSession,
+    device_id: uuid.UUID,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    before: Optional[Tuple[datetime, uuid.UUID]],
+    limit: int,
+) -> List[BlockRow]:
+    """Newest block samples of a device, ordered by (timestamp, id) desc.
+
+    Same contract as archive.read_archived_measurements. Blocks are fetched
+    newest first and only until the page is full.
+    """
+    if before is not None:
+        end_date = min(end_date, before[0]) if end_date else before[0]
+
+    stmt = (
+        select(MeasurementBlock.data)
+        .where(
+            MeasurementBlock.device_id == device_id,
+            *_window_conditions(start_date, end_date),
+        )
+        .order_by(MeasurementBlock.block_start.desc())
+        .execution_options(yield_per=4)
+    )
+
+    result: List[BlockRow] = []
+    stream = await session.stream(stmt)
+    try:
+        async for data in stream.scalars():
+            rows = await asyncio.to_thread(
+                block_rows, device_id, data, start_date, end_date
+            )
+            if before is not None:
+                rows = [row for row in rows if (row[2], row[0]) < before]
+            result.extend(reversed(rows))
+            if len(result) >= limit:
+                break
+    finally:
+        await stream.close()
+    return result[:limit]
+
+
+async def run_compaction(interval: float) -> None:
+    """Compacts closed blocks every `interval` seconds until cancelled."""
+    while True:
+        try:
+            async with sessionmanager.session() as session:
+                compacted = await compact_measurements(session, datetime.now())
+            logger.info("blocks: compaction completed", compacted=compacted)
+        except Exception as e:
+            logger.error("blocks: compaction failed", error=str(e))
+        await asyncio.sleep(interval)
@@ -1,9 +1,23 @@
 from datetime import datetime
 from uuid import uuid4
 import uuid
-from sqlalchemy import UUID, Column, ForeignKey, DateTime, Float, String, Table
+from sqlalchemy import (
+    UUID,
+    BigInteger,
+    Column,
+    ForeignKey,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    Table,
+)
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
+from src.utils import uuid7
+
 
 class Base(DeclarativeBase):
     pass
@@ -32,7 +46,7 @@ class User(Base):
         index=True,
         default=uuid4,
     )
-    name: Mapped[str] = mapped_column(String(255))
+    name: Mapped[str] = mapped_column(String(255), unique=True)
 
     devices: Mapped[list["Device"]] = relationship(
         secondary=user_device_association, back_populates="users"
@@ -49,31 +63,129 @@ class Device(Base):
         default=uuid4,
     )
 
-    serial_number: Mapped[str] = mapped_column(String(30), unique=True)
+    # Byte-wise collation: the unique index then also serves ordered listings
+    # and prefix (LIKE 'abc%') filters, whatever the database locale.
+    serial_number: Mapped[str] = mapped_column(
+        String(30, collation="C"), unique=True
+    )
 
     users: Mapped[list["User"]] = relationship(
         secondary=user_device_association, back_populates="devices"
     )
+    # Measurements are deleted by the database (ON DELETE CASCADE), the ORM
+    # does not load them just to delete them one by one.
     measurements: Mapped[list["Measurement"]] = relationship(
-        back_populates="device", cascade="all, delete-orphan"
+        back_populates="device", cascade="all, delete-orphan", passive_deletes=True
     )
 
 
 class Measurement(Base):
+    """One sample of a device.
+
+    The table is range-partitioned by month on `timestamp` (see
+    src/database/partitions.py), so `timestamp` is part of the primary key.
+    """
+
     __tablename__ = "measurements"
 
+    # Time-ordered, so the primary key index grows at its right edge
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True),
         primary_key=True,
-        index=True,
-        default=uuid4,
+        default=uuid7,
     )
     device_id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), ForeignKey("devices.id"), index=True
+        UUID(as_uuid=True), ForeignKey("devices.id", ondelete="CASCADE")
     )
-    timestamp: Mapped[datetime] = mapped_column(DateTime, index=True)
+    timestamp: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
     x: Mapped[float] = mapped_column(Float)
     y: Mapped[float] = mapped_column(Float)
     z: Mapped[float] = mapped_column(Float)
 
     device: Mapped["Device"] = relationship(back_populates="measurements")
+
+    __table_args__ = (
+        # Device windows and keyset pages by (timestamp, id), also serves
+        # lookups by device_id alone. Not covering x/y/z: that makes window
+        # stats index-only but the index 30% larger (benchmarks/ingest_benchmark).
+        Index("ix_measurements_device_id_timestamp_id", "device_id", "timestamp", "id"),
+        # Time-only filters (retention, archive, compaction): rows arrive
+        # roughly in time order, so a BRIN index is a few pages in size.
+        Index("ix_measurements_timestamp_brin", "timestamp", postgresql_using="brin"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+
+
+class MeasurementRollup(Base):
+    """Pre-aggregated measurements of one device in one time bucket.
+
+    Maintained on ingest for every granularity ("minute", "hour", "day"), so
+    stats over long windows read buckets instead of raw measurements.
+    """
+
+    __tablename__ = "measurement_rollups"
+
+    device_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("devices.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    granularity: Mapped[str] = mapped_column(String(10), primary_key=True)
+    bucket_start: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    count: Mapped[int] = mapped_column(BigInteger)
+
+    x_sum: Mapped[float] = mapped_column(Float)
+    x_min: Mapped[float] = mapped_column(Float)
+    x_max: Mapped[float] = mapped_column(Float)
+    x_sum_sq: Mapped[float] = mapped_column(Float)
+    y_sum: Mapped[float] = mapped_column(Float)
+    y_min: Mapped[float] = mapped_column(Float)
+    y_max: Mapped[float] = mapped_column(Float)
+    y_sum_sq: Mapped[float] = mapped_column(Float)
+    z_sum: Mapped[float] = mapped_column(Float)
+    z_min: Mapped[float] = mapped_column(Float)
+    z_max: Mapped[float] = mapped_column(Float)
+    z_sum_sq: Mapped[float] = mapped_column(Float)
+
+
+class MeasurementSketchBin(Base):
+    """One bin of a mergeable quantile sketch of a device axis in a time bucket.
+
+    Sketches are log-scale histograms with a relative error bound, bins of any
+    set of buckets and devices merge by summing counts of equal keys.
+    """
+
+    __tablename__ = "measurement_sketch_bins"
+
+    device_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("devices.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    granularity: Mapped[str] = mapped_column(String(10), primary_key=True)
+    bucket_start: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    axis: Mapped[str] = mapped_column(String(1), primary_key=True)
+    key: Mapped[int] = mapped_column(Integer, primary_key=True)
+    count: Mapped[int] = mapped_column(BigInteger)
+
+
+class MeasurementBlock(Base):
+    """Compressed measurements of one device in one time block.
+
+    Raw measurements of closed blocks are compacted into a block (see
+    src/database/blocks.py and src/gorilla.py), `data` holds the encoded
+    timestamps and x, y and z values.
+    """
+
+    __tablename__ = "measurement_blocks"
+
+    device_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("devices.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    block_start: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    count: Mapped[int] = mapped_column(Integer)
+    first_timestamp: Mapped[datetime] = mapped_column(DateTime)
+    last_timestamp: Mapped[datetime] = mapped_column(DateTime)
+    data: Mapped[bytes] = mapped_column(LargeBinary)
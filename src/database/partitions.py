@@ -0,0 +1,188 @@
+"""Monthly range partitions of the measurements table.
+
+`measurements` is partitioned by RANGE (timestamp) with one partition per
+calendar month named `measurements_pYYYYMM`. Partitions are created ahead of
+time by a background task (`partition_months_ahead`) and on demand before
+samples with timestamps outside the existing partitions are written
+(backfills, skewed client clocks).
+
+Every query with a time window prunes partitions outside of it, so queries
+on recent data only touch the newest partitions.
+"""
+
+import asyncio
+import re
+from datetime import datetime
+from typing import Iterable, Set
+
+import structlog
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+from src.database.database import sessionmanager
+from src.settings import settings
+
+PARTITIONED_TABLE = "measurements"
+PARTITION_NAME_PATTERN = re.compile(rf"^{PARTITIONED_TABLE}_p\d{{6}}$")
+# Serializes partition DDL of concurrent workers
+PARTITION_LOCK_KEY = 7_202_504
+# Dropping a partition locks the whole table, give up instead of queueing
+# every other query behind a long wait
+PARTITION_DROP_LOCK_TIMEOUT = "5s"
+
+logger = structlog.get_logger(__name__)
+
+# Months known to have a partition, saves a round trip on every write. The
+# retention of another worker may drop them: writes that find no partition
+# call `forget_partitions` and retry.
+_known_months: Set[datetime] = set()
+
+
+def month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"{PARTITIONED_TABLE}_p{month:%Y%m}"
+
+
+def partition_month(name: str) -> datetime:
+    return datetime.strptime(name[len(PARTITIONED_TABLE) + 2:], "%Y%m")
+
+
+def _session_engine(session: AsyncSession) -> AsyncEngine:
+    bind = session.bind
+    if isinstance(bind, AsyncConnection):
+        return bind.engine
+    if isinstance(bind, AsyncEngine):
+        return bind
+    raise RuntimeError("Session is not bound to an engine")
+
+
+async def ensure_partitions(session: AsyncSession, timestamps: Iterable[datetime]):
+    """Creates missing partitions for the months of the given timestamps.
+
+    Runs in its own short transaction (not in the one of `session`), so the
+    new partitions are visible to the caller's pending insert right away.
+    Partitions are attached with ATTACH PARTITION, which unlike CREATE TABLE
+    ... PARTITION OF does not block concurrent writes to the parent table.
+    """
+    missing = sorted({month_start(value) for value in timestamps} - _known_months)
+    if not missing:
+        return
+
+    async with _session_engine(session).begin() as connection:
+        await connection.execute(
+            text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK_KEY}
+        )
+        for month in missing:
+            name = partition_name(month)
+            exists = await connection.scalar(
+                text("SELECT to_regclass(:name)"), {"name": name}
+            )
+            if exists is not None:
+                continue
+
+            await connection.execute(
+                text(
+                    f"CREATE TABLE {name} "
+                    f"(LIKE {PARTITIONED_TABLE} INCLUDING DEFAULTS)"
+                )
+            )
+            await connection.execute(
+                text(
+                    f"ALTER TABLE {PARTITIONED_TABLE} ATTACH PARTITION {name} "
+                    f"FOR VALUES FROM ('{month.isoformat()}') "
+                    f"TO ('{add_months(month, 1).isoformat()}')"
+                )
+            )
+            logger.info("partitions: created", partition=name)
+
+    _known_months.update(missing)
+
+
+def forget_partitions(timestamps: Iterable[datetime]) -> None:
+    """Forgets the partitions of the given timestamps, so that the next
+    `ensure_partitions` looks them up (and creates them) again."""
+    _known_months.difference_update(month_start(value) for value in timestamps)
+
+
+def is_missing_partition_error(error: BaseException) -> bool:
+    """Whether a write failed for lack of a partition for one of its rows."""
+    return "no partition of relation" in str(error)
+
+
+async def drop_partitions_before(session: AsyncSession, cutoff: datetime) -> int:
+    """Drops the partitions holding only measurements older than `cutoff`.
+
+    Every partition is dropped in its own transaction that waits at most
+    PARTITION_DROP_LOCK_TIMEOUT for its lock, partitions that cannot be locked
+    in time are left for the next run.
+
+    Returns:
+        int: Number of dropped partitions
+    """
+    engine = _session_engine(session)
+    async with engine.connect() as connection:
+        names = (
+            await connection.scalars(
+                text(
+                    "SELECT c.relname FROM pg_inherits i "
+                    "JOIN pg_class c ON c.oid = i.inhrelid "
+                    "WHERE i.inhparent = CAST(:table AS regclass)"
+                ),
+                {"table": PARTITIONED_TABLE},
+            )
+        ).all()
+
+    expired = sorted(
+        name
+        for name in names
+        if PARTITION_NAME_PATTERN.match(name)
+        and add_months(partition_month(name), 1) <= cutoff
+    )
+    dropped = 0
+    for name in expired:
+        try:
+            async with engine.begin() as connection:
+                await connection.execute(
+                    text(f"SET LOCAL lock_timeout = '{PARTITION_DROP_LOCK_TIMEOUT}'")
+                )
+                await connection.execute(
+                    text("SELECT pg_advisory_xact_lock(:key)"),
+                    {"key": PARTITION_LOCK_KEY},
+                )
+                await connection.execute(text(f"DROP TABLE IF EXISTS {name}"))
+        except DBAPIError as e:
+            logger.warning("partitions: drop failed", partition=name, error=str(e))
+            continue
+        _known_months.discard(partition_month(name))
+        dropped += 1
+        logger.info("partitions: dropped", partition=name)
+    return dropped
+
+
+async def ensure_future_partitions(session: AsyncSession) -> None:
+    """Creates partitions for this month and `partition_months_ahead` months."""
+    current = month_start(datetime.now())
+    await ensure_partitions(
+        session,
+        [add_months(current, i) for i in range(settings.partition_months_ahead + 1)],
+    )
+
+
+async def run_partition_maintenance(interval: float) -> None:
+    """Keeps future partitions in place, every `interval` seconds until cancelled."""
+    while True:
+        try:
+            async with sessionmanager.session() as session:
+                await ensure_future_partitions(session)
+        except Exception as e:
+            logger.error("partitions: maintenance failed", error=str(e))
+        await asyncio.sleep(interval)
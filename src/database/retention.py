@@ -0,0 +1,217 @@
+"""Retention of measurements and their aggregates.
+
+Raw measurements are kept for `retention_raw_days` (per device overrides in
+`retention_device_raw_days`), rollups and quantile sketch bins for
+`retention_aggregate_days`; 0 keeps data forever.
+
+Monthly partitions older than the longest raw retention are dropped as a
+whole: no row-by-row delete, no WAL for every row and nothing left to vacuum.
+The remaining expired rows are deleted in batches of
+`retention_delete_batch_size`, each batch in its own short transaction, so
+locks are held briefly and WAL is written in small increments. Compacted
+blocks (src/database/blocks.py) go the same way once their last sample
+expired.
+
+Run a single pass with `python -m src.database.retention`.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+import uuid
+
+import structlog
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.archive import remove_archived_days_before
+from src.database.database import sessionmanager
+from src.database.models import (
+    Measurement,
+    MeasurementBlock,
+    MeasurementRollup,
+    MeasurementSketchBin,
+)
+from src.database.partitions import drop_partitions_before
+from src.settings import settings
+from src.stats_cache import stats_cache
+
+logger = structlog.get_logger(__name__)
+
+
+def device_raw_retention_days() -> Dict[uuid.UUID, int]:
+    """Per-device raw retention overrides from `retention_device_raw_days`."""
+    overrides = settings.get("retention_device_raw_days") or {}
+    return {
+        uuid.UUID(str(device_id)): int(days) for device_id, days in overrides.items()
+    }
+
+
+async def _delete_in_batches(
+    session: AsyncSession,
+    table: Any,
+    key_columns: List[Any],
+    conditions: List[Any],
+) -> int:
+    """Deletes rows matching `conditions` by primary key, one batch per commit."""
+    batch_size = settings.retention_delete_batch_size
+    expired = select(*key_columns).where(*conditions).limit(batch_size)
+    stmt = delete(table).where(tuple_(*key_columns).in_(expired))
+
+    deleted = 0
+    while True:
+        result: Any = await session.execute(stmt)
+        await session.commit()
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted
+
+
+async def _delete_expired(
+    session: AsyncSession,
+    table: Any,
+    key_columns: List[Any],
+    timestamp: Any,
+    now: datetime,
+) -> int:
+    """Deletes rows of `table` whose `timestamp` is past the raw retention of
+    their device, in batches.
+    """
+    raw_days = settings.retention_raw_days
+    overrides = device_raw_retention_days()
+
+    deleted = 0
+    if raw_days:
+        conditions = [timestamp < now - timedelta(days=raw_days)]
+        if overrides:
+            conditions.append(table.device_id.notin_(list(overrides)))
+        deleted += await _delete_in_batches(session, table, key_columns, conditions)
+    for device_id, days in overrides.items():
+        if days:
+            deleted += await _delete_in_batches(
+                session,
+                table,
+                key_columns,
+                [table.device_id == device_id, timestamp < now - timedelta(days=days)],
+            )
+    return deleted
+
+
+async def purge_measurements(session: AsyncSession, now: datetime) -> Dict[str, int]:
+    """Deletes expired raw measurements, commits as it goes.
+
+    Returns:
+        Dict[str, int]: Number of dropped partitions, removed archived days,
+            deleted rows and deleted blocks
+    """
+    raw_days = settings.retention_raw_days
+    overrides = device_raw_retention_days()
+
+    dropped = removed = 0
+    # Whole partitions and archived days may only go when no device keeps them
+    retentions = [raw_days, *overrides.values()]
+    if all(retentions):
+        cutoff = now - timedelta(days=max(retentions))
+        dropped = await drop_partitions_before(session, cutoff)
+        removed = remove_archived_days_before(cutoff)
+
+    deleted = await _delete_expired(
+        session,
+        Measurement,
+        [Measurement.id, Measurement.timestamp],
+        Measurement.timestamp,
+        now,
+    )
+    # A block is deleted when its last sample expired, so expired samples of
+    # a block straddling the cutoff stay until the block does.
+    deleted_blocks = await _delete_expired(
+        session,
+        MeasurementBlock,
+        [MeasurementBlock.device_id, MeasurementBlock.block_start],
+        MeasurementBlock.last_timestamp,
+        now,
+    )
+
+    return {
+        "dropped_partitions": dropped,
+        "removed_archive_days": removed,
+        "deleted_measurements": deleted,
+        "deleted_blocks": deleted_blocks,
+    }
+
+
+async def purge_aggregates(session: AsyncSession, now: datetime) -> Dict[str, int]:
+    """Deletes expired rollups and sketch bins, commits as it goes."""
+    days = settings.retention_aggregate_days
+    if not days:
+        return {"deleted_rollups": 0, "deleted_sketch_bins": 0}
+
+    cutoff = now - timedelta(days=days)
+    deleted_rollups = await _delete_in_batches(
+        session,
+        MeasurementRollup,
+        [
+            MeasurementRollup.device_id,
+            MeasurementRollup.granularity,
+            MeasurementRollup.bucket_start,
+        ],
+        [MeasurementRollup.bucket_start < cutoff],
+    )
+    deleted_sketch_bins = await _delete_in_batches(
+        session,
+        MeasurementSketchBin,
+        [
+            MeasurementSketchBin.device_id,
+            MeasurementSketchBin.granularity,
+            MeasurementSketchBin.bucket_start,
+            MeasurementSketchBin.axis,
+            MeasurementSketchBin.key,
+        ],
+        [MeasurementSketchBin.bucket_start < cutoff],
+    )
+    return {
+        "deleted_rollups": deleted_rollups,
+        "deleted_sketch_bins": deleted_sketch_bins,
+    }
+
+
+async def apply_retention(session: AsyncSession) -> Dict[str, int]:
+    """Enforces the retention policy once, commits as it goes.
+
+    Returns:
+        Dict[str, int]: Counts of dropped partitions and deleted rows
+    """
+    now = datetime.now()
+    summary = {
+        **await purge_measurements(session, now),
+        **await purge_aggregates(session, now),
+    }
+    # Cached stats of windows reaching into the purged range are stale now
+    if any(summary.values()):
+        stats_cache.invalidate_all()
+    return summary
+
+
+async def run_retention(interval: float) -> None:
+    """Enforces the retention policy every `interval` seconds until cancelled."""
+    while True:
+        try:
+            async with sessionmanager.session() as session:
+                summary = await apply_retention(session)
+            logger.info("retention: completed", **summary)
+        except Exception as e:
+            logger.error("retention: failed", error=str(e))
+        await asyncio.sleep(interval)
+
+
+async def _main() -> None:
+    sessionmanager.init(settings.db_connection_url)
+    try:
+        async with sessionmanager.session() as session:
+            print(await apply_retention(session))
+    finally:
+        await sessionmanager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,685 @@
+"""Time-bucket rollups of measurements.
+
+Rollups hold count/sum/min/max/sum-of-squares per axis for every device and
+bucket at minute, hour and day granularity. They are updated on ingest and can
+be rebuilt from the measurements for backfill (together with quantile sketches,
+see src.database.sketches):
+
+    python -m src.database.rollups [--device-id ID] [--start DATE] [--end DATE]
+"""
+
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+import uuid
+
+import numpy as np
+from sqlalchemy import (
+    and_,
+    delete,
+    false,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+    true,
+    union_all,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.aggregates import AXES
+from src.database.blocks import Samples, from_microseconds
+from src.database.models import Measurement, MeasurementRollup
+from src.database.retention import device_raw_retention_days
+from src.database.tiers import (
+    iter_cold_day_samples,
+    read_cold_columns,
+    read_cold_samples,
+)
+from src.settings import settings
+from src.stats import aggregate_groups
+
+
+class RollupGranularity(str, Enum):
+    """Rollup bucket sizes, values match PostgreSQL `date_trunc` fields."""
+
+    MINUTE = "minute"
+    HOUR = "hour"
+    DAY = "day"
+
+
+GRANULARITY_DELTAS = {
+    RollupGranularity.MINUTE: timedelta(minutes=1),
+    RollupGranularity.HOUR: timedelta(hours=1),
+    RollupGranularity.DAY: timedelta(days=1),
+}
+# Coarsest first, used to cover a window with as few buckets as possible
+GRANULARITY_LEVELS = [
+    RollupGranularity.DAY,
+    RollupGranularity.HOUR,
+    RollupGranularity.MINUTE,
+]
+
+# Half-open [start, end) time range, None means unbounded
+TimeRange = Tuple[Optional[datetime], Optional[datetime]]
+
+ROLLUP_UPSERT_PAGE_SIZE = 1000
+
+
+def truncate(value: datetime, granularity: RollupGranularity) -> datetime:
+    """Start of the bucket containing `value`, same as SQL `date_trunc`."""
+    value = value.replace(second=0, microsecond=0)
+    if granularity is RollupGranularity.MINUTE:
+        return value
+    value = value.replace(minute=0)
+    if granularity is RollupGranularity.HOUR:
+        return value
+    return value.replace(hour=0)
+
+
+def ceil(value: datetime, granularity: RollupGranularity) -> datetime:
+    """Start of the first bucket beginning at or after `value`."""
+    truncated = truncate(value, granularity)
+    if truncated < value:
+        return truncated + GRANULARITY_DELTAS[granularity]
+    return truncated
+
+
+def split_window(
+    start: Optional[datetime],
+    end: Optional[datetime],
+    levels: Sequence[RollupGranularity] = GRANULARITY_LEVELS,
+) -> Tuple[List[Tuple[RollupGranularity, TimeRange]], List[TimeRange]]:
+    """Covers a half-open window with whole rollup buckets plus raw edges.
+
+    The aligned core of the window is answered by the coarsest buckets that fit
+    in it, what is left at the edges goes to finer granularities and, below a
+    minute, to raw measurements.
+
+    Returns:
+        Rollup ranges as (granularity, [start, end) of bucket_start) and raw
+        ranges as [start, end) of measurement timestamps.
+    """
+    if start is not None and end is not None and start >= end:
+        return [], []
+    if not levels:
+        return [], [(start, end)]
+
+    granularity, finer = levels[0], levels[1:]
+    core_start = ceil(start, granularity) if start is not None else None
+    core_end = truncate(end, granularity) if end is not None else None
+
+    if core_start is not None and core_end is not None and core_start >= core_end:
+        return split_window(start, end, finer)
+
+    rollup_ranges = [(granularity, (core_start, core_end))]
+    raw_ranges: List[TimeRange] = []
+    if start is not None and core_start is not None and start < core_start:
+        left_rollups, left_raw = split_window(start, core_start, finer)
+        rollup_ranges += left_rollups
+        raw_ranges += left_raw
+    if end is not None and core_end is not None and core_end < end:
+        right_rollups, right_raw = split_window(core_end, end, finer)
+        rollup_ranges += right_rollups
+        raw_ranges += right_raw
+
+    return rollup_ranges, raw_ranges
+
+
+def _aggregate_rows(rows: Sequence[Sequence[Any]]) -> List[Dict[str, Any]]:
+    # rows are (id, device_id, timestamp, x, y, z), see MeasurementRow
+    buckets: Dict[Tuple[uuid.UUID, str, datetime], List[float]] = {}
+
+    for row in rows:
+        device_id, timestamp, values = row[1], row[2], row[3:6]
+        for granularity in RollupGranularity:
+            key = (device_id, granularity.value, truncate(timestamp, granularity))
+            acc = buckets.get(key)
+            if acc is None:
+                acc = buckets[key] = [0]
+                for value in values:
+                    acc += [0.0, value, value, 0.0]
+            acc[0] += 1
+            for i, value in enumerate(values):
+                offset = 1 + i * 4
+                acc[offset] += value
+                acc[offset + 1] = min(acc[offset + 1], value)
+                acc[offset + 2] = max(acc[offset + 2], value)
+                acc[offset + 3] += value * value
+
+    result = []
+    # Sorted so concurrent upserts lock rollup rows in the same order
+    for (device_id, granularity_value, bucket_start), acc in sorted(buckets.items()):
+        item: Dict[str, Any] = {
+            "device_id": device_id,
+            "granularity": granularity_value,
+            "bucket_start": bucket_start,
+            "count": acc[0],
+        }
+        for i, axis in enumerate(AXES):
+            offset = 1 + i * 4
+            item[f"{axis}_sum"] = acc[offset]
+            item[f"{axis}_min"] = acc[offset + 1]
+            item[f"{axis}_max"] = acc[offset + 2]
+            item[f"{axis}_sum_sq"] = acc[offset + 3]
+        result.append(item)
+
+    return result
+
+
+def _aggregate_samples(samples: Dict[uuid.UUID, Samples]) -> List[Dict[str, Any]]:
+    result = []
+    for device_id, (timestamps, values) in sorted(samples.items()):
+        for granularity in RollupGranularity:
+            width = GRANULARITY_DELTAS[granularity] // timedelta(microseconds=1)
+            buckets = timestamps // width
+            keys, counts, sums, mins, maxs = aggregate_groups(buckets, values)
+            sums_sq = aggregate_groups(buckets, values * values)[2]
+            for j, key in enumerate(keys.tolist()):
+                item: Dict[str, Any] = {
+                    "device_id": device_id,
+                    "granularity": granularity.value,
+                    "bucket_start": from_microseconds(key * width),
+                    "count": int(counts[j]),
+                }
+                for i, axis in enumerate(AXES):
+                    item[f"{axis}_sum"] = float(sums[i, j])
+                    item[f"{axis}_min"] = float(mins[i, j])
+                    item[f"{axis}_max"] = float(maxs[i, j])
+                    item[f"{axis}_sum_sq"] = float(sums_sq[i, j])
+                result.append(item)
+    return result
+
+
+async def _upsert_rollups(
+    session: AsyncSession,
+    values: List[Dict[str, Any]],
+) -> None:
+    if not values:
+        return
+
+    table = MeasurementRollup.metadata.tables[MeasurementRollup.__tablename__]
+    stmt = pg_insert(table)
+    excluded = stmt.excluded
+    update: Dict[str, Any] = {"count": table.c.count + excluded.count}
+    for axis in AXES:
+        update[f"{axis}_sum"] = table.c[f"{axis}_sum"] + excluded[f"{axis}_sum"]
+        update[f"{axis}_min"] = func.least(
+            table.c[f"{axis}_min"], excluded[f"{axis}_min"]
+        )
+        update[f"{axis}_max"] = func.greatest(
+            table.c[f"{axis}_max"], excluded[f"{axis}_max"]
+        )
+        update[f"{axis}_sum_sq"] = (
+            table.c[f"{axis}_sum_sq"] + excluded[f"{axis}_sum_sq"]
+        )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["device_id", "granularity", "bucket_start"],
+        set_=update,
+    )
+
+    for offset in range(0, len(values), ROLLUP_UPSERT_PAGE_SIZE):
+        await session.execute(stmt, values[offset:offset + ROLLUP_UPSERT_PAGE_SIZE])
+
+
+async def update_rollups(
+    session: AsyncSession,
+    rows: Sequence[Sequence[Any]],
+) -> None:
+    """Adds freshly inserted measurement rows to the rollups (no commit).
+
+    Args:
+        session (AsyncSession): Session of the transaction that inserted the rows
+        rows: (id, device_id, timestamp, x, y, z) measurement rows
+    """
+    await _upsert_rollups(session, _aggregate_rows(rows))
+
+
+def _rollup_range_condition(granularity: RollupGranularity, time_range: TimeRange):
+    start, end = time_range
+    conditions = [MeasurementRollup.granularity == granularity.value]
+    if start is not None:
+        conditions.append(MeasurementRollup.bucket_start >= start)
+    if end is not None:
+        conditions.append(MeasurementRollup.bucket_start < end)
+    return and_(*conditions)
+
+
+def inclusive_range(
+    time_range: TimeRange,
+) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """[start, end] of a half-open time range, timestamps have microseconds."""
+    start, end = time_range
+    return start, (end - timedelta(microseconds=1) if end is not None else None)
+
+
+def raw_range_condition(time_range: TimeRange):
+    """Condition selecting measurements of a half-open time range."""
+    start, end = time_range
+    conditions = []
+    if start is not None:
+        conditions.append(Measurement.timestamp >= start)
+    if end is not None:
+        conditions.append(Measurement.timestamp < end)
+    return and_(true(), *conditions)
+
+
+async def get_rollup_stats(
+    session: AsyncSession,
+    device_ids: Sequence[uuid.UUID],
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+) -> Dict[uuid.UUID, Dict[str, Dict[str, Any]]]:
+    """Per-device min/max/count/sum of every axis answered from rollups.
+
+    Whole buckets inside the window are read from rollups, partial buckets at
+    the edges from raw measurements (live and compacted, see
+    src.database.tiers), so the cost depends on the number of buckets and
+    edge samples, not on the window length.
+
+    Args:
+        session (AsyncSession): Asynchronous database session
+        device_ids (Sequence[uuid.UUID]): Device identifiers
+        start_date (Optional[datetime]): Inclusive start of the window
+        end_date (Optional[datetime]): Inclusive end of the window
+
+    Returns:
+        Dict mapping device id to {axis: {"min", "max", "count", "sum"}}.
+        Devices without measurements in the window are omitted.
+    """
+    # Measurement timestamps have microsecond precision: [start, end] == [start, end')
+    end = end_date + timedelta(microseconds=1) if end_date else None
+    rollup_ranges, raw_ranges = split_window(start_date, end, GRANULARITY_LEVELS)
+
+    # (device_id, count, {"<axis>_<min|max|sum>": value}) per part
+    partials: List[Tuple[uuid.UUID, int, Mapping[Any, Any]]] = []
+    if rollup_ranges:
+        columns = [func.sum(MeasurementRollup.count).label("count")]
+        for axis in AXES:
+            columns += [
+                func.min(getattr(MeasurementRollup, f"{axis}_min")).label(
+                    f"{axis}_min"
+                ),
+                func.max(getattr(MeasurementRollup, f"{axis}_max")).label(
+                    f"{axis}_max"
+                ),
+                func.sum(getattr(MeasurementRollup, f"{axis}_sum")).label(
+                    f"{axis}_sum"
+                ),
+            ]
+        stmt = (
+            select(MeasurementRollup.device_id, *columns)
+            .where(
+                MeasurementRollup.device_id.in_(device_ids),
+                or_(
+                    false(),
+                    *[
+                        _rollup_range_condition(granularity, time_range)
+                        for granularity, time_range in rollup_ranges
+                    ],
+                ),
+            )
+            .group_by(MeasurementRollup.device_id)
+        )
+        partials += [
+            (row.device_id, row._mapping["count"], row._mapping)
+            for row in (await session.execute(stmt)).all()
+        ]
+
+    if raw_ranges:
+        columns = [func.count().label("count")]
+        for axis in AXES:
+            column = getattr(Measurement, axis)
+            columns += [
+                func.min(column).label(f"{axis}_min"),
+                func.max(column).label(f"{axis}_max"),
+                func.sum(column).label(f"{axis}_sum"),
+            ]
+        stmt = (
+            select(Measurement.device_id, *columns)
+            .where(
+                Measurement.device_id.in_(device_ids),
+                or_(false(), *[raw_range_condition(r) for r in raw_ranges]),
+            )
+            .group_by(Measurement.device_id)
+        )
+        partials += [
+            (row.device_id, row._mapping["count"], row._mapping)
+            for row in (await session.execute(stmt)).all()
+        ]
+        # Compacted samples of the edges (rollups already include them)
+        for raw_range in raw_ranges:
+            cold = await read_cold_columns(
+                session, device_ids, *inclusive_range(raw_range)
+            )
+            for device_id, values in cold.items():
+                aggregates = {}
+                for i, axis in enumerate(AXES):
+                    aggregates[f"{axis}_min"] = float(values[i].min())
+                    aggregates[f"{axis}_max"] = float(values[i].max())
+                    aggregates[f"{axis}_sum"] = float(values[i].sum())
+                partials.append((device_id, values.shape[1], aggregates))
+
+    result: Dict[uuid.UUID, Dict[str, Dict[str, Any]]] = {}
+    for device_id, count, mapping in partials:
+        if not count:
+            continue
+        device_stats = result.get(device_id)
+        if device_stats is None:
+            result[device_id] = {
+                axis: {
+                    "min": mapping[f"{axis}_min"],
+                    "max": mapping[f"{axis}_max"],
+                    "count": count,
+                    "sum": mapping[f"{axis}_sum"],
+                }
+                for axis in AXES
+            }
+            continue
+        for axis in AXES:
+            stats = device_stats[axis]
+            stats["min"] = min(stats["min"], mapping[f"{axis}_min"])
+            stats["max"] = max(stats["max"], mapping[f"{axis}_max"])
+            stats["count"] += count
+            stats["sum"] += mapping[f"{axis}_sum"]
+
+    return result
+
+
+def _raw_bucket_select(
+    device_id: uuid.UUID,
+    granularity: RollupGranularity,
+    raw_ranges: Sequence[TimeRange],
+):
+    bucket_start = func.date_trunc(granularity.value, Measurement.timestamp)
+    columns: List[Any] = [
+        bucket_start.label("bucket_start"),
+        func.count().label("count"),
+    ]
+    for axis in AXES:
+        column = getattr(Measurement, axis)
+        columns += [
+            func.sum(column).label(f"{axis}_sum"),
+            func.min(column).label(f"{axis}_min"),
+            func.max(column).label(f"{axis}_max"),
+        ]
+    return (
+        select(*columns)
+        .where(
+            Measurement.device_id == device_id,
+            or_(false(), *[raw_range_condition(r) for r in raw_ranges]),
+        )
+        .group_by(bucket_start)
+    )
+
+
+async def get_bucket_series(
+    session: AsyncSession,
+    device_id: uuid.UUID,
+    granularity: RollupGranularity,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    use_rollups: bool,
+    limit: int,
+) -> List[Dict[str, Any]]:
+    """Per-bucket count/min/max/mean of every axis of a device.
+
+    With `use_rollups` whole buckets are read from rollups of the same
+    granularity and only the partial buckets at the window edges are grouped
+    from raw measurements, otherwise the whole window is grouped by
+    `date_trunc`. Compacted samples of the raw part are grouped in NumPy and
+    merged into their buckets. Buckets without measurements are omitted.
+
+    Args:
+        session (AsyncSession): Asynchronous database session
+        device_id (uuid.UUID): Device identifier
+        granularity (RollupGranularity): Bucket size
+        start_date (Optional[datetime]): Inclusive start of the window
+        end_date (Optional[datetime]): Inclusive end of the window
+        use_rollups (bool): Read whole buckets from rollups
+        limit (int): Maximum number of buckets to return
+
+    Returns:
+        List of {"bucket_start", axis: {"min", "max", "count", "mean"}} ordered
+        by bucket start.
+    """
+    end = end_date + timedelta(microseconds=1) if end_date else None
+    window: TimeRange = (start_date, end)
+    core_start = ceil(start_date, granularity) if start_date else None
+    core_end = truncate(end, granularity) if end else None
+
+    if not use_rollups or (
+        core_start is not None and core_end is not None and core_start >= core_end
+    ):
+        raw_ranges = [window]
+        stmt = _raw_bucket_select(device_id, granularity, raw_ranges)
+    else:
+        columns: List[Any] = [
+            MeasurementRollup.bucket_start.label("bucket_start"),
+            MeasurementRollup.count.label("count"),
+        ]
+        for axis in AXES:
+            for name in ("sum", "min", "max"):
+                columns.append(
+                    getattr(MeasurementRollup, f"{axis}_{name}").label(f"{axis}_{name}")
+                )
+        parts: List[Any] = [
+            select(*columns).where(
+                MeasurementRollup.device_id == device_id,
+                _rollup_range_condition(granularity, (core_start, core_end)),
+            )
+        ]
+        raw_ranges = [
+            time_range
+            for time_range in ((start_date, core_start), (core_end, end))
+            if time_range[0] is not None and time_range[0] != time_range[1]
+        ]
+        if raw_ranges:
+            parts.append(_raw_bucket_select(device_id, granularity, raw_ranges))
+        stmt = union_all(*parts)
+
+    series = stmt.subquery()
+    rows = (
+        await session.execute(
+            select(series).order_by(series.c.bucket_start).limit(limit)
+        )
+    ).all()
+
+    # bucket_start: [count, {axis: [sum, min, max]}]
+    buckets: Dict[datetime, List[Any]] = {}
+    for row in rows:
+        mapping = row._mapping
+        buckets[row.bucket_start] = [
+            row.count,
+            {
+                axis: [mapping[f"{axis}_{name}"] for name in ("sum", "min", "max")]
+                for axis in AXES
+            },
+        ]
+
+    # Compacted samples are grouped here, rollups already include them
+    width = GRANULARITY_DELTAS[granularity] // timedelta(microseconds=1)
+    for raw_range in raw_ranges:
+        samples = (
+            await read_cold_samples(session, [device_id], *inclusive_range(raw_range))
+        ).get(device_id)
+        if samples is None:
+            continue
+        timestamps, values = samples
+        keys, counts, sums, mins, maxs = aggregate_groups(timestamps // width, values)
+        for j, key in enumerate(keys.tolist()):
+            bucket = buckets.setdefault(
+                from_microseconds(key * width),
+                [0, {axis: [0.0, np.inf, -np.inf] for axis in AXES}],
+            )
+            bucket[0] += int(counts[j])
+            for i, axis in enumerate(AXES):
+                acc = bucket[1][axis]
+                acc[0] += float(sums[i, j])
+                acc[1] = min(acc[1], float(mins[i, j]))
+                acc[2] = max(acc[2], float(maxs[i, j]))
+
+    result = []
+    for bucket_start in sorted(buckets)[:limit]:
+        count, aggregates = buckets[bucket_start]
+        item: Dict[str, Any] = {"bucket_start": bucket_start}
+        for axis in AXES:
+            total, low, high = aggregates[axis]
+            item[axis] = {
+                "min": low,
+                "max": high,
+                "count": count,
+                "mean": total / count,
+            }
+        result.append(item)
+    return result
+
+
+def merge_stats(
+    stats: Sequence[Dict[str, Dict[str, Any]]],
+) -> Dict[str, Dict[str, Any]]:
+    """Merges per-device results of get_rollup_stats into a single one."""
+    merged: Dict[str, Dict[str, Any]] = {
+        axis: {"min": 0.0, "max": 0.0, "count": 0, "sum": 0.0} for axis in AXES
+    }
+    for device_stats in stats:
+        for axis in AXES:
+            current, other = merged[axis], device_stats[axis]
+            if not current["count"]:
+                merged[axis] = dict(other)
+                continue
+            current["min"] = min(current["min"], other["min"])
+            current["max"] = max(current["max"], other["max"])
+            current["count"] += other["count"]
+            current["sum"] += other["sum"]
+    return merged
+
+
+def rebuild_window(
+    device_id: Optional[uuid.UUID],
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+) -> Optional[TimeRange]:
+    """Whole days of a window whose aggregates can be rebuilt, None if none.
+
+    While retention is enabled, days older than the shortest raw retention of
+    the devices may have lost measurements already: their aggregates are all
+    that is left of them, so they are not rebuilt.
+    """
+    start = truncate(start_date, RollupGranularity.DAY) if start_date else None
+    end = (
+        ceil(end_date + timedelta(microseconds=1), RollupGranularity.DAY)
+        if end_date
+        else None
+    )
+
+    if settings.retention_enabled:
+        overrides = device_raw_retention_days()
+        if device_id is not None:
+            retentions = [overrides.get(device_id, settings.retention_raw_days)]
+        else:
+            retentions = [settings.retention_raw_days, *overrides.values()]
+        kept = [days for days in retentions if days]
+        if kept:
+            first_day = ceil(
+                datetime.now() - timedelta(days=min(kept)), RollupGranularity.DAY
+            )
+            start = max(start, first_day) if start else first_day
+
+    if start is not None and end is not None and start >= end:
+        return None
+    return start, end
+
+
+async def rebuild_rollups(
+    session: AsyncSession,
+    device_id: Optional[uuid.UUID] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> None:
+    """Recomputes rollups from raw, compacted and archived measurements
+    (backfill), no commit.
+
+    The window is widened to whole days so that buckets of every granularity
+    are rebuilt completely, and narrowed to the days rebuild_window allows. Run
+    it for ranges that are not being ingested into, compacted or archived at
+    the same time, concurrent samples of the range may be counted twice.
+    """
+    window = rebuild_window(device_id, start_date, end_date)
+    if window is None:
+        return
+    start, end = window
+
+    delete_stmt = delete(MeasurementRollup)
+    if device_id is not None:
+        delete_stmt = delete_stmt.where(MeasurementRollup.device_id == device_id)
+    if start is not None:
+        delete_stmt = delete_stmt.where(MeasurementRollup.bucket_start >= start)
+    if end is not None:
+        delete_stmt = delete_stmt.where(MeasurementRollup.bucket_start < end)
+    await session.execute(delete_stmt)
+
+    for granularity in RollupGranularity:
+        bucket_start = func.date_trunc(granularity.value, Measurement.timestamp)
+        columns: List[Any] = [
+            Measurement.device_id,
+            literal(granularity.value),
+            bucket_start,
+            func.count(),
+        ]
+        names = ["device_id", "granularity", "bucket_start", "count"]
+        for axis in AXES:
+            column = getattr(Measurement, axis)
+            columns += [
+                func.sum(column),
+                func.min(column),
+                func.max(column),
+                func.sum(column * column),
+            ]
+            names += [f"{axis}_sum", f"{axis}_min", f"{axis}_max", f"{axis}_sum_sq"]
+
+        select_stmt = select(*columns).group_by(Measurement.device_id, bucket_start)
+        if device_id is not None:
+            select_stmt = select_stmt.where(Measurement.device_id == device_id)
+        if start is not None:
+            select_stmt = select_stmt.where(Measurement.timestamp >= start)
+        if end is not None:
+            select_stmt = select_stmt.where(Measurement.timestamp < end)
+
+        await session.execute(insert(MeasurementRollup).from_select(names, select_stmt))
+
+    # Buckets of a day may hold raw, compacted and archived samples at once
+    async for samples in iter_cold_day_samples(
+        session, device_id, *inclusive_range(window)
+    ):
+        await _upsert_rollups(session, _aggregate_samples(samples))
+
+
+async def _main() -> None:
+    from src.database.database import sessionmanager
+    from src.database.sketches import rebuild_sketches
+
+    parser = argparse.ArgumentParser(
+        description="Rebuild measurement rollups and quantile sketches"
+    )
+    parser.add_argument("--device-id", type=uuid.UUID, default=None)
+    parser.add_argument("--start", type=datetime.fromisoformat, default=None)
+    parser.add_argument("--end", type=datetime.fromisoformat, default=None)
+    args = parser.parse_args()
+
+    sessionmanager.init(settings.db_connection_url)
+    try:
+        async with sessionmanager.session() as session:
+            await rebuild_rollups(session, args.device_id, args.start, args.end)
+            await rebuild_sketches(session, args.device_id, args.start, args.end)
+            await session.commit()
+    finally:
+        await sessionmanager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,386 @@
+"""Mergeable quantile sketches of measurements.
+
+Each device axis gets a log-scale histogram per hour and day bucket: a value v
+falls into the bin with key ceil(log_gamma(|v|)) (signed, see SketchMapping),
+where gamma = (1 + a) / (1 - a) for the configured relative accuracy a. Any
+quantile read back from the bins is within a relative error of a, and sketches
+of different buckets or devices merge by summing counts of equal keys, so
+quantiles of arbitrary windows cost a GROUP BY over bins instead of a sort over
+raw values.
+
+Bins are only comparable for the same accuracy: after changing
+`sketch_relative_accuracy` rebuild them with `python -m src.database.rollups`.
+Days that raw retention may have thinned out already are not rebuilt.
+"""
+
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import uuid
+
+import numpy as np
+from numpy.typing import NDArray
+from sqlalchemy import (
+    Integer,
+    and_,
+    case,
+    cast,
+    delete,
+    false,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+    union_all,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.aggregates import AXES
+from src.database.blocks import Samples, from_microseconds
+from src.database.models import Measurement, MeasurementSketchBin
+from src.database.rollups import (
+    GRANULARITY_DELTAS,
+    RollupGranularity,
+    TimeRange,
+    inclusive_range,
+    raw_range_condition,
+    rebuild_window,
+    split_window,
+    truncate,
+)
+from src.database.tiers import iter_cold_day_samples, read_cold_columns
+from src.settings import settings
+
+SKETCH_GRANULARITIES = [RollupGranularity.DAY, RollupGranularity.HOUR]
+SKETCH_UPSERT_PAGE_SIZE = 1000
+APPROX_PERCENTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+SKETCH_BIN_COLUMNS = [
+    "device_id",
+    "granularity",
+    "bucket_start",
+    "axis",
+    "key",
+    "count",
+]
+
+# {key: count} of one sketch
+SketchBins = Dict[int, int]
+# {(device_id, granularity, bucket_start, axis, key): count}
+BinCounts = Dict[Tuple[uuid.UUID, str, datetime, str, int], int]
+
+
+class SketchMapping:
+    """Maps values to signed log-scale bin keys and back.
+
+    Positive values get keys above KEY_OFFSET, negative values the mirrored
+    negative keys and values closer to zero than `min_value` key 0, so sorting
+    keys sorts the values they stand for.
+    """
+
+    KEY_OFFSET = 1 << 20
+
+    def __init__(self, relative_accuracy: float, min_value: float = 1e-9) -> None:
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._ln_gamma = math.log(self.gamma)
+
+    def key(self, value: float) -> int:
+        if abs(value) < self.min_value:
+            return 0
+        index = math.ceil(math.log(abs(value)) / self._ln_gamma) + self.KEY_OFFSET
+        return index if value > 0 else -index
+
+    def keys(self, values: NDArray[np.float64]) -> NDArray[np.int64]:
+        """Same as `key` for an array of values."""
+        magnitudes = np.abs(values)
+        small = magnitudes < self.min_value
+        indices = np.ceil(np.log(np.where(small, 1.0, magnitudes)) / self._ln_gamma)
+        keys = indices.astype(np.int64) + self.KEY_OFFSET
+        return np.where(small, 0, np.where(values > 0, keys, -keys))
+
+    def value(self, key: int) -> float:
+        if key == 0:
+            return 0.0
+        index = abs(key) - self.KEY_OFFSET
+        value = 2 * self.gamma**index / (self.gamma + 1)
+        return value if key > 0 else -value
+
+    def sql_key(self, column: Any) -> Any:
+        """Same as `key`, computed by the database for raw measurement columns."""
+        index = cast(func.ceil(func.ln(func.abs(column)) / self._ln_gamma), Integer)
+        return case(
+            (func.abs(column) < self.min_value, 0),
+            (column > 0, index + self.KEY_OFFSET),
+            else_=-(index + self.KEY_OFFSET),
+        )
+
+
+sketch_mapping = SketchMapping(settings.sketch_relative_accuracy)
+
+
+def merge_bins(sketches: Iterable[SketchBins]) -> SketchBins:
+    merged: SketchBins = defaultdict(int)
+    for bins in sketches:
+        for key, count in bins.items():
+            merged[key] += count
+    return dict(merged)
+
+
+def get_quantiles(
+    bins: SketchBins,
+    quantiles: Dict[str, float] = APPROX_PERCENTILES,
+) -> Dict[str, float]:
+    """Reads named quantiles (e.g. {"p50": 0.5}) from sketch bins."""
+    total = sum(bins.values())
+    if not total:
+        return {name: 0.0 for name in quantiles}
+
+    keys = sorted(bins)
+    result = {}
+    for name, quantile in quantiles.items():
+        rank = quantile * (total - 1)
+        cumulative = 0
+        for key in keys:
+            cumulative += bins[key]
+            if cumulative > rank:
+                break
+        result[name] = sketch_mapping.value(key)
+    return result
+
+
+def with_quantiles(stats: Dict[str, Any], bins: SketchBins) -> Dict[str, Any]:
+    """Adds approximate median and percentiles to rollup stats of one axis.
+
+    Estimates are clamped into the exact [min, max] known from the rollups.
+    """
+    low, high = stats["min"], stats["max"]
+    percentiles = {
+        name: min(max(value, low), high) for name, value in get_quantiles(bins).items()
+    }
+    return {**stats, "median": percentiles["p50"], "percentiles": percentiles}
+
+
+def _sample_bin_counts(samples: Dict[uuid.UUID, Samples]) -> BinCounts:
+    counts: BinCounts = defaultdict(int)
+    for device_id, (timestamps, values) in samples.items():
+        for granularity in SKETCH_GRANULARITIES:
+            name = granularity.value
+            width = GRANULARITY_DELTAS[granularity] // timedelta(microseconds=1)
+            buckets = timestamps // width
+            for i, axis in enumerate(AXES):
+                pairs, pair_counts = np.unique(
+                    np.stack([buckets, sketch_mapping.keys(values[i])]),
+                    axis=1,
+                    return_counts=True,
+                )
+                for (bucket, key), count in zip(pairs.T.tolist(), pair_counts.tolist()):
+                    bucket_start = from_microseconds(bucket * width)
+                    counts[(device_id, name, bucket_start, axis, key)] += count
+    return counts
+
+
+async def _upsert_bins(session: AsyncSession, counts: BinCounts) -> None:
+    if not counts:
+        return
+
+    # Sorted so concurrent upserts lock bin rows in the same order
+    values = [
+        {
+            "device_id": device_id,
+            "granularity": granularity,
+            "bucket_start": bucket_start,
+            "axis": axis,
+            "key": key,
+            "count": count,
+        }
+        for (device_id, granularity, bucket_start, axis, key), count in sorted(
+            counts.items()
+        )
+    ]
+
+    table = MeasurementSketchBin.metadata.tables[MeasurementSketchBin.__tablename__]
+    stmt = pg_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["device_id", "granularity", "bucket_start", "axis", "key"],
+        set_={"count": table.c.count + stmt.excluded.count},
+    )
+    for offset in range(0, len(values), SKETCH_UPSERT_PAGE_SIZE):
+        await session.execute(stmt, values[offset:offset + SKETCH_UPSERT_PAGE_SIZE])
+
+
+async def update_sketches(
+    session: AsyncSession,
+    rows: Sequence[Sequence[Any]],
+) -> None:
+    """Adds freshly inserted measurement rows to the sketches (no commit).
+
+    Args:
+        session (AsyncSession): Session of the transaction that inserted the rows
+        rows: (id, device_id, timestamp, x, y, z) measurement rows
+    """
+    counts: BinCounts = defaultdict(int)
+    for row in rows:
+        device_id, timestamp = row[1], row[2]
+        keys = [(axis, sketch_mapping.key(row[3 + i])) for i, axis in enumerate(AXES)]
+        for granularity in SKETCH_GRANULARITIES:
+            bucket_start = truncate(timestamp, granularity)
+            for axis, key in keys:
+                counts[(device_id, granularity.value, bucket_start, axis, key)] += 1
+
+    await _upsert_bins(session, counts)
+
+
+def _bucket_range_condition(granularity: RollupGranularity, time_range: TimeRange):
+    start, end = time_range
+    conditions = [MeasurementSketchBin.granularity == granularity.value]
+    if start is not None:
+        conditions.append(MeasurementSketchBin.bucket_start >= start)
+    if end is not None:
+        conditions.append(MeasurementSketchBin.bucket_start < end)
+    return and_(*conditions)
+
+
+async def get_sketches(
+    session: AsyncSession,
+    device_ids: Sequence[uuid.UUID],
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+) -> Dict[uuid.UUID, Dict[str, SketchBins]]:
+    """Per-device sketch of every axis for a window, merged by the database.
+
+    Whole hour and day buckets are read from stored bins, sub-hour edges are
+    binned from raw measurements on the fly (live ones by the database,
+    compacted ones with NumPy). Only bins travel to the client,
+    so the result size does not depend on the number of samples.
+
+    Args:
+        session (AsyncSession): Asynchronous database session
+        device_ids (Sequence[uuid.UUID]): Device identifiers
+        start_date (Optional[datetime]): Inclusive start of the window
+        end_date (Optional[datetime]): Inclusive end of the window
+
+    Returns:
+        Dict mapping device id to {axis: {key: count}}.
+    """
+    end = end_date + timedelta(microseconds=1) if end_date else None
+    bucket_ranges, raw_ranges = split_window(start_date, end, SKETCH_GRANULARITIES)
+
+    parts: List[Any] = []
+    if bucket_ranges:
+        parts.append(
+            select(
+                MeasurementSketchBin.device_id,
+                MeasurementSketchBin.axis,
+                MeasurementSketchBin.key,
+                MeasurementSketchBin.count,
+            ).where(
+                MeasurementSketchBin.device_id.in_(device_ids),
+                or_(
+                    false(),
+                    *[
+                        _bucket_range_condition(granularity, time_range)
+                        for granularity, time_range in bucket_ranges
+                    ],
+                ),
+            )
+        )
+    if raw_ranges:
+        raw_condition = or_(false(), *[raw_range_condition(r) for r in raw_ranges])
+        for axis in AXES:
+            key = sketch_mapping.sql_key(getattr(Measurement, axis))
+            parts.append(
+                select(
+                    Measurement.device_id,
+                    literal(axis).label("axis"),
+                    key.label("key"),
+                    func.count().label("count"),
+                )
+                .where(Measurement.device_id.in_(device_ids), raw_condition)
+                .group_by(Measurement.device_id, key)
+            )
+
+    result: Dict[uuid.UUID, Dict[str, SketchBins]] = {}
+    if parts:
+        bins = union_all(*parts).subquery()
+        stmt = select(
+            bins.c.device_id, bins.c.axis, bins.c.key, func.sum(bins.c.count)
+        ).group_by(bins.c.device_id, bins.c.axis, bins.c.key)
+        for device_id, axis, key, count in (await session.execute(stmt)).all():
+            device_bins = result.setdefault(device_id, {a: {} for a in AXES})
+            device_bins[axis][key] = int(count)
+
+    # Compacted samples of the edges are binned here, stored bins include them
+    for raw_range in raw_ranges:
+        cold = await read_cold_columns(session, device_ids, *inclusive_range(raw_range))
+        for device_id, values in cold.items():
+            device_bins = result.setdefault(device_id, {a: {} for a in AXES})
+            for i, axis in enumerate(AXES):
+                keys, counts = np.unique(
+                    sketch_mapping.keys(values[i]), return_counts=True
+                )
+                axis_bins = device_bins[axis]
+                for key, count in zip(keys.tolist(), counts.tolist()):
+                    axis_bins[key] = axis_bins.get(key, 0) + count
+    return result
+
+
+async def rebuild_sketches(
+    session: AsyncSession,
+    device_id: Optional[uuid.UUID] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> None:
+    """Recomputes sketch bins from raw, compacted and archived measurements
+    (backfill), no commit.
+
+    Same contract as rollups.rebuild_rollups: the window is widened to whole
+    days, narrowed to the days rollups.rebuild_window allows and must not be
+    ingested into, compacted or archived while it is rebuilt.
+    """
+    window = rebuild_window(device_id, start_date, end_date)
+    if window is None:
+        return
+    start, end = window
+
+    delete_stmt = delete(MeasurementSketchBin)
+    if device_id is not None:
+        delete_stmt = delete_stmt.where(MeasurementSketchBin.device_id == device_id)
+    if start is not None:
+        delete_stmt = delete_stmt.where(MeasurementSketchBin.bucket_start >= start)
+    if end is not None:
+        delete_stmt = delete_stmt.where(MeasurementSketchBin.bucket_start < end)
+    await session.execute(delete_stmt)
+
+    for granularity in SKETCH_GRANULARITIES:
+        bucket_start = func.date_trunc(granularity.value, Measurement.timestamp)
+        for axis in AXES:
+            key = sketch_mapping.sql_key(getattr(Measurement, axis))
+            select_stmt = select(
+                Measurement.device_id,
+                literal(granularity.value),
+                bucket_start,
+                literal(axis),
+                key,
+                func.count(),
+            ).group_by(Measurement.device_id, bucket_start, key)
+            if device_id is not None:
+                select_stmt = select_stmt.where(Measurement.device_id == device_id)
+            if start is not None:
+                select_stmt = select_stmt.where(Measurement.timestamp >= start)
+            if end is not None:
+                select_stmt = select_stmt.where(Measurement.timestamp < end)
+
+            await session.execute(
+                insert(MeasurementSketchBin).from_select(
+                    SKETCH_BIN_COLUMNS, select_stmt
+                )
+            )
+
+    async for samples in iter_cold_day_samples(
+        session, device_id, *inclusive_range(window)
+    ):
+        await _upsert_bins(session, _sample_bin_counts(samples))
@@ -0,0 +1,279 @@
+"""Reads of measurements moved out of the `measurements` table.
+
+Compaction (src/database/blocks.py, `blocks_enabled`) moves measurements into
+compressed blocks, archiving (src/database/archive.py, `archive_enabled`)
+into Parquet files. Every read of measurements (stats, series, downsampling,
+exports and the raw edges of rollups and sketches) merges them back in
+through these functions, so results do not depend on where a measurement is
+stored. A tier is only read while it is enabled.
+
+Windows are inclusive [start_date, end_date], like in the DAOs.
+"""
+
+from bisect import bisect_right
+from datetime import date, datetime, time, timedelta
+from typing import (
+    Any,
+    AsyncGenerator,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Set,
+)
+import uuid
+
+import numpy as np
+from sqlalchemy import Date, cast, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.archive import (
+    archived_days,
+    iter_archived_rows,
+    read_archived_columns,
+    read_archived_samples,
+)
+from src.database.blocks import (
+    BlockRow,
+    Samples,
+    iter_block_rows,
+    read_block_columns,
+    read_block_samples,
+)
+from src.database.models import Device, Measurement, MeasurementBlock
+from src.settings import settings
+from src.stats import Columns, to_columns
+
+# Devices read together by iter_cold_day_samples
+COLD_DAY_DEVICE_PAGE_SIZE = 1000
+
+
+def cold_tiers_enabled() -> bool:
+    """Whether measurements may live outside the `measurements` table."""
+    return bool(settings.blocks_enabled or settings.archive_enabled)
+
+
+def measurement_key(row: Sequence[Any]) -> Any:
+    """(timestamp, id) keyset order of (id, device_id, timestamp, x, y, z) rows."""
+    return row[2], row[0]
+
+
+def _concatenate_columns(
+    parts: List[Dict[uuid.UUID, Columns]],
+) -> Dict[uuid.UUID, Columns]:
+    merged: Dict[uuid.UUID, List[Columns]] = {}
+    for part in parts:
+        for device_id, values in part.items():
+            merged.setdefault(device_id, []).append(values)
+    return {device_id: np.hstack(values) for device_id, values in merged.items()}
+
+
+def _concatenate_samples(
+    parts: List[Dict[uuid.UUID, Samples]],
+) -> Dict[uuid.UUID, Samples]:
+    merged: Dict[uuid.UUID, List[Samples]] = {}
+    for part in parts:
+        for device_id, samples in part.items():
+            merged.setdefault(device_id, []).append(samples)
+
+    result = {}
+    for device_id, device_parts in merged.items():
+        if len(device_parts) == 1:
+            result[device_id] = device_parts[0]
+            continue
+        timestamps = np.concatenate([timestamps for timestamps, _ in device_parts])
+        order = np.argsort(timestamps, kind="stable")
+        values = np.hstack([values for _, values in device_parts])
+        result[device_id] = (timestamps[order], values[:, order])
+    return result
+
+
+async def read_cold_columns(
+    session: AsyncSession,
+    device_ids: Sequence[uuid.UUID],
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+) -> Dict[uuid.UUID, Columns]:
+    """Values of the devices' compacted and archived samples in a window, see
+    stats.to_columns. Devices without any are omitted.
+    """
+    parts = []
+    if settings.blocks_enabled and device_ids:
+        parts.append(
+            await read_block_columns(session, device_ids, start_date, end_date)
+        )
+    if settings.archive_enabled and device_ids:
+        parts.append(await read_archived_columns(device_ids, start_date, end_date))
+    return _concatenate_columns(parts)
+
+
+async def read_cold_samples(
+    session: AsyncSession,
+    device_ids: Sequence[uuid.UUID],
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+) -> Dict[uuid.UUID, Samples]:
+    """Ascending timestamps and values of the devices' compacted and archived
+    samples in a window. Devices without any are omitted.
+    """
+    parts = []
+    if settings.blocks_enabled and device_ids:
+        parts.append(
+            await read_block_samples(session, device_ids, start_date, end_date)
+        )
+    if settings.archive_enabled and device_ids:
+        parts.append(await read_archived_samples(device_ids, start_date, end_date))
+    return _concatenate_samples(parts)
+
+
+async def read_all_columns(
+    session: AsyncSession,
+    device_ids: Sequence[uuid.UUID],
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    cold_values: Dict[uuid.UUID, Columns],
+) -> Dict[uuid.UUID, Columns]:
+    """Values of the devices in a window, live rows merged with `cold_values`
+    (see read_cold_columns). Devices without any are omitted.
+    """
+    query = select(
+        Measurement.device_id, Measurement.x, Measurement.y, Measurement.z
+    ).where(Measurement.device_id.in_(device_ids))
+    if start_date:
+        query = query.where(Measurement.timestamp >= start_date)
+    if end_date:
+        query = query.where(Measurement.timestamp <= end_date)
+
+    rows: Dict[uuid.UUID, List[Any]] = {}
+    for row in (await session.execute(query)).all():
+        rows.setdefault(row.device_id, []).append(row)
+    live_values = {
+        device_id: to_columns(device_rows, start=1)
+        for device_id, device_rows in rows.items()
+    }
+    return _concatenate_columns([live_values, cold_values])
+
+
+async def merge_row_batches(
+    sources: Sequence[AsyncGenerator[List[Any], None]],
+    key: Callable[[Any], Any],
+) -> AsyncGenerator[List[Any], None]:
+    """Merges batches of rows from sources that are each sorted by `key`.
+
+    A source is only read when all of its buffered rows were sent, so at most
+    one batch per source is held in memory. Sources are closed with the
+    merged stream.
+    """
+    pending: List[List[Any]] = [[] for _ in sources]
+    running = [True] * len(sources)
+    try:
+        while True:
+            for i, source in enumerate(sources):
+                while running[i] and not pending[i]:
+                    try:
+                        pending[i] = list(await anext(source))
+                    except StopAsyncIteration:
+                        running[i] = False
+            if not any(pending):
+                return
+
+            # Rows up to the smallest last row of the running sources are
+            # final: every row still to come from a source sorts after it.
+            limits = [key(rows[-1]) for rows, alive in zip(pending, running) if alive]
+            batch = []
+            for i, rows in enumerate(pending):
+                end = bisect_right(rows, min(limits), key=key) if limits else len(rows)
+                batch += rows[:end]
+                pending[i] = rows[end:]
+            batch.sort(key=key)
+            yield batch
+    finally:
+        for source in sources:
+            await source.aclose()
+
+
+async def iter_cold_rows(
+    session: AsyncSession,
+    device_ids: Sequence[uuid.UUID],
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+) -> AsyncGenerator[List[BlockRow], None]:
+    """Compacted and archived rows of the devices in a window, ordered by
+    (device_id, timestamp, id).
+    """
+    for device_id in sorted(device_ids):
+        sources = []
+        if settings.blocks_enabled:
+            sources.append(iter_block_rows(session, device_id, start_date, end_date))
+        if settings.archive_enabled:
+            sources.append(iter_archived_rows(device_id, start_date, end_date))
+        async for batch in merge_row_batches(sources, measurement_key):
+            yield batch
+
+
+async def _cold_days(
+    session: AsyncSession,
+    device_id: Optional[uuid.UUID],
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+) -> List[date]:
+    days: Set[date] = set()
+    if settings.blocks_enabled:
+        stmt = select(
+            cast(MeasurementBlock.first_timestamp, Date),
+            cast(MeasurementBlock.last_timestamp, Date),
+        ).distinct()
+        if device_id is not None:
+            stmt = stmt.where(MeasurementBlock.device_id == device_id)
+        if start_date is not None:
+            stmt = stmt.where(MeasurementBlock.last_timestamp >= start_date)
+        if end_date is not None:
+            stmt = stmt.where(MeasurementBlock.first_timestamp <= end_date)
+        for first, last in (await session.execute(stmt)).all():
+            days.update(
+                first + timedelta(days=i) for i in range((last - first).days + 1)
+            )
+    if settings.archive_enabled:
+        days.update(archived_days(start_date, end_date))
+    return sorted(
+        day
+        for day in days
+        if (start_date is None or day >= start_date.date())
+        and (end_date is None or day <= end_date.date())
+    )
+
+
+async def iter_cold_day_samples(
+    session: AsyncSession,
+    device_id: Optional[uuid.UUID],
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+) -> AsyncGenerator[Dict[uuid.UUID, Samples], None]:
+    """Compacted and archived samples of a device (of all devices when None)
+    in a window, one day of up to COLD_DAY_DEVICE_PAGE_SIZE devices at a time.
+    """
+    days = await _cold_days(session, device_id, start_date, end_date)
+    if not days:
+        return
+    if device_id is not None:
+        device_ids = [device_id]
+    else:
+        device_ids = list(
+            (await session.scalars(select(Device.id).order_by(Device.id))).all()
+        )
+
+    for day in days:
+        day_start = datetime.combine(day, time())
+        day_end = day_start + timedelta(days=1, microseconds=-1)
+        window_start = max(day_start, start_date) if start_date else day_start
+        window_end = min(day_end, end_date) if end_date else day_end
+        for offset in range(0, len(device_ids), COLD_DAY_DEVICE_PAGE_SIZE):
+            samples = await read_cold_samples(
+                session,
+                device_ids[offset:offset + COLD_DAY_DEVICE_PAGE_SIZE],
+                window_start,
+                window_end,
+            )
+            if samples:
+                yield samples
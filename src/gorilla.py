@@ -0,0 +1,173 @@
+"""Compression of measurement blocks.
+
+A block holds the samples of one device in one time block as separate
+streams: timestamps (microseconds) as zigzag encoded delta-of-deltas and
+every axis as XORs of consecutive float64 bit patterns, the transforms of
+"Gorilla: A Fast, Scalable, In-Memory Time Series Database" (Pelkonen et al.,
+VLDB 2015). Regularly sampled timestamps and slowly changing values turn into
+words that are mostly zero bytes.
+
+Instead of Gorilla's variable-length bit packing, which can only be decoded
+sample by sample, every stream is byte-shuffled (byte i of all words stored
+together, so the zero bytes form long runs) and deflated with zlib. Decoding
+is one zlib call plus a few NumPy passes (cumulative sums, cumulative XOR),
+no Python loop over samples.
+
+Sample ids (UUIDv7) are kept as a stream of their high words, which hold the
+millisecond time and are delta encoded like timestamps, followed by their
+random low words as they are: about 9 bytes per sample.
+
+Layout: magic, little-endian uint32 sample count and byte length of every
+stream, followed by the timestamp stream, the x, y and z streams and the id
+stream. Streams are decoded independently, so stats decode the values only.
+"""
+
+import struct
+from typing import List, Sequence
+import uuid
+import zlib
+
+import numpy as np
+from numpy.typing import NDArray
+
+from src.database.aggregates import AXES
+from src.stats import Columns
+
+_MAGIC = b"GZB3"
+# count, timestamps, axes, ids
+_HEADER = struct.Struct(f"<4s{3 + len(AXES)}I")
+_WORD_BYTES = 8
+_COMPRESSION_LEVEL = 6
+
+
+def _shuffle(words: NDArray[np.uint64]) -> bytes:
+    return words.view(np.uint8).reshape(-1, _WORD_BYTES).T.tobytes()
+
+
+def _unshuffle(data: bytes, count: int) -> NDArray[np.uint64]:
+    shuffled = np.frombuffer(data, dtype=np.uint8).reshape(_WORD_BYTES, count)
+    return np.ascontiguousarray(shuffled.T).view(np.uint64).ravel()
+
+
+def _compress(words: NDArray[np.uint64]) -> bytes:
+    return zlib.compress(_shuffle(words), _COMPRESSION_LEVEL)
+
+
+def _decompress(data: bytes, count: int) -> NDArray[np.uint64]:
+    raw = zlib.decompress(data)
+    if len(raw) != count * _WORD_BYTES:
+        raise ValueError("corrupt block stream")
+    return _unshuffle(raw, count)
+
+
+def _zigzag(values: NDArray[np.int64]) -> NDArray[np.uint64]:
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+
+def _unzigzag(words: NDArray[np.uint64]) -> NDArray[np.int64]:
+    return (words >> np.uint64(1)).view(np.int64) ^ -(words & np.uint64(1)).view(
+        np.int64
+    )
+
+
+def encode_timestamps(timestamps: Sequence[int]) -> bytes:
+    """Delta-of-delta encodes ascending microsecond timestamps."""
+    if not len(timestamps):
+        return b""
+    values = np.asarray(timestamps, dtype=np.int64)
+    # [t0, t1 - 2 t0, (t2 - t1) - (t1 - t0), ...]: cumsum twice restores it
+    dods = np.diff(np.diff(values, prepend=0), prepend=0)
+    return _compress(_zigzag(dods))
+
+
+def decode_timestamps(data: bytes, count: int) -> NDArray[np.int64]:
+    if not count:
+        return np.empty(0, dtype=np.int64)
+    return np.cumsum(np.cumsum(_unzigzag(_decompress(data, count))))
+
+
+def encode_values(values: Sequence[float]) -> bytes:
+    """XOR encodes float64 values."""
+    bits = np.asarray(values, dtype=np.float64).view(np.uint64)
+    if not len(bits):
+        return b""
+    xors = bits.copy()
+    xors[1:] ^= bits[:-1]
+    return _compress(xors)
+
+
+def decode_values(data: bytes, count: int) -> NDArray[np.float64]:
+    if not count:
+        return np.empty(0, dtype=np.float64)
+    return np.bitwise_xor.accumulate(_decompress(data, count)).view(np.float64)
+
+
+def encode_ids(ids: Sequence[uuid.UUID]) -> bytes:
+    """Delta encodes the high words of (UUIDv7) ids, keeps the low words."""
+    if not len(ids):
+        return b""
+    words = np.frombuffer(b"".join(id_.bytes for id_ in ids), dtype=">u8")
+    words = words.astype(np.uint64).reshape(-1, 2)
+    high = words[:, 0].astype(np.int64)
+    # Differences wrap around, cumsum in decode_ids wraps back
+    deltas = high.copy()
+    deltas[1:] -= high[:-1]
+    return _compress(np.concatenate([_zigzag(deltas), words[:, 1]]))
+
+
+def decode_ids(data: bytes, count: int) -> List[uuid.UUID]:
+    if not count:
+        return []
+    words = _decompress(data, 2 * count)
+    high = np.cumsum(_unzigzag(words[:count])).view(np.uint64)
+    raw = np.stack([high, words[count:]], axis=1).astype(">u8").tobytes()
+    return [uuid.UUID(bytes=raw[i:i + 16]) for i in range(0, len(raw), 16)]
+
+
+def encode_block(
+    timestamps: Sequence[int], values: Columns, ids: Sequence[uuid.UUID]
+) -> bytes:
+    """Encodes ascending microsecond timestamps, their (axes, n) values and
+    sample ids.
+    """
+    streams = [
+        encode_timestamps(timestamps),
+        *(encode_values(values[i]) for i in range(len(AXES))),
+        encode_ids(ids),
+    ]
+    header = _HEADER.pack(_MAGIC, len(timestamps), *map(len, streams))
+    return header + b"".join(streams)
+
+
+def _streams(data: bytes) -> tuple[int, List[bytes]]:
+    magic, count, *lengths = _HEADER.unpack_from(data)
+    if magic != _MAGIC:
+        raise ValueError("unsupported block format")
+    streams = []
+    offset = _HEADER.size
+    for length in lengths:
+        streams.append(data[offset:offset + length])
+        offset += length
+    return count, streams
+
+
+def block_count(data: bytes) -> int:
+    return _streams(data)[0]
+
+
+def decode_block_timestamps(data: bytes) -> NDArray[np.int64]:
+    count, streams = _streams(data)
+    return decode_timestamps(streams[0], count)
+
+
+def decode_block_values(data: bytes) -> Columns:
+    """Values of a block as an (axes, n) array, timestamps are not decoded."""
+    count, streams = _streams(data)
+    return np.vstack(
+        [decode_values(stream, count) for stream in streams[1:1 + len(AXES)]]
+    )
+
+
+def decode_block_ids(data: bytes) -> List[uuid.UUID]:
+    count, streams = _streams(data)
+    return decode_ids(streams[-1], count)
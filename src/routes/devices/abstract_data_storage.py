@@ -1,16 +1,31 @@
 from abc import ABC, abstractmethod
 from datetime import datetime
-from typing import List, Optional
+from typing import AsyncIterator, Iterable, List, Optional, Set
 import uuid
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.routes.devices.schemas import (
+    DEVICES_PAGE_DEFAULT_LIMIT,
+    MEASUREMENTS_PAGE_DEFAULT_LIMIT,
+    DeviceBatchRegisterResponse,
+    DevicePage,
     DeviceSchema,
     DeviceStatsResponse,
+    DeviceStatsSeriesResponse,
+    DeviceUserAssignmentSchema,
+    DeviceUserBatchResponse,
     DeviceWithUsersSchema,
+    DownsampleMethod,
+    MeasurementBatchItemSchema,
+    MeasurementBatchResponse,
     MeasurementCreateSchema,
+    MeasurementPage,
+    MeasurementPointSchema,
+    MeasurementRow,
     MeasurementSchema,
     PartialDeviceSchema,
+    StatsAccuracy,
+    StatsBucket,
     UserSchema,
 )
 
@@ -53,14 +68,48 @@ class DeviceDataStorage(ABC):
         pass
 
     @abstractmethod
-    async def get_all_devices(self, session: AsyncSession) -> list[DeviceSchema]:
-        """Retrieve devices.
+    async def register_new_devices(
+        self,
+        session: AsyncSession,
+        serial_numbers: List[str],
+    ) -> DeviceBatchRegisterResponse:
+        """Register many devices with one set-based insert in one transaction.
 
         Args:
             session (AsyncSession): Asynchronous database session
+            serial_numbers (List[str]): Serial numbers, repeats allowed
 
         Returns:
-            list[DeviceSchema]: List of devices
+            DeviceBatchRegisterResponse: Device and outcome of every serial
+                number (`created` or `exists`), in request order
+        """
+        pass
+
+    @abstractmethod
+    async def get_all_devices(
+        self,
+        session: AsyncSession,
+        limit: int = DEVICES_PAGE_DEFAULT_LIMIT,
+        cursor: Optional[str] = None,
+        serial_number_prefix: Optional[str] = None,
+        with_total: bool = False,
+    ) -> DevicePage:
+        """Retrieve a page of devices ordered by serial number (keyset pagination).
+
+        Args:
+            session (AsyncSession): Asynchronous database session
+            limit (int): Maximum number of devices in the page
+            cursor (Optional[str]): `next_cursor` of the previous page
+            serial_number_prefix (Optional[str]): Only devices whose serial
+                number starts with this prefix
+            with_total (bool): Include an estimated number of matching devices
+
+        Returns:
+            DevicePage: Devices of the page and the cursor of the next page
+
+        Raises:
+            DeviceNotFoundException: If no device matches (first page only)
+            InvalidCursorException: If the cursor is malformed
         """
         pass
 
@@ -71,6 +120,8 @@ class DeviceDataStorage(ABC):
         device_id: uuid.UUID,
         start_date: Optional[datetime],
         end_date: Optional[datetime],
+        use_rollups: bool = False,
+        accuracy: StatsAccuracy = StatsAccuracy.EXACT,
     ) -> DeviceStatsResponse:
         """Calculate aggregate statistics for device within specified time window.
 
@@ -78,12 +129,74 @@ class DeviceDataStorage(ABC):
             session (AsyncSession): Asynchronous database session
             start_date (Optional[datetime]): Measurements taken after this timestamp
             end_date (Optional[datetime]): Measurements taken before this timestamp
+            use_rollups (bool): Answer from time-bucket rollups, without median
+            accuracy (StatsAccuracy): APPROX answers from rollups and quantile
+                sketches, with approximate median and percentiles
 
         Returns:
             DeviceStatsResponse: Aggregated statistics
         """
         pass
 
+    @abstractmethod
+    def iter_devices_stats(
+        self,
+        session: AsyncSession,
+        device_ids: List[uuid.UUID],
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        use_rollups: bool = False,
+        accuracy: StatsAccuracy = StatsAccuracy.EXACT,
+    ) -> AsyncIterator[DeviceStatsResponse]:
+        """Calculate statistics of many devices with one grouped query.
+
+        Stats are yielded per device as soon as they are available. Devices
+        that do not exist or have no measurements in the window are skipped.
+
+        Args:
+            session (AsyncSession): Asynchronous database session, must stay
+                open while the stats are consumed
+            device_ids (List[uuid.UUID]): Device identifiers
+            start_date (Optional[datetime]): Measurements taken after this timestamp
+            end_date (Optional[datetime]): Measurements taken before this timestamp
+            use_rollups (bool): Answer from time-bucket rollups, without median
+            accuracy (StatsAccuracy): APPROX answers from rollups and quantile
+                sketches, with approximate median and percentiles
+
+        Yields:
+            DeviceStatsResponse: Aggregated statistics of one device
+        """
+        pass
+
+    @abstractmethod
+    async def get_device_stats_series(
+        self,
+        session: AsyncSession,
+        device_id: uuid.UUID,
+        bucket: StatsBucket,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+    ) -> DeviceStatsSeriesResponse:
+        """Calculate statistics for every time bucket of a window in one query.
+
+        Args:
+            session (AsyncSession): Asynchronous database session
+            device_id (uuid.UUID): Device identifier
+            bucket (StatsBucket): Bucket size
+            start_date (Optional[datetime]): Measurements taken after this timestamp
+            end_date (Optional[datetime]): Measurements taken before this timestamp
+
+        Returns:
+            DeviceStatsSeriesResponse: Statistics of non-empty buckets
+
+        Raises:
+            DeviceNotFoundException: If the device does not exist
+            MeasurementNotFoundException: If there are no measurements in the window
+            StatsSeriesTooLargeException: If the window holds more than
+                STATS_SERIES_MAX_BUCKETS buckets
+        """
+        pass
+
     @abstractmethod
     async def add_measurement(
         self,
@@ -103,6 +216,64 @@ class DeviceDataStorage(ABC):
         """
         pass
 
+    @abstractmethod
+    async def add_measurements_batch(
+        self,
+        session: AsyncSession,
+        device_id: uuid.UUID,
+        measurements: List[MeasurementBatchItemSchema],
+        return_ids: bool = False,
+    ) -> MeasurementBatchResponse:
+        """Add many measurements for a specific device in a single transaction.
+
+        Args:
+            session (AsyncSession): Asynchronous database session
+            device_id (uuid.UUID): Device identifier
+            measurements (List[MeasurementBatchItemSchema]): Measurement samples
+            return_ids (bool): Whether to return identifiers of created rows
+
+        Returns:
+            MeasurementBatchResponse: Number of created measurements (and their ids)
+        """
+        pass
+
+    @abstractmethod
+    async def insert_measurement_rows(
+        self,
+        session: AsyncSession,
+        rows: List[MeasurementRow],
+    ) -> None:
+        """Write prepared measurement rows in bulk without committing.
+
+        Rows are not checked against existing devices up front, the caller is
+        responsible for that and for committing the transaction.
+
+        Args:
+            session (AsyncSession): Asynchronous database session
+            rows (List[MeasurementRow]): (id, device_id, timestamp, x, y, z) rows
+
+        Raises:
+            DeviceNotFoundException: A row references a device that does not exist
+        """
+        pass
+
+    @abstractmethod
+    async def get_existing_device_ids(
+        self,
+        session: AsyncSession,
+        device_ids: Iterable[uuid.UUID],
+    ) -> Set[uuid.UUID]:
+        """Filter device identifiers down to the ones present in the database.
+
+        Args:
+            session (AsyncSession): Asynchronous database session
+            device_ids (Iterable[uuid.UUID]): Device identifiers to check
+
+        Returns:
+            Set[uuid.UUID]: Identifiers of existing devices
+        """
+        pass
+
     @abstractmethod
     async def get_device_measurements(
         self,
@@ -110,17 +281,84 @@ class DeviceDataStorage(ABC):
         device_id: uuid.UUID,
         start_date: Optional[datetime],
         end_date: Optional[datetime],
-    ) -> List[MeasurementSchema]:
-        """Retrieve measurements for a device with optional time filtering.
+        limit: int = MEASUREMENTS_PAGE_DEFAULT_LIMIT,
+        cursor: Optional[str] = None,
+    ) -> MeasurementPage:
+        """Retrieve a page of measurements for a device with optional time filtering.
+
+        Args:
+            session (AsyncSession): Asynchronous database session
+            device_id (uuid.UUID): Device identifier
+            start_date (Optional[datetime]): Start of time range
+            end_date (Optional[datetime]): End of time range
+            limit (int): Maximum number of measurements on the page
+            cursor (Optional[str]): `next_cursor` of the previous page
+
+        Returns:
+            MeasurementPage: Measurements ordered by timestamp (newest first)
+                and the cursor of the next page
+
+        Raises:
+            InvalidCursorException: If the cursor is malformed
+        """
+        pass
+
+    @abstractmethod
+    async def get_device_measurements_downsampled(
+        self,
+        session: AsyncSession,
+        device_id: uuid.UUID,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        points: int,
+        method: DownsampleMethod,
+    ) -> List[MeasurementPointSchema]:
+        """Reduce measurements of a device to a chart-ready series.
+
+        The window is split into equal time buckets aggregated by the database,
+        so the cost of the response does not depend on the number of samples.
+        Windows holding no more than `points` samples are returned as is.
 
         Args:
             session (AsyncSession): Asynchronous database session
             device_id (uuid.UUID): Device identifier
             start_date (Optional[datetime]): Start of time range
             end_date (Optional[datetime]): End of time range
+            points (int): Maximum number of points to return
+            method (DownsampleMethod): Downsampling method
 
         Returns:
-            List[MeasurementSchema]: List of measurements
+            List[MeasurementPointSchema]: Points ordered by timestamp (oldest first)
+
+        Raises:
+            MeasurementNotFoundException: If there are no measurements in the window
+        """
+        pass
+
+    @abstractmethod
+    def iter_device_measurement_rows(
+        self,
+        session: AsyncSession,
+        device_id: uuid.UUID,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        batch_size: int,
+    ) -> AsyncIterator[List[MeasurementRow]]:
+        """Stream all measurements of a device in batches, oldest first.
+
+        Rows are read through a server-side cursor, so only one batch is held
+        in memory at a time.
+
+        Args:
+            session (AsyncSession): Asynchronous database session, must stay
+                open while the batches are consumed
+            device_id (uuid.UUID): Device identifier
+            start_date (Optional[datetime]): Start of time range
+            end_date (Optional[datetime]): End of time range
+            batch_size (int): Number of rows fetched from the cursor at once
+
+        Yields:
+            List[MeasurementRow]: (id, device_id, timestamp, x, y, z) rows
         """
         pass
 
@@ -143,6 +381,26 @@ class DeviceDataStorage(ABC):
         """
         pass
 
+    @abstractmethod
+    async def add_users_to_devices(
+        self,
+        session: AsyncSession,
+        assignments: List[DeviceUserAssignmentSchema],
+    ) -> DeviceUserBatchResponse:
+        """Link many (device, user) pairs with one set-based insert.
+
+        Pairs with a missing device or user are skipped and reported, the
+        others are applied in one transaction.
+
+        Args:
+            session (AsyncSession): Asynchronous database session
+            assignments (List[DeviceUserAssignmentSchema]): Pairs to link
+
+        Returns:
+            DeviceUserBatchResponse: Outcome of every pair, in request order
+        """
+        pass
+
     @abstractmethod
     async def get_device_users(
         self,
@@ -0,0 +1,67 @@
+from typing import AsyncIterator
+
+from fastapi import Request
+import structlog
+
+from src.database.database import sessionmanager
+from src.routes.devices.dao import dao
+from src.routes.devices.exceptions import (
+    DeviceNotFoundException,
+    MeasurementNotFoundException,
+)
+from src.routes.devices.schemas import DeviceStatsBatchError, DeviceStatsBatchRequest
+
+logger = structlog.get_logger(__name__)
+
+
+async def stream_devices_stats(
+    request: Request,
+    batch: DeviceStatsBatchRequest,
+) -> AsyncIterator[bytes]:
+    """Encodes stats of a batch of devices as NDJSON, one line per device.
+
+    Lines of devices with stats are sent as the grouped query produces them,
+    followed by DeviceStatsBatchError lines for the remaining devices. Like
+    the export, the generator runs after request dependencies are closed and
+    opens its own session.
+    """
+    device_ids = list(dict.fromkeys(batch.device_ids))
+    pending = set(device_ids)
+
+    async with sessionmanager.session() as session:
+        async for stats in dao.iter_devices_stats(
+            session,
+            device_ids,
+            batch.start_date,
+            batch.end_date,
+            use_rollups=batch.use_rollups,
+            accuracy=batch.accuracy,
+        ):
+            if await request.is_disconnected():
+                logger.info(
+                    "stream_devices_stats: client disconnected",
+                    remaining=len(pending),
+                )
+                return
+
+            pending.discard(stats.device_id)
+            yield (stats.model_dump_json() + "\n").encode()
+
+        existing = await dao.get_existing_device_ids(session, pending)
+
+    for device_id in device_ids:
+        if device_id not in pending:
+            continue
+        error = (
+            MeasurementNotFoundException()
+            if device_id in existing
+            else DeviceNotFoundException()
+        )
+        line = DeviceStatsBatchError(device_id=device_id, detail=error.message)
+        yield (line.model_dump_json() + "\n").encode()
+
+    logger.info(
+        "stream_devices_stats: completed",
+        devices=len(device_ids),
+        without_stats=len(pending),
+    )
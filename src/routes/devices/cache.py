@@ -0,0 +1,61 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+import uuid
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.cache import TTLCache
+from src.routes.devices.schemas import DeviceWithUsersSchema, UserSchema
+from src.settings import settings
+from src.stats_cache import stats_cache
+
+# Device with users by device ID, invalidated by device membership writes
+device_cache: TTLCache[DeviceWithUsersSchema] = TTLCache(
+    "devices", settings.cache_max_size, settings.cache_ttl
+)
+device_users_cache: TTLCache[List[UserSchema]] = TTLCache(
+    "device_users", settings.cache_max_size, settings.cache_ttl
+)
+# Devices are never deleted: only existing IDs are cached, never invalidated
+device_exists_cache: TTLCache[bool] = TTLCache(
+    "device_ids", settings.cache_max_size, settings.cache_ttl
+)
+
+_CHANGED_DEVICES = "changed_devices"
+
+
+def mark_measurements_changed(
+    session: AsyncSession,
+    changes: Iterable[Tuple[uuid.UUID, datetime]],
+) -> None:
+    """Invalidates the devices' cached stats once the session commits.
+
+    Args:
+        session (AsyncSession): Session that writes the measurements
+        changes (Iterable[Tuple[uuid.UUID, datetime]]): Device IDs with
+            timestamps of the measurements written
+
+    Bumping only after the commit matters: a reader that computed stats from
+    the previous data in between would otherwise store them with the new
+    version.
+    """
+    earliest: Dict[uuid.UUID, datetime] = session.info.setdefault(
+        _CHANGED_DEVICES, {}
+    )
+    for device_id, timestamp in changes:
+        if device_id not in earliest or timestamp < earliest[device_id]:
+            earliest[device_id] = timestamp
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_changed_devices(session: Session) -> None:
+    changes = session.info.pop(_CHANGED_DEVICES, None)
+    if changes:
+        stats_cache.measurements_changed(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_devices(session: Session) -> None:
+    session.info.pop(_CHANGED_DEVICES, None)
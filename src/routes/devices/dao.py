@@ -1,32 +1,207 @@
-from datetime import datetime
-from typing import Optional, List
+from datetime import datetime, timedelta
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    Optional,
+    List,
+    Set,
+)
 import uuid
 
-from sqlalchemy import select
+from asyncpg.exceptions import (  # type: ignore
+    CheckViolationError,
+    ForeignKeyViolationError,
+)
+import numpy as np
+from sqlalchemy import Integer, cast, func, literal, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from src.database.models import Device, Measurement, User
+from src.database.aggregates import (
+    AXES,
+    measurement_stats_columns,
+    stats_from_row,
+    supports_percentile,
+)
+from src.database.archive import read_archived_measurements
+from src.database.blocks import (
+    Samples,
+    from_microseconds,
+    read_block_measurements,
+    to_microseconds,
+)
+from src.database.estimates import estimated_count
+from src.database.models import Device, Measurement, User, user_device_association
+from src.database.partitions import (
+    ensure_partitions,
+    forget_partitions,
+    is_missing_partition_error,
+)
+from src.database.rollups import (
+    RollupGranularity,
+    get_bucket_series,
+    get_rollup_stats,
+    update_rollups,
+)
+from src.database.sketches import (
+    SketchBins,
+    get_sketches,
+    update_sketches,
+    with_quantiles,
+)
+from src.database.tiers import (
+    cold_tiers_enabled,
+    iter_cold_rows,
+    measurement_key,
+    merge_row_batches,
+    read_all_columns,
+    read_cold_columns,
+    read_cold_samples,
+)
 from src.routes.devices.abstract_data_storage import DeviceDataStorage
+from src.routes.devices.cache import (
+    device_cache,
+    device_exists_cache,
+    device_users_cache,
+    mark_measurements_changed,
+)
 from src.routes.devices.exceptions import (
     DeviceNotFoundException,
+    InvalidCursorException,
     MeasurementNotFoundException,
     DeviceSerialNumberException,
+    StatsSeriesTooLargeException,
 )
 from src.routes.devices.schemas import (
+    DEVICES_PAGE_DEFAULT_LIMIT,
+    MEASUREMENTS_PAGE_DEFAULT_LIMIT,
+    STATS_SERIES_MAX_BUCKETS,
+    BatchItemStatus,
+    DeviceBatchRegisterItem,
+    DeviceBatchRegisterResponse,
+    DevicePage,
     DeviceSchema,
     DeviceStatsResponse,
+    DeviceStatsSeriesResponse,
+    DeviceUserAssignmentSchema,
+    DeviceUserBatchItem,
+    DeviceUserBatchResponse,
     DeviceWithUsersSchema,
+    DownsampleMethod,
+    MeasurementBatchItemSchema,
+    MeasurementBatchResponse,
     MeasurementCreateSchema,
+    MeasurementPage,
+    MeasurementPointSchema,
+    MeasurementRow,
     MeasurementSchema,
     PartialDeviceSchema,
+    SeriesStatsValues,
+    StatsAccuracy,
+    StatsBucket,
+    StatsSeriesBucket,
+    StatsValues,
     UserSchema,
 )
+from src.routes.users.cache import user_cache
 from src.routes.users.exceptions import UserAlreadyExistException, UserNotFoundException
+from src.settings import settings
+from src.shared_cache import get_shared_cache
+from src.stats_cache import stats_cache
+from src.stats import (
+    Columns,
+    aggregate_groups,
+    describe,
+    describe_groups,
+    lttb,
+    to_columns,
+)
+from src.utils import decode_cursor, encode_cursor, uuid7
+
+MEASUREMENT_COPY_COLUMNS = ["id", "device_id", "timestamp", "x", "y", "z"]
+DOWNSAMPLE_LTTB_OVERSAMPLING = 4
+STATS_BUCKET_GRANULARITIES = {
+    StatsBucket.MINUTE: RollupGranularity.MINUTE,
+    StatsBucket.HOUR: RollupGranularity.HOUR,
+    StatsBucket.DAY: RollupGranularity.DAY,
+}
 
 
 class DevicePostgreDAO(DeviceDataStorage):
 
+    async def _ensure_device_exists(
+        self,
+        session: AsyncSession,
+        device_id: uuid.UUID,
+    ) -> None:
+        if not await self.get_existing_device_ids(session, [device_id]):
+            raise DeviceNotFoundException()
+
+    async def get_existing_device_ids(
+        self,
+        session: AsyncSession,
+        device_ids: Iterable[uuid.UUID],
+    ) -> Set[uuid.UUID]:
+        stmt = select(Device.id).where(Device.id.in_(set(device_ids)))
+        return set((await session.scalars(stmt)).all())
+
+    async def insert_measurement_rows(
+        self,
+        session: AsyncSession,
+        rows: List[MeasurementRow],
+    ) -> None:
+        timestamps = [row[2] for row in rows]
+        await ensure_partitions(session, timestamps)
+
+        try:
+            # In a savepoint, so the transaction survives a failed COPY
+            async with session.begin_nested():
+                await self._copy_measurement_rows(session, rows)
+        except CheckViolationError as e:
+            if not is_missing_partition_error(e):
+                raise
+            # Partition dropped by the retention of another worker since this
+            # one last saw it
+            forget_partitions(timestamps)
+            await ensure_partitions(session, timestamps)
+            await self._copy_measurement_rows(session, rows)
+
+        await self._update_aggregates(session, rows)
+
+    async def _copy_measurement_rows(
+        self,
+        session: AsyncSession,
+        rows: List[MeasurementRow],
+    ) -> None:
+        # COPY through the session's asyncpg connection: one round trip for the
+        # whole batch and it stays inside the session transaction.
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        driver_connection: Any = raw_connection.driver_connection
+        try:
+            await driver_connection.copy_records_to_table(
+                Measurement.__tablename__,
+                records=rows,
+                columns=MEASUREMENT_COPY_COLUMNS,
+            )
+        except ForeignKeyViolationError:
+            raise DeviceNotFoundException()
+
+    async def _update_aggregates(
+        self,
+        session: AsyncSession,
+        rows: List[MeasurementRow],
+    ) -> None:
+        if settings.rollups_enabled:
+            await update_rollups(session, rows)
+        if settings.sketches_enabled:
+            await update_sketches(session, rows)
+
     async def get_device(
         self,
         session: AsyncSession,
@@ -56,39 +231,113 @@ class DevicePostgreDAO(DeviceDataStorage):
         session: AsyncSession,
         device_data: PartialDeviceSchema,
     ) -> DeviceSchema:
-
-        existing_device = await session.execute(
-            select(Device).where(Device.serial_number == device_data.serial_number)
+        # One statement: the unique serial number index detects duplicates,
+        # no check-then-insert race and no refresh.
+        stmt = (
+            pg_insert(Device)
+            .values(serial_number=device_data.serial_number)
+            .on_conflict_do_nothing(index_elements=[Device.serial_number])
+            .returning(Device.id, Device.serial_number)
         )
-        if existing_device.scalar_one_or_none():
+        row = (await session.execute(stmt)).one_or_none()
+        if row is None:
+            await session.rollback()
             raise DeviceSerialNumberException()
+        await session.commit()
 
-        new_device = Device(
-            serial_number=device_data.serial_number,
+        return DeviceSchema(id=row.id, serial_number=row.serial_number)
+
+    async def register_new_devices(
+        self,
+        session: AsyncSession,
+        serial_numbers: List[str],
+    ) -> DeviceBatchRegisterResponse:
+        unique_serial_numbers = list(dict.fromkeys(serial_numbers))
+        insert = (
+            pg_insert(Device)
+            .on_conflict_do_nothing(index_elements=[Device.serial_number])
+            .returning(Device.id, Device.serial_number)
+        )
+        result = await session.execute(
+            insert, [{"serial_number": sn} for sn in unique_serial_numbers]
         )
+        created = {serial_number: device_id for device_id, serial_number in result}
 
-        session.add(new_device)
+        existing: Dict[str, uuid.UUID] = {}
+        missing = [sn for sn in unique_serial_numbers if sn not in created]
+        if missing:
+            stmt = select(Device.serial_number, Device.id).where(
+                Device.serial_number.in_(missing)
+            )
+            existing = dict((await session.execute(stmt)).tuples().all())
         await session.commit()
-        await session.refresh(new_device)
 
-        result = DeviceSchema(
-            serial_number=new_device.serial_number,
-            id=new_device.id,
+        devices = []
+        for serial_number in serial_numbers:
+            # Repeated serial numbers of the request exist after the first one
+            device_id = created.pop(serial_number, None)
+            status = BatchItemStatus.CREATED
+            if device_id is None:
+                device_id = existing[serial_number]
+                status = BatchItemStatus.EXISTS
+            existing[serial_number] = device_id
+            devices.append(
+                DeviceBatchRegisterItem(
+                    id=device_id, serial_number=serial_number, status=status
+                )
+            )
+
+        return DeviceBatchRegisterResponse(
+            created=sum(device.status is BatchItemStatus.CREATED for device in devices),
+            devices=devices,
         )
 
-        return result
+    async def get_all_devices(
+        self,
+        session: AsyncSession,
+        limit: int = DEVICES_PAGE_DEFAULT_LIMIT,
+        cursor: Optional[str] = None,
+        serial_number_prefix: Optional[str] = None,
+        with_total: bool = False,
+    ) -> DevicePage:
+        # Keyset pagination over the unique serial number index (C collation,
+        # so the prefix filter is a range scan of the same index). Bare
+        # columns, no ORM objects.
+        query = select(Device.id, Device.serial_number)
+        if serial_number_prefix:
+            query = query.where(
+                Device.serial_number.startswith(serial_number_prefix, autoescape=True)
+            )
+        total = await estimated_count(session, query) if with_total else None
 
-    async def get_all_devices(self, session: AsyncSession) -> list[DeviceSchema]:
-        result = await session.execute(select(Device))
-        devices = result.scalars().all()
+        if cursor:
+            query = query.where(
+                Device.serial_number > self._decode_device_cursor(cursor)
+            )
+        query = query.order_by(Device.serial_number).limit(limit + 1)
+        rows = (await session.execute(query)).all()
 
-        if not devices:
+        if not rows and not cursor:
             raise DeviceNotFoundException()
 
-        return [
-            DeviceSchema(id=device.id, serial_number=device.serial_number)
-            for device in devices
+        devices = [
+            DeviceSchema(id=device_id, serial_number=serial_number)
+            for device_id, serial_number in rows[:limit]
         ]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = encode_cursor(devices[-1].serial_number)
+
+        return DevicePage(devices=devices, next_cursor=next_cursor, total=total)
+
+    def _decode_device_cursor(self, cursor: str) -> str:
+        try:
+            (serial_number,) = decode_cursor(cursor, 1)
+        except ValueError:
+            raise InvalidCursorException()
+        if not isinstance(serial_number, str):
+            raise InvalidCursorException()
+        return serial_number
 
     async def get_device_stats(
         self,
@@ -96,51 +345,286 @@ class DevicePostgreDAO(DeviceDataStorage):
         device_id: uuid.UUID,
         start_date: Optional[datetime],
         end_date: Optional[datetime],
+        use_rollups: bool = False,
+        accuracy: StatsAccuracy = StatsAccuracy.EXACT,
     ) -> DeviceStatsResponse:
-        device = await session.get(Device, device_id)
+        if accuracy is StatsAccuracy.APPROX and (
+            settings.rollups_enabled and settings.sketches_enabled
+        ):
+            return await self._get_device_stats_from_rollups(
+                session, device_id, start_date, end_date, with_sketches=True
+            )
+        if use_rollups and settings.rollups_enabled:
+            return await self._get_device_stats_from_rollups(
+                session, device_id, start_date, end_date
+            )
 
-        if not device:
-            raise DeviceNotFoundException()
+        # Compressed blocks and archived days cost a round trip and a
+        # directory listing, only look for them when their tier is enabled.
+        cold_values = (
+            await read_cold_columns(session, [device_id], start_date, end_date)
+        ).get(device_id)
+        if cold_values is not None:
+            return await self._get_device_stats_with_cold_values(
+                session, device_id, start_date, end_date, cold_values
+            )
 
-        query = select(Measurement).where(Measurement.device_id == device_id)
+        with_median = supports_percentile(session)
+
+        query = select(*measurement_stats_columns(with_median)).where(
+            Measurement.device_id == device_id
+        )
         if start_date:
             query = query.where(Measurement.timestamp >= start_date)
         if end_date:
             query = query.where(Measurement.timestamp <= end_date)
 
-        result = await session.execute(query)
-        measurements = result.scalars().all()
+        row = (await session.execute(query)).one()
 
-        if not measurements:
+        if not row.x_count:
+            # Tell a missing device apart from an empty window only when needed,
+            # so the common path is a single round trip.
+            await self._ensure_device_exists(session, device_id)
             raise MeasurementNotFoundException()
 
-        x_values = [m.x for m in measurements]
-        y_values = [m.y for m in measurements]
-        z_values = [m.z for m in measurements]
-
-        def calculate_stats(values):
-            sorted_values = sorted(values)
-            count = len(sorted_values)
-            return {
-                "min": min(sorted_values),
-                "max": max(sorted_values),
-                "count": count,
-                "sum": sum(sorted_values),
-                "median": (
-                    sorted_values[count // 2]
-                    if count % 2
-                    else (sorted_values[count // 2 - 1] + sorted_values[count // 2]) / 2
-                ),
+        stats = {axis: StatsValues(**stats_from_row(row, axis)) for axis in AXES}
+
+        if not with_median:
+            medians = await self._get_device_medians(
+                session, [device_id], start_date, end_date
+            )
+            for axis in AXES:
+                stats[axis].median = medians[device_id][axis]
+
+        return DeviceStatsResponse(
+            x=stats["x"],
+            y=stats["y"],
+            z=stats["z"],
+            device_id=device_id,
+            period={"start": start_date, "end": end_date},
+        )
+
+    async def _get_device_stats_with_cold_values(
+        self,
+        session: AsyncSession,
+        device_id: uuid.UUID,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        cold_values: Columns,
+    ) -> DeviceStatsResponse:
+        # The window reaches into compressed blocks or archived days: exact
+        # medians need the values of all tiers, so live columns are fetched
+        # and merged with the decoded ones.
+        values = await read_all_columns(
+            session, [device_id], start_date, end_date, {device_id: cold_values}
+        )
+        return self._stats_response(
+            device_id, describe(values[device_id]), None, start_date, end_date
+        )
+
+    async def _get_device_stats_from_rollups(
+        self,
+        session: AsyncSession,
+        device_id: uuid.UUID,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        with_sketches: bool = False,
+    ) -> DeviceStatsResponse:
+        # Rollups hold no medians: only min/max/count/sum are reported unless
+        # the approximate median and percentiles are read from the sketches.
+        stats = (
+            await get_rollup_stats(session, [device_id], start_date, end_date)
+        ).get(device_id)
+
+        if not stats:
+            await self._ensure_device_exists(session, device_id)
+            raise MeasurementNotFoundException()
+
+        sketches = (
+            await get_sketches(session, [device_id], start_date, end_date)
+            if with_sketches
+            else None
+        )
+        return self._stats_response(
+            device_id, stats, sketches, start_date, end_date
+        )
+
+    def _stats_response(
+        self,
+        device_id: uuid.UUID,
+        stats: Dict[str, Dict[str, Any]],
+        sketches: Optional[Dict[uuid.UUID, Dict[str, SketchBins]]],
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+    ) -> DeviceStatsResponse:
+        if sketches is not None:
+            bins = sketches.get(device_id, {})
+            stats = {
+                axis: with_quantiles(stats[axis], bins.get(axis, {})) for axis in AXES
             }
 
         return DeviceStatsResponse(
-            x=calculate_stats(x_values),
-            y=calculate_stats(y_values),
-            z=calculate_stats(z_values),
+            x=StatsValues(**stats["x"]),
+            y=StatsValues(**stats["y"]),
+            z=StatsValues(**stats["z"]),
             device_id=device_id,
             period={"start": start_date, "end": end_date},
         )
 
+    async def iter_devices_stats(
+        self,
+        session: AsyncSession,
+        device_ids: List[uuid.UUID],
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        use_rollups: bool = False,
+        accuracy: StatsAccuracy = StatsAccuracy.EXACT,
+    ) -> AsyncIterator[DeviceStatsResponse]:
+        approx = accuracy is StatsAccuracy.APPROX and (
+            settings.rollups_enabled and settings.sketches_enabled
+        )
+        if approx or (use_rollups and settings.rollups_enabled):
+            rollup_stats = await get_rollup_stats(
+                session, device_ids, start_date, end_date
+            )
+            sketches = (
+                await get_sketches(session, device_ids, start_date, end_date)
+                if approx
+                else None
+            )
+            for device_id in device_ids:
+                if device_id in rollup_stats:
+                    yield self._stats_response(
+                        device_id,
+                        rollup_stats[device_id],
+                        sketches,
+                        start_date,
+                        end_date,
+                    )
+            return
+
+        # Devices with compacted or archived samples in the window are
+        # described from the values of all tiers, the rest by the database.
+        cold = await read_cold_columns(session, device_ids, start_date, end_date)
+        if cold:
+            cold_device_values = await read_all_columns(
+                session, list(cold), start_date, end_date, cold
+            )
+            for device_id, device_values in cold_device_values.items():
+                yield self._stats_response(
+                    device_id, describe(device_values), None, start_date, end_date
+                )
+            device_ids = [
+                device_id for device_id in device_ids if device_id not in cold
+            ]
+            if not device_ids:
+                return
+
+        with_median = supports_percentile(session)
+        medians = (
+            {}
+            if with_median
+            else await self._get_device_medians(
+                session, device_ids, start_date, end_date
+            )
+        )
+
+        # Ordered by device so the aggregate can walk the (device_id, ...)
+        # index and hand over every device as soon as its group is complete.
+        query = (
+            select(Measurement.device_id, *measurement_stats_columns(with_median))
+            .where(Measurement.device_id.in_(device_ids))
+            .group_by(Measurement.device_id)
+            .order_by(Measurement.device_id)
+        )
+        if start_date:
+            query = query.where(Measurement.timestamp >= start_date)
+        if end_date:
+            query = query.where(Measurement.timestamp <= end_date)
+
+        result = await session.stream(query)
+        try:
+            async for row in result:
+                values = {
+                    axis: StatsValues(**stats_from_row(row, axis)) for axis in AXES
+                }
+                for axis, median in medians.get(row.device_id, {}).items():
+                    values[axis].median = median
+                yield DeviceStatsResponse(
+                    x=values["x"],
+                    y=values["y"],
+                    z=values["z"],
+                    device_id=row.device_id,
+                    period={"start": start_date, "end": end_date},
+                )
+        finally:
+            await result.close()
+
+    async def get_device_stats_series(
+        self,
+        session: AsyncSession,
+        device_id: uuid.UUID,
+        bucket: StatsBucket,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+    ) -> DeviceStatsSeriesResponse:
+        series = await get_bucket_series(
+            session,
+            device_id,
+            STATS_BUCKET_GRANULARITIES[bucket],
+            start_date,
+            end_date,
+            use_rollups=settings.rollups_enabled,
+            limit=STATS_SERIES_MAX_BUCKETS + 1,
+        )
+
+        if not series:
+            await self._ensure_device_exists(session, device_id)
+            raise MeasurementNotFoundException()
+        if len(series) > STATS_SERIES_MAX_BUCKETS:
+            raise StatsSeriesTooLargeException()
+
+        return DeviceStatsSeriesResponse(
+            device_id=device_id,
+            bucket=bucket,
+            period={"start": start_date, "end": end_date},
+            buckets=[
+                StatsSeriesBucket(
+                    bucket_start=item["bucket_start"],
+                    x=SeriesStatsValues(**item["x"]),
+                    y=SeriesStatsValues(**item["y"]),
+                    z=SeriesStatsValues(**item["z"]),
+                )
+                for item in series
+            ],
+        )
+
+    async def _get_device_medians(
+        self,
+        session: AsyncSession,
+        device_ids: Iterable[uuid.UUID],
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+    ) -> Dict[uuid.UUID, Dict[str, float]]:
+        # Fallback for backends without percentile_cont: fetch bare columns
+        # (no ORM objects) and compute medians with NumPy.
+        query = select(
+            Measurement.device_id, Measurement.x, Measurement.y, Measurement.z
+        ).where(Measurement.device_id.in_(list(device_ids)))
+        if start_date:
+            query = query.where(Measurement.timestamp >= start_date)
+        if end_date:
+            query = query.where(Measurement.timestamp <= end_date)
+
+        rows = (await session.execute(query)).all()
+        device_stats = describe_groups(
+            [row.device_id for row in rows], to_columns(rows, start=1)
+        )
+        return {
+            device_id: {axis: stats[axis]["median"] for axis in AXES}
+            for device_id, stats in device_stats.items()
+        }
+
     async def add_measurement(
         self,
         session: AsyncSession,
@@ -148,18 +632,30 @@ class DevicePostgreDAO(DeviceDataStorage):
         measurement_data: MeasurementCreateSchema,
     ) -> MeasurementSchema:
 
-        device = await session.get(Device, device_id)
-
-        if not device:
-            raise DeviceNotFoundException()
+        await self._ensure_device_exists(session, device_id)
 
         measurement = Measurement(
+            id=uuid7(),
             device_id=device_id,
             timestamp=datetime.now(),
             **measurement_data.model_dump(),
         )
 
+        await ensure_partitions(session, [measurement.timestamp])
         session.add(measurement)
+        await self._update_aggregates(
+            session,
+            [
+                (
+                    measurement.id,
+                    device_id,
+                    measurement.timestamp,
+                    measurement.x,
+                    measurement.y,
+                    measurement.z,
+                )
+            ],
+        )
         await session.commit()
         await session.refresh(measurement)
 
@@ -174,69 +670,454 @@ class DevicePostgreDAO(DeviceDataStorage):
 
         return result
 
+    async def add_measurements_batch(
+        self,
+        session: AsyncSession,
+        device_id: uuid.UUID,
+        measurements: List[MeasurementBatchItemSchema],
+        return_ids: bool = False,
+    ) -> MeasurementBatchResponse:
+        await self._ensure_device_exists(session, device_id)
+
+        now = datetime.now()
+        rows: List[MeasurementRow] = [
+            (uuid7(), device_id, m.timestamp or now, m.x, m.y, m.z)
+            for m in measurements
+        ]
+
+        await self.insert_measurement_rows(session, rows)
+        await session.commit()
+
+        return MeasurementBatchResponse(
+            device_id=device_id,
+            count=len(rows),
+            ids=[row[0] for row in rows] if return_ids else None,
+        )
+
     async def get_device_measurements(
         self,
         session: AsyncSession,
         device_id: uuid.UUID,
         start_date: Optional[datetime],
         end_date: Optional[datetime],
-    ) -> List[MeasurementSchema]:
-        query = select(Measurement).where(Measurement.device_id == device_id)
+        limit: int = MEASUREMENTS_PAGE_DEFAULT_LIMIT,
+        cursor: Optional[str] = None,
+    ) -> MeasurementPage:
+        # Keyset pagination over (timestamp, id) served by the
+        # (device_id, timestamp, id) index: every page is an index range scan
+        # of `limit` rows, however deep it is.
+        query = select(
+            Measurement.id,
+            Measurement.device_id,
+            Measurement.timestamp,
+            Measurement.x,
+            Measurement.y,
+            Measurement.z,
+        ).where(Measurement.device_id == device_id)
 
         if start_date:
             query = query.where(Measurement.timestamp >= start_date)
         if end_date:
             query = query.where(Measurement.timestamp <= end_date)
+        before = None
+        if cursor:
+            last_timestamp, last_id = before = self._decode_measurement_cursor(cursor)
+            # The plain timestamp bound lets the planner prune partitions past
+            # the cursor, the row comparison alone does not.
+            query = query.where(
+                Measurement.timestamp <= last_timestamp,
+                tuple_(Measurement.timestamp, Measurement.id)
+                < tuple_(literal(last_timestamp), literal(last_id)),
+            )
 
-        result = await session.execute(query.order_by(Measurement.timestamp.desc()))
-        measurements = result.scalars().all()
+        query = query.order_by(Measurement.timestamp.desc(), Measurement.id.desc())
+        rows: List[Any] = list(
+            (await session.execute(query.limit(limit + 1))).all()
+        )
+        # Compacted and archived rows are merged in keyset order: they are
+        # usually older than live rows, but late samples can be live in
+        # compacted blocks or archived days. Only rows newer than the last live
+        # row can join a full page.
+        cold_start = rows[-1][2] if len(rows) > limit else start_date
+        cold_rows = []
+        if settings.blocks_enabled:
+            cold_rows += await read_block_measurements(
+                session, device_id, cold_start, end_date, before, limit + 1
+            )
+        if settings.archive_enabled:
+            cold_rows += await read_archived_measurements(
+                device_id, cold_start, end_date, before, limit + 1
+            )
+        if cold_rows:
+            rows = sorted(
+                rows + cold_rows, key=lambda row: (row[2], row[0]), reverse=True
+            )[:limit + 1]
 
-        if not measurements:
+        if not rows and not cursor:
             raise MeasurementNotFoundException()
 
-        return [
+        measurements = [
             MeasurementSchema(
-                x=measurement.x,
-                y=measurement.y,
-                z=measurement.z,
-                id=measurement.id,
-                device_id=measurement.device_id,
-                timestamp=measurement.timestamp,
+                id=measurement_id,
+                device_id=measurement_device_id,
+                timestamp=timestamp,
+                x=x,
+                y=y,
+                z=z,
+            )
+            for measurement_id, measurement_device_id, timestamp, x, y, z in rows[
+                :limit
+            ]
+        ]
+        next_cursor = None
+        if len(rows) > limit:
+            last = measurements[-1]
+            next_cursor = encode_cursor(last.timestamp.isoformat(), last.id)
+
+        return MeasurementPage(measurements=measurements, next_cursor=next_cursor)
+
+    def _decode_measurement_cursor(self, cursor: str) -> tuple[datetime, uuid.UUID]:
+        try:
+            timestamp, measurement_id = decode_cursor(cursor, 2)
+        except ValueError:
+            raise InvalidCursorException()
+        if not isinstance(timestamp, str) or not isinstance(measurement_id, str):
+            raise InvalidCursorException()
+        try:
+            return datetime.fromisoformat(timestamp), uuid.UUID(measurement_id)
+        except ValueError:
+            raise InvalidCursorException()
+
+    async def get_device_measurements_downsampled(
+        self,
+        session: AsyncSession,
+        device_id: uuid.UUID,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        points: int,
+        method: DownsampleMethod,
+    ) -> List[MeasurementPointSchema]:
+        conditions = [Measurement.device_id == device_id]
+        if start_date:
+            conditions.append(Measurement.timestamp >= start_date)
+        if end_date:
+            conditions.append(Measurement.timestamp <= end_date)
+
+        bounds = select(
+            func.min(Measurement.timestamp),
+            func.max(Measurement.timestamp),
+            func.count(),
+        ).where(*conditions)
+        first, last, count = (await session.execute(bounds)).one()
+
+        # Compacted samples take part in the bounds, raw points and buckets
+        cold = (
+            await read_cold_samples(session, [device_id], start_date, end_date)
+        ).get(device_id)
+        if cold is not None:
+            cold_first = from_microseconds(cold[0][0])
+            cold_last = from_microseconds(cold[0][-1])
+            first = min(first, cold_first) if count else cold_first
+            last = max(last, cold_last) if count else cold_last
+            count += len(cold[0])
+
+        if not count:
+            raise MeasurementNotFoundException()
+
+        # LTTB picks points out of candidates: raw samples of small windows,
+        # otherwise averages of DOWNSAMPLE_LTTB_OVERSAMPLING buckets per point.
+        is_lttb = method is DownsampleMethod.LTTB
+        candidates = points * DOWNSAMPLE_LTTB_OVERSAMPLING if is_lttb else points
+
+        if count <= candidates:
+            query = (
+                select(
+                    Measurement.timestamp, Measurement.x, Measurement.y, Measurement.z
+                )
+                .where(*conditions)
+                .order_by(Measurement.timestamp, Measurement.id)
+            )
+            rows: List[Any] = [tuple(row) for row in await session.execute(query)]
+            if cold is not None:
+                timestamps, values = cold
+                rows += [
+                    (from_microseconds(timestamp), x, y, z)
+                    for timestamp, x, y, z in zip(timestamps.tolist(), *values.tolist())
+                ]
+                rows.sort(key=lambda row: row[0])
+            if is_lttb and count > points:
+                times = np.array([(row[0] - first).total_seconds() for row in rows])
+                rows = [rows[i] for i in lttb(times, to_columns(rows, 1), points)]
+            return [
+                MeasurementPointSchema(timestamp=row[0], x=row[1], y=row[2], z=row[3])
+                for row in rows
+            ]
+
+        width = (last - first).total_seconds() / candidates or 1.0
+        offset = func.extract("epoch", Measurement.timestamp - literal(first))
+        bucket = func.least(
+            cast(func.floor(offset / width), Integer), candidates - 1
+        ).label("bucket")
+        query = (
+            select(
+                bucket,
+                func.count().label("samples"),
+                func.avg(offset).label("offset"),
+                *[func.avg(getattr(Measurement, axis)).label(axis) for axis in AXES],
+                *[
+                    aggregate(getattr(Measurement, axis)).label(f"{axis}_{name}")
+                    for axis in AXES
+                    for name, aggregate in (("min", func.min), ("max", func.max))
+                ],
+            )
+            .where(*conditions)
+            .group_by(bucket)
+            .order_by(bucket)
+        )
+        # bucket: [samples, mean offset, (axes,) means, minimums, maximums]
+        buckets: Dict[int, List[Any]] = {
+            row.bucket: [
+                row.samples,
+                float(row.offset),
+                np.array([row._mapping[axis] for axis in AXES]),
+                np.array([row._mapping[f"{axis}_min"] for axis in AXES]),
+                np.array([row._mapping[f"{axis}_max"] for axis in AXES]),
+            ]
+            for row in await session.execute(query)
+        }
+        if cold is not None:
+            self._add_cold_buckets(buckets, cold, first, width, candidates)
+
+        ordered = sorted(buckets)
+        samples = np.array([buckets[key][0] for key in ordered])
+        times = np.array([buckets[key][1] for key in ordered])
+        means = np.array([buckets[key][2] for key in ordered]).T
+
+        if is_lttb:
+            return [
+                MeasurementPointSchema(
+                    timestamp=first + timedelta(seconds=float(times[i])),
+                    x=means[0, i],
+                    y=means[1, i],
+                    z=means[2, i],
+                )
+                for i in lttb(times, means, points)
+            ]
+
+        with_envelope = method is DownsampleMethod.MINMAX
+        return [
+            MeasurementPointSchema(
+                timestamp=first + timedelta(seconds=key * width),
+                x=means[0, i],
+                y=means[1, i],
+                z=means[2, i],
+                count=int(samples[i]),
+                **(
+                    {
+                        f"{axis}_{name}": buckets[key][3 + j][k]
+                        for k, axis in enumerate(AXES)
+                        for j, name in enumerate(("min", "max"))
+                    }
+                    if with_envelope
+                    else {}
+                ),
             )
-            for measurement in measurements
+            for i, key in enumerate(ordered)
         ]
 
+    def _add_cold_buckets(
+        self,
+        buckets: Dict[int, List[Any]],
+        cold: Samples,
+        first: datetime,
+        width: float,
+        candidates: int,
+    ) -> None:
+        # Same bucketing as the SQL query, means merged weighted by samples
+        timestamps, values = cold
+        offsets = (timestamps - to_microseconds(first)) / 1e6
+        keys = np.minimum(np.floor(offsets / width), candidates - 1).astype(np.int64)
+        keys, counts, sums, mins, maxs = aggregate_groups(
+            keys, np.vstack([offsets, values])
+        )
+        for j, key in enumerate(keys.tolist()):
+            count = int(counts[j])
+            bucket = buckets.setdefault(
+                key, [0, 0.0, np.zeros(len(AXES)), mins[1:, j], maxs[1:, j]]
+            )
+            total = bucket[0] + count
+            bucket[1] = (bucket[1] * bucket[0] + sums[0, j]) / total
+            bucket[2] = (bucket[2] * bucket[0] + sums[1:, j]) / total
+            bucket[3] = np.minimum(bucket[3], mins[1:, j])
+            bucket[4] = np.maximum(bucket[4], maxs[1:, j])
+            bucket[0] = total
+
+    async def iter_device_measurement_rows(
+        self,
+        session: AsyncSession,
+        device_id: uuid.UUID,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        batch_size: int,
+    ) -> AsyncIterator[List[MeasurementRow]]:
+        rows = self._iter_live_measurement_rows(
+            session, device_id, start_date, end_date, batch_size
+        )
+        if cold_tiers_enabled():
+            # Compacted and archived rows merged in (timestamp, id) order
+            cold = iter_cold_rows(session, [device_id], start_date, end_date)
+            rows = merge_row_batches([rows, cold], measurement_key)
+        async for batch in rows:
+            yield batch
+
+    async def _iter_live_measurement_rows(
+        self,
+        session: AsyncSession,
+        device_id: uuid.UUID,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        batch_size: int,
+    ) -> AsyncGenerator[List[MeasurementRow], None]:
+        query = select(
+            Measurement.id,
+            Measurement.device_id,
+            Measurement.timestamp,
+            Measurement.x,
+            Measurement.y,
+            Measurement.z,
+        ).where(Measurement.device_id == device_id)
+
+        if start_date:
+            query = query.where(Measurement.timestamp >= start_date)
+        if end_date:
+            query = query.where(Measurement.timestamp <= end_date)
+
+        query = query.order_by(Measurement.timestamp, Measurement.id)
+        result = await session.stream(
+            query.execution_options(yield_per=batch_size)
+        )
+        try:
+            async for partition in result.partitions():
+                yield [tuple(row) for row in partition]
+        finally:
+            await result.close()
+
     async def add_user_to_device(
         self,
         session: AsyncSession,
         device_id: uuid.UUID,
         user_id: uuid.UUID,
     ) -> DeviceWithUsersSchema:
+        insert = (
+            pg_insert(user_device_association)
+            .values(user_id=user_id, device_id=device_id)
+            .on_conflict_do_nothing()
+            .returning(user_device_association.c.user_id)
+        )
+        try:
+            inserted = (await session.execute(insert)).one_or_none()
+        except IntegrityError:
+            # Foreign key violation, find out which side is missing
+            await session.rollback()
+            device = select(Device.id).where(Device.id == device_id)
+            if await session.scalar(device) is None:
+                raise DeviceNotFoundException()
+            raise UserNotFoundException()
+
+        if inserted is None:
+            await session.rollback()
+            raise UserAlreadyExistException()
+        await session.commit()
+
         stmt = (
-            select(Device)
+            select(Device.serial_number, User.id, User.name)
+            .join(
+                user_device_association,
+                user_device_association.c.device_id == Device.id,
+            )
+            .join(User, User.id == user_device_association.c.user_id)
             .where(Device.id == device_id)
-            .options(selectinload(Device.users))
         )
-        device = (await session.execute(stmt)).scalar_one_or_none()
-
-        if not device:
-            raise DeviceNotFoundException()
+        rows = (await session.execute(stmt)).all()
 
-        user = await session.get(User, user_id)
-        if not user:
-            raise UserNotFoundException()
+        return DeviceWithUsersSchema(
+            serial_number=rows[0].serial_number,
+            id=device_id,
+            users=[UserSchema(id=row.id, name=row.name) for row in rows],
+        )
 
-        if user in device.users:
-            raise UserAlreadyExistException()
+    async def add_users_to_devices(
+        self,
+        session: AsyncSession,
+        assignments: List[DeviceUserAssignmentSchema],
+    ) -> DeviceUserBatchResponse:
+        device_ids = {assignment.device_id for assignment in assignments}
+        user_ids = {assignment.user_id for assignment in assignments}
+        # FOR KEY SHARE: found devices and users cannot be deleted before the
+        # insert, which would otherwise fail the whole batch on a foreign key.
+        found_devices = set(
+            await session.scalars(
+                select(Device.id)
+                .where(Device.id.in_(device_ids))
+                .with_for_update(key_share=True)
+            )
+        )
+        found_users = set(
+            await session.scalars(
+                select(User.id)
+                .where(User.id.in_(user_ids))
+                .with_for_update(key_share=True)
+            )
+        )
 
-        device.users.append(user)
+        pairs = list(
+            dict.fromkeys(
+                (assignment.device_id, assignment.user_id)
+                for assignment in assignments
+                if assignment.device_id in found_devices
+                and assignment.user_id in found_users
+            )
+        )
+        created: Set[tuple[uuid.UUID, uuid.UUID]] = set()
+        if pairs:
+            stmt = (
+                pg_insert(user_device_association)
+                .on_conflict_do_nothing()
+                .returning(
+                    user_device_association.c.device_id,
+                    user_device_association.c.user_id,
+                )
+            )
+            result = await session.execute(
+                stmt, [{"device_id": pair[0], "user_id": pair[1]} for pair in pairs]
+            )
+            created = {(device_id, user_id) for device_id, user_id in result}
         await session.commit()
-        await session.refresh(device)
 
-        return DeviceWithUsersSchema(
-            serial_number=device.serial_number,
-            id=device.id,
-            users=[UserSchema(name=user.name, id=user.id) for user in device.users],
+        items = []
+        for assignment in assignments:
+            pair = (assignment.device_id, assignment.user_id)
+            if assignment.device_id not in found_devices:
+                status = BatchItemStatus.DEVICE_NOT_FOUND
+            elif assignment.user_id not in found_users:
+                status = BatchItemStatus.USER_NOT_FOUND
+            elif pair in created:
+                # Repeated pairs of the request exist after the first one
+                created.discard(pair)
+                status = BatchItemStatus.CREATED
+            else:
+                status = BatchItemStatus.EXISTS
+            items.append(
+                DeviceUserBatchItem(
+                    device_id=assignment.device_id,
+                    user_id=assignment.user_id,
+                    status=status,
+                )
+            )
+
+        return DeviceUserBatchResponse(
+            created=sum(item.status is BatchItemStatus.CREATED for item in items),
+            assignments=items,
         )
 
     async def get_device_users(
@@ -260,4 +1141,140 @@ class DevicePostgreDAO(DeviceDataStorage):
         return result
 
 
-dao = DevicePostgreDAO()
+class CachedDevicePostgreDAO(DevicePostgreDAO):
+    """DevicePostgreDAO with read-through caching of device lookups.
+
+    Device existence checks (measurement writes, stats, exports) are answered
+    from the cache too. Membership writes invalidate the devices and users
+    they touch.
+    """
+
+    async def get_device(
+        self,
+        session: AsyncSession,
+        device_id: uuid.UUID,
+    ) -> DeviceWithUsersSchema:
+        device = device_cache.get(device_id)
+        if device is None:
+            device = await super().get_device(session, device_id)
+            device_cache.set(device_id, device)
+        return device
+
+    async def get_device_users(
+        self,
+        session: AsyncSession,
+        device_id: uuid.UUID,
+    ) -> List[UserSchema]:
+        users = device_users_cache.get(device_id)
+        if users is None:
+            users = await super().get_device_users(session, device_id)
+            device_users_cache.set(device_id, users)
+        return users
+
+    async def get_existing_device_ids(
+        self,
+        session: AsyncSession,
+        device_ids: Iterable[uuid.UUID],
+    ) -> Set[uuid.UUID]:
+        shared_cache = get_shared_cache()
+        existing: Set[uuid.UUID] = set()
+        unknown: Set[uuid.UUID] = set()
+        for device_id in device_ids:
+            if device_exists_cache.get(device_id) or (
+                shared_cache is not None and shared_cache.get(f"device_ids:{device_id}")
+            ):
+                device_exists_cache.set(device_id, True)
+                existing.add(device_id)
+            else:
+                unknown.add(device_id)
+        if unknown:
+            found = await super().get_existing_device_ids(session, unknown)
+            for device_id in found:
+                device_exists_cache.set(device_id, True)
+                if shared_cache is not None:
+                    shared_cache.set(
+                        f"device_ids:{device_id}", b"1", settings.shared_cache_ttl
+                    )
+            existing |= found
+        return existing
+
+    async def insert_measurement_rows(
+        self,
+        session: AsyncSession,
+        rows: List[MeasurementRow],
+    ) -> None:
+        await super().insert_measurement_rows(session, rows)
+        mark_measurements_changed(session, ((row[1], row[2]) for row in rows))
+
+    async def add_measurement(
+        self,
+        session: AsyncSession,
+        device_id: uuid.UUID,
+        measurement_data: MeasurementCreateSchema,
+    ) -> MeasurementSchema:
+        # Stamped with the server time on insert
+        mark_measurements_changed(session, [(device_id, datetime.now())])
+        return await super().add_measurement(session, device_id, measurement_data)
+
+    async def get_device_stats(
+        self,
+        session: AsyncSession,
+        device_id: uuid.UUID,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        use_rollups: bool = False,
+        accuracy: StatsAccuracy = StatsAccuracy.EXACT,
+    ) -> DeviceStatsResponse:
+        async def compute() -> DeviceStatsResponse:
+            return await super(CachedDevicePostgreDAO, self).get_device_stats(
+                session, device_id, start_date, end_date, use_rollups, accuracy
+            )
+
+        if not settings.stats_cache_enabled:
+            return await compute()
+        return await stats_cache.get_or_compute(
+            f"device:{device_id}:{start_date}:{end_date}:"
+            f"{use_rollups}:{accuracy.value}",
+            [device_id],
+            end_date,
+            DeviceStatsResponse,
+            compute,
+        )
+
+    def _invalidate_membership(
+        self,
+        device_ids: Iterable[uuid.UUID],
+        user_ids: Iterable[uuid.UUID],
+    ) -> None:
+        device_cache.invalidate(*device_ids)
+        device_users_cache.invalidate(*device_ids)
+        user_cache.invalidate(*user_ids)
+
+    async def add_user_to_device(
+        self,
+        session: AsyncSession,
+        device_id: uuid.UUID,
+        user_id: uuid.UUID,
+    ) -> DeviceWithUsersSchema:
+        device = await super().add_user_to_device(session, device_id, user_id)
+        self._invalidate_membership([device_id], [user_id])
+        return device
+
+    async def add_users_to_devices(
+        self,
+        session: AsyncSession,
+        assignments: List[DeviceUserAssignmentSchema],
+    ) -> DeviceUserBatchResponse:
+        result = await super().add_users_to_devices(session, assignments)
+        created = [
+            item
+            for item in result.assignments
+            if item.status is BatchItemStatus.CREATED
+        ]
+        self._invalidate_membership(
+            {item.device_id for item in created}, {item.user_id for item in created}
+        )
+        return result
+
+
+dao = CachedDevicePostgreDAO() if settings.cache_enabled else DevicePostgreDAO()
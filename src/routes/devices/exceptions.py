@@ -26,3 +26,36 @@ class DeviceSerialNumberException(Exception):
     def __init__(self, message: str = "Device with this serial number already exists"):
         self.message = message
         super().__init__(self.message)
+
+
+class IngestQueueFullException(Exception):
+    def __init__(self, message: str = "Ingest queue is full, retry later"):
+        self.message = message
+        super().__init__(self.message)
+
+
+class UnsupportedMediaTypeException(Exception):
+    def __init__(self, message: str = "Unsupported media type"):
+        self.message = message
+        super().__init__(self.message)
+
+
+class InvalidCursorException(Exception):
+    def __init__(self, message: str = "Invalid pagination cursor"):
+        self.message = message
+        super().__init__(self.message)
+
+
+class NotAcceptableException(Exception):
+    def __init__(self, message: str = "Requested media type is not supported"):
+        self.message = message
+        super().__init__(self.message)
+
+
+class StatsSeriesTooLargeException(Exception):
+    def __init__(
+        self,
+        message: str = "Too many buckets, narrow the window or use a larger bucket",
+    ):
+        self.message = message
+        super().__init__(self.message)
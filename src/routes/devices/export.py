@@ -0,0 +1,245 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from fastapi import Request
+from sqlalchemy.ext.asyncio import AsyncSession
+import structlog
+
+from src.database.database import sessionmanager
+from src.routes.devices.exceptions import NotAcceptableException
+from src.routes.devices.schemas import ExportFormat, MeasurementRow
+
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except ImportError:
+    pa = None
+    pq = None
+
+EXPORT_FETCH_SIZE = 1000
+# Columnar formats get larger batches: one Arrow record batch / Parquet row
+# group per fetch.
+EXPORT_COLUMNAR_FETCH_SIZE = 50_000
+EXPORT_COLUMNS = ["id", "device_id", "timestamp", "x", "y", "z"]
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv",
+    ExportFormat.ARROW: "application/vnd.apache.arrow.stream",
+    ExportFormat.PARQUET: "application/vnd.apache.parquet",
+}
+COLUMNAR_FORMATS = (ExportFormat.ARROW, ExportFormat.PARQUET)
+
+# Opens the row batches to export on the given session
+RowBatches = Callable[[AsyncSession, int], AsyncIterator[List[MeasurementRow]]]
+
+logger = structlog.get_logger(__name__)
+
+
+def negotiate_export_format(
+    export_format: Optional[ExportFormat],
+    accept: Optional[str],
+) -> ExportFormat:
+    """Picks the export format from the `format` parameter or the Accept header.
+
+    Without either NDJSON is used.
+
+    Raises:
+        NotAcceptableException: No acceptable format can be produced, e.g.
+            Arrow/Parquet is requested but pyarrow is not installed
+    """
+    if export_format is None:
+        export_format = _format_from_accept(accept)
+
+    if export_format in COLUMNAR_FORMATS and pa is None:
+        raise NotAcceptableException(
+            f"{export_format.value} export requires the optional pyarrow package"
+        )
+    return export_format
+
+
+def _format_from_accept(accept: Optional[str]) -> ExportFormat:
+    if not accept:
+        return ExportFormat.NDJSON
+
+    formats = {media_type: key for key, media_type in EXPORT_MEDIA_TYPES.items()}
+    ranges = []
+    for position, item in enumerate(accept.split(",")):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            ranges.append((-quality, position, media_type.lower()))
+
+    for _, _, media_type in sorted(ranges):
+        if media_type in formats:
+            return formats[media_type]
+        if media_type in ("*/*", "application/*"):
+            return ExportFormat.NDJSON
+        if media_type == "text/*":
+            return ExportFormat.CSV
+
+    raise NotAcceptableException(
+        "Supported media types: " + ", ".join(EXPORT_MEDIA_TYPES.values())
+    )
+
+
+def encode_ndjson(rows: List[MeasurementRow]) -> bytes:
+    return "".join(
+        json.dumps(
+            {
+                "id": str(measurement_id),
+                "device_id": str(device_id),
+                "timestamp": timestamp.isoformat(),
+                "x": x,
+                "y": y,
+                "z": z,
+            }
+        )
+        + "\n"
+        for measurement_id, device_id, timestamp, x, y, z in rows
+    ).encode()
+
+
+def encode_csv(rows: List[MeasurementRow]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerows(
+        (measurement_id, device_id, timestamp.isoformat(), x, y, z)
+        for measurement_id, device_id, timestamp, x, y, z in rows
+    )
+    return buffer.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file collecting what pyarrow writes until it is taken.
+
+    Keeps counting the position, Parquet records absolute offsets in its
+    footer.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:  # type: ignore[override]
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_schema():
+    return pa.schema(
+        [
+            ("id", pa.string()),
+            ("device_id", pa.dictionary(pa.int32(), pa.string())),
+            ("timestamp", pa.timestamp("us")),
+            ("x", pa.float64()),
+            ("y", pa.float64()),
+            ("z", pa.float64()),
+        ]
+    )
+
+
+def _record_batch(schema, rows: List[MeasurementRow]):
+    """Builds a record batch column by column from result rows."""
+    ids, device_ids, timestamps, xs, ys, zs = zip(*rows)
+    return pa.record_batch(
+        [
+            pa.array([str(value) for value in ids], pa.string()),
+            pa.array([str(value) for value in device_ids]).dictionary_encode(),
+            pa.array(timestamps, pa.timestamp("us")),
+            pa.array(xs, pa.float64()),
+            pa.array(ys, pa.float64()),
+            pa.array(zs, pa.float64()),
+        ],
+        schema=schema,
+    )
+
+
+class _ColumnarEncoder:
+    """Encodes row batches into an Arrow IPC stream or a Parquet file."""
+
+    def __init__(self, export_format: ExportFormat) -> None:
+        self._schema = _arrow_schema()
+        self._sink = _ChunkSink()
+        if export_format is ExportFormat.PARQUET:
+            self._writer = pq.ParquetWriter(
+                self._sink, self._schema, compression="zstd"
+            )
+        else:
+            self._writer = pa.ipc.new_stream(
+                self._sink,
+                self._schema,
+                options=pa.ipc.IpcWriteOptions(compression="zstd"),
+            )
+
+    def __call__(self, rows: List[MeasurementRow]) -> bytes:
+        self._writer.write_batch(_record_batch(self._schema, rows))
+        return self._sink.take()
+
+    def close(self) -> bytes:
+        self._writer.close()
+        return self._sink.take()
+
+
+async def export_measurements(
+    request: Request,
+    row_batches: RowBatches,
+    export_format: ExportFormat,
+    **log_context,
+) -> AsyncIterator[bytes]:
+    """Encodes measurement row batches one at a time for a StreamingResponse.
+
+    The body is sent after request dependencies are closed, so the generator
+    opens its own session. Only one batch of rows is held in memory, and the
+    server-side cursor is closed as soon as the client disconnects.
+    """
+    columnar = export_format in COLUMNAR_FORMATS
+    encoders: Dict[ExportFormat, Callable[[List[MeasurementRow]], bytes]] = {
+        ExportFormat.NDJSON: encode_ndjson,
+        ExportFormat.CSV: encode_csv,
+    }
+    encode = _ColumnarEncoder(export_format) if columnar else encoders[export_format]
+    batch_size = EXPORT_COLUMNAR_FETCH_SIZE if columnar else EXPORT_FETCH_SIZE
+    exported = 0
+
+    if export_format is ExportFormat.CSV:
+        yield (",".join(EXPORT_COLUMNS) + "\n").encode()
+
+    async with sessionmanager.session() as session:
+        async for rows in row_batches(session, batch_size):
+            if await request.is_disconnected():
+                logger.info(
+                    "export_measurements: client disconnected",
+                    exported=exported,
+                    **log_context,
+                )
+                return
+
+            yield encode(rows)
+            exported += len(rows)
+
+    if isinstance(encode, _ColumnarEncoder):
+        yield encode.close()
+
+    logger.info("export_measurements: completed", exported=exported, **log_context)
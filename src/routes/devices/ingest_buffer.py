@@ -0,0 +1,267 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import List, Optional
+import uuid
+
+import structlog
+
+from src.database.database import sessionmanager
+from src.routes.devices.dao import dao
+from src.routes.devices.exceptions import (
+    DeviceNotFoundException,
+    IngestQueueFullException,
+)
+from src.routes.devices.schemas import (
+    IngestBufferStatsSchema,
+    MeasurementCreateSchema,
+    MeasurementRow,
+    MeasurementSchema,
+)
+from src.settings import settings
+from src.utils import uuid7
+
+
+logger = structlog.get_logger(__name__)
+
+
+class MeasurementIngestBuffer:
+    """Write-behind buffer for single measurements.
+
+    Samples are put on a bounded in-process queue and acknowledged right away.
+    A background flusher groups queued samples and writes them in bulk as soon
+    as `flush_max_size` samples are collected or `flush_interval` seconds have
+    passed since the first sample of the batch.
+
+    Samples still queued when the process is killed are lost, so the buffer
+    trades durability for write throughput. On shutdown the queue is drained
+    for at most `drain_timeout` seconds.
+
+    Attributes:
+        max_queue_size (int): Queue capacity, new samples are rejected above it
+        flush_max_size (int): Maximum number of samples written in one flush
+        flush_interval (float): Maximum time in seconds a sample waits in a batch
+        drain_timeout (float): Maximum time in seconds `stop` waits for the
+            queued samples to be written
+    """
+
+    def __init__(
+        self,
+        max_queue_size: int,
+        flush_max_size: int,
+        flush_interval: float,
+        drain_timeout: float,
+    ) -> None:
+        self.max_queue_size = max_queue_size
+        self.flush_max_size = flush_max_size
+        self.flush_interval = flush_interval
+        self.drain_timeout = drain_timeout
+
+        self._queue: Optional[asyncio.Queue[MeasurementRow]] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.enqueued_total = 0
+        self.rejected_total = 0
+        self.flushed_total = 0
+        self.dropped_total = 0
+        self.flushes_total = 0
+        self.last_flush_size = 0
+        self.last_flush_latency_ms = 0.0
+        self.max_flush_latency_ms = 0.0
+        self._flush_latency_sum_ms = 0.0
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            "ingest_buffer: started",
+            max_queue_size=self.max_queue_size,
+            flush_max_size=self.flush_max_size,
+            flush_interval=self.flush_interval,
+        )
+
+    async def stop(self) -> None:
+        """Stop accepting samples, write everything queued and stop the flusher.
+
+        Gives up after `drain_timeout` seconds, or as soon as the flusher is
+        gone: samples left unwritten then are counted and logged as dropped.
+        """
+        if self._task is None or self._queue is None:
+            return
+
+        task, self._task = self._task, None
+        logger.info("ingest_buffer: draining", queue_depth=self._queue.qsize())
+        drained = asyncio.ensure_future(self._queue.join())
+        await asyncio.wait(
+            {drained, task},
+            timeout=self.drain_timeout,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        drained.cancel()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error("ingest_buffer: flusher failed", error=str(e))
+
+        # Queued or cut off in the middle of a flush
+        unwritten = self.enqueued_total - self.flushed_total - self.dropped_total
+        if unwritten:
+            self.dropped_total += unwritten
+            logger.warning(
+                "ingest_buffer: measurements dropped on shutdown", dropped=unwritten
+            )
+
+        self._queue = None
+        logger.info("ingest_buffer: stopped", flushed_total=self.flushed_total)
+
+    def put(
+        self,
+        device_id: uuid.UUID,
+        measurement_data: MeasurementCreateSchema,
+    ) -> MeasurementSchema:
+        """Queue a measurement and return it as it is going to be stored.
+
+        Raises:
+            IngestQueueFullException: The queue is full or the buffer is stopped
+        """
+        if self._task is None or self._queue is None:
+            raise IngestQueueFullException("Ingest buffer is not running")
+
+        row: MeasurementRow = (
+            uuid7(),
+            device_id,
+            datetime.now(),
+            measurement_data.x,
+            measurement_data.y,
+            measurement_data.z,
+        )
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            self.rejected_total += 1
+            raise IngestQueueFullException()
+
+        self.enqueued_total += 1
+        return MeasurementSchema(
+            id=row[0],
+            device_id=row[1],
+            timestamp=row[2],
+            x=row[3],
+            y=row[4],
+            z=row[5],
+        )
+
+    def stats(self) -> IngestBufferStatsSchema:
+        return IngestBufferStatsSchema(
+            running=self.is_running,
+            queue_depth=self._queue.qsize() if self._queue is not None else 0,
+            queue_max_size=self.max_queue_size,
+            enqueued_total=self.enqueued_total,
+            rejected_total=self.rejected_total,
+            flushed_total=self.flushed_total,
+            dropped_total=self.dropped_total,
+            flushes_total=self.flushes_total,
+            last_flush_size=self.last_flush_size,
+            last_flush_latency_ms=self.last_flush_latency_ms,
+            max_flush_latency_ms=self.max_flush_latency_ms,
+            avg_flush_latency_ms=(
+                self._flush_latency_sum_ms / self.flushes_total
+                if self.flushes_total
+                else 0.0
+            ),
+        )
+
+    async def _run(self) -> None:
+        if self._queue is None:
+            return
+        queue = self._queue
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.flush_interval
+
+            while len(batch) < self.flush_max_size:
+                try:
+                    batch.append(queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def _flush(self, batch: List[MeasurementRow]) -> None:
+        start_time = time.perf_counter()
+
+        try:
+            try:
+                written = await self._write(batch)
+            except DeviceNotFoundException:
+                # Samples of unknown (or deleted) devices break the whole COPY,
+                # keep only the rows whose devices exist and try once more.
+                written = await self._write(await self._filter_known_devices(batch))
+        except Exception as e:
+            written = 0
+            logger.error("ingest_buffer: flush failed", error=str(e), size=len(batch))
+
+        latency_ms = (time.perf_counter() - start_time) * 1000
+
+        self.flushes_total += 1
+        self.flushed_total += written
+        self.dropped_total += len(batch) - written
+        self.last_flush_size = written
+        self.last_flush_latency_ms = latency_ms
+        self.max_flush_latency_ms = max(self.max_flush_latency_ms, latency_ms)
+        self._flush_latency_sum_ms += latency_ms
+
+        if written != len(batch):
+            logger.warning(
+                "ingest_buffer: measurements dropped", dropped=len(batch) - written
+            )
+
+    async def _write(self, rows: List[MeasurementRow]) -> int:
+        if not rows:
+            return 0
+        async with sessionmanager.session() as session:
+            await dao.insert_measurement_rows(session, rows)
+            await session.commit()
+        return len(rows)
+
+    async def _filter_known_devices(
+        self,
+        rows: List[MeasurementRow],
+    ) -> List[MeasurementRow]:
+        async with sessionmanager.session() as session:
+            existing = await dao.get_existing_device_ids(
+                session, {row[1] for row in rows}
+            )
+        return [row for row in rows if row[1] in existing]
+
+
+ingest_buffer = MeasurementIngestBuffer(
+    max_queue_size=settings.ingest_queue_max_size,
+    flush_max_size=settings.ingest_flush_max_size,
+    flush_interval=settings.ingest_flush_interval,
+    drain_timeout=settings.ingest_drain_timeout,
+)
@@ -1,7 +1,23 @@
 from datetime import datetime
-from typing import List, Optional
+from enum import Enum
+from typing import Annotated, Dict, List, Optional
 import uuid
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
+
+from src.utils import to_naive_local_time
+
+DEVICES_PAGE_DEFAULT_LIMIT = 100
+DEVICES_PAGE_MAX_LIMIT = 1000
+DEVICES_BATCH_MAX_SIZE = 10_000
+MEASUREMENTS_BATCH_MAX_SIZE = 10_000
+MEASUREMENTS_PAGE_DEFAULT_LIMIT = 1000
+MEASUREMENTS_PAGE_MAX_LIMIT = 10_000
+MEASUREMENTS_DOWNSAMPLE_MAX_POINTS = 10_000
+STATS_SERIES_MAX_BUCKETS = 10_000
+STATS_BATCH_MAX_DEVICES = 1000
+
+# (id, device_id, timestamp, x, y, z) - raw measurement row used by bulk writes
+MeasurementRow = tuple[uuid.UUID, uuid.UUID, datetime, float, float, float]
 
 
 class PartialDeviceSchema(BaseModel):
@@ -23,6 +39,74 @@ class DeviceSchema(PartialDeviceSchema):
         from_attributes = True
 
 
+class DevicePage(BaseModel):
+    """One page of devices, ordered by serial number.
+
+    `next_cursor` is None on the last page, `total` is an estimate of all
+    matching devices and only set on request.
+    """
+
+    devices: List[DeviceSchema]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+
+class BatchItemStatus(str, Enum):
+    """Outcome of one item of a bulk registration or assignment."""
+
+    CREATED = "created"
+    EXISTS = "exists"
+    DEVICE_NOT_FOUND = "device_not_found"
+    USER_NOT_FOUND = "user_not_found"
+
+
+class DeviceBatchRegisterRequest(BaseModel):
+    """Serial numbers of devices to register in a single call."""
+
+    serial_numbers: List[Annotated[str, Field(min_length=3, max_length=30)]] = Field(
+        ..., min_length=1, max_length=DEVICES_BATCH_MAX_SIZE
+    )
+
+
+class DeviceBatchRegisterItem(DeviceSchema):
+    """Device of a bulk registration, `exists` if it was registered before."""
+
+    status: BatchItemStatus
+
+
+class DeviceBatchRegisterResponse(BaseModel):
+    """Outcome of every serial number of a bulk registration, in request order."""
+
+    created: int
+    devices: List[DeviceBatchRegisterItem]
+
+
+class DeviceUserAssignmentSchema(BaseModel):
+    device_id: uuid.UUID
+    user_id: uuid.UUID
+
+
+class DeviceUserBatchRequest(BaseModel):
+    """(device, user) pairs to link in a single call."""
+
+    assignments: List[DeviceUserAssignmentSchema] = Field(
+        ..., min_length=1, max_length=DEVICES_BATCH_MAX_SIZE
+    )
+
+
+class DeviceUserBatchItem(DeviceUserAssignmentSchema):
+    """Assignment of a bulk call, `exists` if the user was already linked."""
+
+    status: BatchItemStatus
+
+
+class DeviceUserBatchResponse(BaseModel):
+    """Outcome of every pair of a bulk assignment, in request order."""
+
+    created: int
+    assignments: List[DeviceUserBatchItem]
+
+
 class MeasurementCreateSchema(BaseModel):
     """Schema for creating new measurement records."""
 
@@ -31,6 +115,68 @@ class MeasurementCreateSchema(BaseModel):
     z: float
 
 
+class MeasurementBatchItemSchema(MeasurementCreateSchema):
+    """Single sample of a measurement batch.
+
+    Extends MeasurementCreateSchema with:
+        timestamp: Optional client-side timestamp. Server time is used if omitted.
+    """
+
+    timestamp: Optional[datetime] = None
+
+    @field_validator("timestamp")
+    @classmethod
+    def to_naive_local_time(cls, value: Optional[datetime]) -> Optional[datetime]:
+        """Store timestamps the same way as server-generated ones (naive local)."""
+        return to_naive_local_time(value) if value is not None else None
+
+
+class MeasurementBatchCreateSchema(BaseModel):
+    """Schema for ingesting many measurements of one device in a single call."""
+
+    measurements: List[MeasurementBatchItemSchema] = Field(
+        ..., min_length=1, max_length=MEASUREMENTS_BATCH_MAX_SIZE
+    )
+
+
+class MeasurementBatchResponse(BaseModel):
+    """Result of a batch ingest. `ids` are returned only on request."""
+
+    device_id: uuid.UUID
+    count: int
+    ids: Optional[List[uuid.UUID]] = None
+
+
+class IngestBufferStatsSchema(BaseModel):
+    """Counters of the write-behind measurement ingest buffer."""
+
+    running: bool
+    queue_depth: int
+    queue_max_size: int
+    enqueued_total: int
+    rejected_total: int
+    flushed_total: int
+    dropped_total: int
+    flushes_total: int
+    last_flush_size: int
+    last_flush_latency_ms: float
+    max_flush_latency_ms: float
+    avg_flush_latency_ms: float
+
+
+class MeasurementStreamIngestResponse(BaseModel):
+    """Result of a streaming (NDJSON/CSV) measurement upload."""
+
+    device_id: uuid.UUID
+    inserted: int
+    rejected: int
+    rejected_lines: List[int] = Field(
+        default=[], description="Line numbers of the first rejected lines"
+    )
+    elapsed_ms: float
+    rows_per_second: float
+
+
 class PartialUserSchema(BaseModel):
     name: str = Field(..., min_length=2, max_length=100)
 
@@ -53,6 +199,66 @@ class MeasurementSchema(MeasurementCreateSchema):
         from_attributes = True
 
 
+class MeasurementPage(BaseModel):
+    """One page of measurements, newest first.
+
+    `next_cursor` is None on the last page.
+    """
+
+    measurements: List[MeasurementSchema]
+    next_cursor: Optional[str] = None
+
+
+class DownsampleMethod(str, Enum):
+    """How a measurement series is reduced to a number of points.
+
+    LTTB: Largest-Triangle-Three-Buckets, keeps shape-defining points.
+    MINMAX: bucket averages with the min/max envelope of every bucket.
+    AVG: bucket averages.
+    """
+
+    LTTB = "lttb"
+    MINMAX = "minmax"
+    AVG = "avg"
+
+
+class MeasurementPointSchema(MeasurementCreateSchema):
+    """Point of a downsampled measurement series.
+
+    Bucket aggregates (`avg`, `minmax`) are stamped with the bucket start and
+    report the number of samples in the bucket, `minmax` also reports the
+    extremes of every axis.
+    """
+
+    timestamp: datetime
+    count: Optional[int] = None
+    x_min: Optional[float] = None
+    x_max: Optional[float] = None
+    y_min: Optional[float] = None
+    y_max: Optional[float] = None
+    z_min: Optional[float] = None
+    z_max: Optional[float] = None
+
+
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+    ARROW = "arrow"
+    PARQUET = "parquet"
+
+
+class StatsAccuracy(str, Enum):
+    """How stats are computed.
+
+    EXACT: from raw measurements.
+    APPROX: from rollups and quantile sketches, median and percentiles are
+        estimates within the configured relative error.
+    """
+
+    EXACT = "exact"
+    APPROX = "approx"
+
+
 class StatsValues(BaseModel):
     """Statistical summary for a set of measurement values."""
 
@@ -60,7 +266,8 @@ class StatsValues(BaseModel):
     max: float
     count: int
     sum: float
-    median: float
+    median: Optional[float] = None
+    percentiles: Optional[Dict[str, float]] = None
 
 
 class DeviceStatsResponse(BaseModel):
@@ -73,6 +280,58 @@ class DeviceStatsResponse(BaseModel):
     period: dict[str, Optional[datetime]]
 
 
+class DeviceStatsBatchRequest(BaseModel):
+    """Devices and the time window of a batch stats request."""
+
+    device_ids: List[uuid.UUID] = Field(
+        ..., min_length=1, max_length=STATS_BATCH_MAX_DEVICES
+    )
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    use_rollups: bool = False
+    accuracy: StatsAccuracy = StatsAccuracy.EXACT
+
+
+class DeviceStatsBatchError(BaseModel):
+    """Batch stats line of a device without stats, `detail` as in HTTP errors."""
+
+    device_id: uuid.UUID
+    detail: str
+
+
+class StatsBucket(str, Enum):
+    """Bucket size of a stats series."""
+
+    MINUTE = "1m"
+    HOUR = "1h"
+    DAY = "1d"
+
+
+class SeriesStatsValues(BaseModel):
+    """Statistical summary of one axis in one time bucket."""
+
+    min: float
+    max: float
+    mean: float
+    count: int
+
+
+class StatsSeriesBucket(BaseModel):
+    bucket_start: datetime
+    x: SeriesStatsValues
+    y: SeriesStatsValues
+    z: SeriesStatsValues
+
+
+class DeviceStatsSeriesResponse(BaseModel):
+    """Per-bucket statistics of a device's measurements, empty buckets omitted."""
+
+    device_id: uuid.UUID
+    bucket: StatsBucket
+    period: dict[str, Optional[datetime]]
+    buckets: List[StatsSeriesBucket]
+
+
 class DeviceWithUsersSchema(DeviceSchema):
     """Extended device information including associated users."""
 
@@ -0,0 +1,191 @@
+import json
+import math
+import time
+from datetime import datetime
+from typing import AsyncIterator, Callable, List, Optional
+import uuid
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.routes.devices.dao import dao
+from src.routes.devices.exceptions import (
+    DeviceNotFoundException,
+    UnsupportedMediaTypeException,
+)
+from src.routes.devices.schemas import MeasurementRow, MeasurementStreamIngestResponse
+from src.utils import to_naive_local_time, uuid7
+
+STREAM_INGEST_CHUNK_SIZE = 5000
+STREAM_INGEST_MAX_LINE_LENGTH = 1024
+STREAM_INGEST_MAX_REPORTED_LINES = 100
+
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/jsonl")
+CSV_MEDIA_TYPES = ("text/csv",)
+CSV_DEFAULT_COLUMNS = ["x", "y", "z", "timestamp"]
+
+# (timestamp, x, y, z) parsed from a single line, timestamp may be omitted
+Sample = tuple[Optional[datetime], float, float, float]
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Optional[bytes]]:
+    """Splits a byte stream into lines without buffering more than one line.
+
+    Lines longer than STREAM_INGEST_MAX_LINE_LENGTH are skipped and reported
+    as None, so a malformed upload can not grow the buffer without bound.
+    """
+    buffer = b""
+    oversized = False
+
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+
+        for line in lines:
+            if oversized:
+                oversized = False
+                yield None
+            elif len(line) > STREAM_INGEST_MAX_LINE_LENGTH:
+                yield None
+            else:
+                yield line
+
+        if len(buffer) > STREAM_INGEST_MAX_LINE_LENGTH:
+            oversized = True
+            buffer = b""
+
+    if oversized:
+        yield None
+    elif buffer.strip():
+        yield buffer
+
+
+def _to_float(value) -> float:
+    if isinstance(value, bool):
+        raise ValueError("boolean is not a measurement value")
+    result = float(value)
+    if not math.isfinite(result):
+        raise ValueError("measurement value must be finite")
+    return result
+
+
+def _to_timestamp(value) -> Optional[datetime]:
+    if value is None or value == "":
+        return None
+    return to_naive_local_time(datetime.fromisoformat(value))
+
+
+def parse_ndjson_line(line: bytes) -> Sample:
+    item = json.loads(line)
+    return (
+        _to_timestamp(item.get("timestamp")),
+        _to_float(item["x"]),
+        _to_float(item["y"]),
+        _to_float(item["z"]),
+    )
+
+
+class CsvLineParser:
+    """Parses `x,y,z[,timestamp]` lines, an optional header may reorder columns."""
+
+    def __init__(self) -> None:
+        self.columns = CSV_DEFAULT_COLUMNS
+        self._first_line = True
+
+    def __call__(self, line: bytes) -> Optional[Sample]:
+        values = [value.strip() for value in line.decode().split(",")]
+
+        if self._first_line:
+            self._first_line = False
+            if {"x", "y", "z"} <= set(values):
+                self.columns = values
+                return None
+
+        item = dict(zip(self.columns, values))
+        return (
+            _to_timestamp(item.get("timestamp")),
+            _to_float(item["x"]),
+            _to_float(item["y"]),
+            _to_float(item["z"]),
+        )
+
+
+def get_line_parser(content_type: str) -> Callable[[bytes], Optional[Sample]]:
+    media_type = content_type.split(";")[0].strip().lower()
+
+    if media_type in NDJSON_MEDIA_TYPES:
+        return parse_ndjson_line
+    if media_type in CSV_MEDIA_TYPES:
+        return CsvLineParser()
+
+    raise UnsupportedMediaTypeException(
+        "Supported media types: " + ", ".join(NDJSON_MEDIA_TYPES + CSV_MEDIA_TYPES)
+    )
+
+
+async def ingest_measurement_stream(
+    session: AsyncSession,
+    device_id: uuid.UUID,
+    content_type: str,
+    body: AsyncIterator[bytes],
+) -> MeasurementStreamIngestResponse:
+    """Parses an NDJSON/CSV upload line by line and writes it in fixed-size chunks.
+
+    Only one chunk of rows is held in memory at a time. Invalid lines are
+    counted and skipped, all valid rows are committed in one transaction.
+
+    Raises:
+        UnsupportedMediaTypeException: Content type is neither NDJSON nor CSV
+        DeviceNotFoundException: Device does not exist
+    """
+    parse_line = get_line_parser(content_type)
+
+    if not await dao.get_existing_device_ids(session, [device_id]):
+        raise DeviceNotFoundException()
+
+    start_time = time.perf_counter()
+    inserted = 0
+    rejected_lines: List[int] = []
+    rejected = 0
+    chunk: List[MeasurementRow] = []
+
+    line_number = 0
+    async for line in iter_lines(body):
+        line_number += 1
+        if line is not None and not line.strip():
+            continue
+
+        try:
+            if line is None:
+                raise ValueError("line is too long")
+            sample = parse_line(line)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            rejected += 1
+            if len(rejected_lines) < STREAM_INGEST_MAX_REPORTED_LINES:
+                rejected_lines.append(line_number)
+            continue
+
+        if sample is None:
+            continue
+
+        timestamp, x, y, z = sample
+        chunk.append((uuid7(), device_id, timestamp or datetime.now(), x, y, z))
+
+        if len(chunk) >= STREAM_INGEST_CHUNK_SIZE:
+            await dao.insert_measurement_rows(session, chunk)
+            inserted += len(chunk)
+            chunk = []
+
+    if chunk:
+        await dao.insert_measurement_rows(session, chunk)
+        inserted += len(chunk)
+    await session.commit()
+
+    elapsed = time.perf_counter() - start_time
+    return MeasurementStreamIngestResponse(
+        device_id=device_id,
+        inserted=inserted,
+        rejected=rejected,
+        rejected_lines=rejected_lines,
+        elapsed_ms=elapsed * 1000,
+        rows_per_second=inserted / elapsed if elapsed > 0 else 0.0,
+    )
@@ -1,25 +1,66 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Optional, Union
 import uuid
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import StreamingResponse
 import structlog
 
 from src.database.database import get_db
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.routes.devices.batch_stats import stream_devices_stats
 from src.routes.devices.dao import dao
 from src.routes.devices.exceptions import (
     DeviceNotFoundException,
     DeviceSerialNumberException,
+    IngestQueueFullException,
+    InvalidCursorException,
     MeasurementNotFoundException,
+    NotAcceptableException,
+    StatsSeriesTooLargeException,
+    UnsupportedMediaTypeException,
+)
+from src.routes.devices.export import (
+    EXPORT_MEDIA_TYPES,
+    export_measurements,
+    negotiate_export_format,
 )
+from src.routes.devices.ingest_buffer import ingest_buffer
+from src.routes.devices.stream_ingest import ingest_measurement_stream
 from src.routes.devices.schemas import (
+    DEVICES_PAGE_DEFAULT_LIMIT,
+    DEVICES_PAGE_MAX_LIMIT,
+    MEASUREMENTS_DOWNSAMPLE_MAX_POINTS,
+    MEASUREMENTS_PAGE_DEFAULT_LIMIT,
+    MEASUREMENTS_PAGE_MAX_LIMIT,
+    DeviceBatchRegisterRequest,
+    DeviceBatchRegisterResponse,
     DeviceSchema,
+    DeviceStatsBatchRequest,
     DeviceStatsResponse,
+    DeviceStatsSeriesResponse,
+    DeviceUserBatchRequest,
+    DeviceUserBatchResponse,
     DeviceWithUsersSchema,
+    DownsampleMethod,
+    ExportFormat,
+    MeasurementBatchCreateSchema,
+    MeasurementBatchResponse,
     MeasurementCreateSchema,
+    MeasurementPointSchema,
     MeasurementSchema,
+    MeasurementStreamIngestResponse,
     PartialDeviceSchema,
+    StatsAccuracy,
+    StatsBucket,
 )
 from src.routes.users.exceptions import UserAlreadyExistException, UserNotFoundException
 from src.routes.users.schemas import FullUserSchema
@@ -60,13 +101,92 @@ async def register_new_device(
     return new_device
 
 
+@router.post(
+    "/api/v1/devices/batch/",
+    response_model=DeviceBatchRegisterResponse,
+)
+async def register_new_devices(
+    batch: DeviceBatchRegisterRequest,
+    session: AsyncSession = Depends(get_db),
+):
+    """Register many devices in one transaction.
+
+    Already registered serial numbers are not an error: every serial number
+    is reported with its device ID and `created` or `exists`.
+    """
+    logger.info("register_new_devices: started", devices=len(batch.serial_numbers))
+
+    result = await dao.register_new_devices(
+        session=session, serial_numbers=batch.serial_numbers
+    )
+
+    logger.info("register_new_devices: completed", created=result.created)
+    return result
+
+
+@router.post(
+    "/api/v1/devices/users/batch/",
+    response_model=DeviceUserBatchResponse,
+)
+async def add_users_to_devices(
+    batch: DeviceUserBatchRequest,
+    session: AsyncSession = Depends(get_db),
+):
+    """Add users to devices in one transaction.
+
+    Every (device, user) pair is reported as `created`, `exists`,
+    `device_not_found` or `user_not_found`; missing devices or users do not
+    fail the other pairs.
+    """
+    logger.info("add_users_to_devices: started", assignments=len(batch.assignments))
+
+    result = await dao.add_users_to_devices(
+        session=session, assignments=batch.assignments
+    )
+
+    logger.info("add_users_to_devices: completed", created=result.created)
+    return result
+
+
 @router.get("/api/v1/devices/", response_model=List[DeviceSchema])
-async def get_all_devices(session: AsyncSession = Depends(get_db)):
-    """Get list of all devices with pagination"""
+async def get_all_devices(
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_db),
+    limit: int = Query(DEVICES_PAGE_DEFAULT_LIMIT, ge=1, le=DEVICES_PAGE_MAX_LIMIT),
+    cursor: Optional[str] = Query(
+        None, description="Value of X-Next-Cursor returned with the previous page"
+    ),
+    serial_number: Optional[str] = Query(
+        None, max_length=30, description="Only devices with this serial number prefix"
+    ),
+    total: bool = Query(
+        False, description="Return an estimated number of matching devices"
+    ),
+):
+    """Get a page of devices ordered by serial number.
+
+    If there are more, the cursor of the next page is returned in the
+    `X-Next-Cursor` header and the URL of the next page in the `Link` header.
+    With `total` the estimated number of matching devices is returned in the
+    `X-Total-Count` header.
+    """
     logger.info("get_all_devices: started")
 
     try:
-        devices = await dao.get_all_devices(session=session)
+        page = await dao.get_all_devices(
+            session=session,
+            limit=limit,
+            cursor=cursor,
+            serial_number_prefix=serial_number,
+            with_total=total,
+        )
+    except InvalidCursorException as e:
+        logger.warning("get_all_devices: Invalid cursor", cursor=cursor)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=e.message,
+        )
     except DeviceNotFoundException as e:
         logger.warning("get_all_devices: Devices not found")
         raise HTTPException(
@@ -74,8 +194,15 @@ async def get_all_devices(session: AsyncSession = Depends(get_db)):
             detail=e.message,
         )
 
-    logger.info("get_all_devices: completed", number_of_devices=len(devices))
-    return devices
+    if page.next_cursor:
+        next_url = request.url.include_query_params(cursor=page.next_cursor)
+        response.headers["X-Next-Cursor"] = page.next_cursor
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    if page.total is not None:
+        response.headers["X-Total-Count"] = str(page.total)
+
+    logger.info("get_all_devices: completed", number_of_devices=len(page.devices))
+    return page.devices
 
 
 @router.get("/api/v1/devices/{device_id}/", response_model=DeviceWithUsersSchema)
@@ -104,11 +231,42 @@ async def get_device(device_id: uuid.UUID, session: AsyncSession = Depends(get_d
 async def add_measurement(
     device_id: uuid.UUID,
     measurement_data: MeasurementCreateSchema,
+    response: Response,
     session: AsyncSession = Depends(get_db),
 ):
-    """Add new measurement for specific device"""
+    """Add new measurement for specific device.
+
+    In buffered ingest mode the measurement is queued and written later in bulk,
+    the endpoint answers 202 Accepted (429 Too Many Requests if the queue is full).
+    The device is checked before queueing (cached), unknown devices get 404.
+    """
     logger.info("add_measurement: started", device_id=device_id)
 
+    if ingest_buffer.is_running:
+        try:
+            if not await dao.get_existing_device_ids(session, [device_id]):
+                raise DeviceNotFoundException()
+            measurement = ingest_buffer.put(
+                device_id=device_id, measurement_data=measurement_data
+            )
+        except DeviceNotFoundException as e:
+            logger.warning("add_measurement: Device not found", device_id=device_id)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=e.message,
+            )
+        except IngestQueueFullException as e:
+            logger.warning("add_measurement: Ingest queue is full", device_id=device_id)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=e.message,
+                headers={"Retry-After": "1"},
+            )
+
+        response.status_code = status.HTTP_202_ACCEPTED
+        logger.info("add_measurement: queued", measurement_id=measurement.id)
+        return measurement
+
     try:
         measurement = await dao.add_measurement(
             session=session, device_id=device_id, measurement_data=measurement_data
@@ -124,24 +282,175 @@ async def add_measurement(
     return measurement
 
 
+@router.post(
+    "/api/v1/devices/{device_id}/measurements/batch/",
+    response_model=MeasurementBatchResponse,
+    response_model_exclude_none=True,
+    status_code=status.HTTP_201_CREATED,
+)
+async def add_measurements_batch(
+    device_id: uuid.UUID,
+    batch: MeasurementBatchCreateSchema,
+    return_ids: bool = Query(False),
+    session: AsyncSession = Depends(get_db),
+):
+    """Add many measurements for specific device in a single request"""
+    logger.info(
+        "add_measurements_batch: started",
+        device_id=device_id,
+        batch_size=len(batch.measurements),
+    )
+
+    try:
+        result = await dao.add_measurements_batch(
+            session=session,
+            device_id=device_id,
+            measurements=batch.measurements,
+            return_ids=return_ids,
+        )
+    except DeviceNotFoundException as e:
+        logger.warning("add_measurements_batch: Device not found", device_id=device_id)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=e.message,
+        )
+
+    logger.info(
+        "add_measurements_batch: completed", number_of_measurements=result.count
+    )
+    return result
+
+
+@router.post(
+    "/api/v1/devices/{device_id}/measurements/stream/",
+    response_model=MeasurementStreamIngestResponse,
+    status_code=status.HTTP_201_CREATED,
+)
+async def add_measurements_stream(
+    device_id: uuid.UUID,
+    request: Request,
+    session: AsyncSession = Depends(get_db),
+):
+    """Upload measurements for specific device as NDJSON or CSV stream.
+
+    The body is read incrementally, so uploads of any size use constant memory.
+    NDJSON lines are `{"x": .., "y": .., "z": .., "timestamp": ..}` objects,
+    CSV lines are `x,y,z[,timestamp]` with an optional header row.
+    """
+    content_type = request.headers.get("content-type", "")
+    logger.info(
+        "add_measurements_stream: started",
+        device_id=device_id,
+        content_type=content_type,
+    )
+
+    try:
+        result = await ingest_measurement_stream(
+            session=session,
+            device_id=device_id,
+            content_type=content_type,
+            body=request.stream(),
+        )
+    except UnsupportedMediaTypeException as e:
+        logger.warning(
+            "add_measurements_stream: Unsupported media type",
+            content_type=content_type,
+        )
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=e.message,
+        )
+    except DeviceNotFoundException as e:
+        logger.warning("add_measurements_stream: Device not found", device_id=device_id)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=e.message,
+        )
+
+    logger.info(
+        "add_measurements_stream: completed",
+        inserted=result.inserted,
+        rejected=result.rejected,
+        rows_per_second=round(result.rows_per_second),
+    )
+    return result
+
+
 @router.get(
-    "/api/v1/devices/{device_id}/measurements/", response_model=List[MeasurementSchema]
+    "/api/v1/devices/{device_id}/measurements/",
+    response_model=Union[List[MeasurementSchema], List[MeasurementPointSchema]],
+    response_model_exclude_none=True,
 )
 async def get_device_measurements(
     device_id: uuid.UUID,
+    request: Request,
+    response: Response,
     session: AsyncSession = Depends(get_db),
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
+    limit: int = Query(
+        MEASUREMENTS_PAGE_DEFAULT_LIMIT, ge=1, le=MEASUREMENTS_PAGE_MAX_LIMIT
+    ),
+    cursor: Optional[str] = Query(
+        None, description="Value of X-Next-Cursor returned with the previous page"
+    ),
+    downsample: Optional[int] = Query(
+        None,
+        ge=3,
+        le=MEASUREMENTS_DOWNSAMPLE_MAX_POINTS,
+        description="Reduce the window to at most this many points",
+    ),
+    method: DownsampleMethod = Query(DownsampleMethod.LTTB),
 ):
-    """Get measurements for device with optional date filtering"""
+    """Get a page of measurements for device with optional date filtering.
+
+    Measurements are ordered by timestamp, newest first. If there are more,
+    the cursor of the next page is returned in the `X-Next-Cursor` header and
+    the URL of the next page in the `Link` header.
+
+    With `downsample` the whole window is instead reduced to a chart-ready
+    series of at most that many points (oldest first, not paginated).
+    """
     logger.info("get_device_measurements: started", device_id=device_id)
 
+    if downsample is not None:
+        try:
+            points = await dao.get_device_measurements_downsampled(
+                session=session,
+                device_id=device_id,
+                start_date=start_date,
+                end_date=end_date,
+                points=downsample,
+                method=method,
+            )
+        except MeasurementNotFoundException as e:
+            logger.warning("get_device_measurements: Measurement not found")
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=e.message,
+            )
+
+        logger.info(
+            "get_device_measurements: completed",
+            method=method.value,
+            number_of_points=len(points),
+        )
+        return points
+
     try:
-        measurements = await dao.get_device_measurements(
+        page = await dao.get_device_measurements(
             session=session,
             device_id=device_id,
             start_date=start_date,
             end_date=end_date,
+            limit=limit,
+            cursor=cursor,
+        )
+    except InvalidCursorException as e:
+        logger.warning("get_device_measurements: Invalid cursor", cursor=cursor)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=e.message,
         )
     except MeasurementNotFoundException as e:
         logger.warning("get_device_measurements: Measurement not found")
@@ -150,10 +459,77 @@ async def get_device_measurements(
             detail=e.message,
         )
 
+    if page.next_cursor:
+        next_url = request.url.include_query_params(cursor=page.next_cursor)
+        response.headers["X-Next-Cursor"] = page.next_cursor
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+
     logger.info(
-        "get_device_measurements: completed", number_of_measurements=len(measurements)
+        "get_device_measurements: completed",
+        number_of_measurements=len(page.measurements),
+    )
+    return page.measurements
+
+
+@router.get(
+    "/api/v1/devices/{device_id}/measurements/export/",
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {media_type: {} for media_type in EXPORT_MEDIA_TYPES.values()}}
+    },
+)
+async def export_device_measurements(
+    device_id: uuid.UUID,
+    request: Request,
+    session: AsyncSession = Depends(get_db),
+    start_date: Optional[datetime] = Query(None),
+    end_date: Optional[datetime] = Query(None),
+    export_format: Optional[ExportFormat] = Query(
+        None, alias="format", description="Overrides the Accept header"
+    ),
+):
+    """Stream all measurements of a device (oldest first).
+
+    NDJSON and CSV are always available, Arrow IPC stream and Parquet need
+    the optional pyarrow package. The format is taken from the `format`
+    parameter or negotiated from the Accept header.
+    """
+    logger.info("export_device_measurements: started", device_id=device_id)
+
+    try:
+        export_format = negotiate_export_format(
+            export_format, request.headers.get("accept")
+        )
+    except NotAcceptableException as e:
+        logger.warning("export_device_measurements: Not acceptable")
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail=e.message,
+        )
+
+    if not await dao.get_existing_device_ids(session, [device_id]):
+        logger.warning("export_device_measurements: Device not found")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=DeviceNotFoundException().message,
+        )
+
+    def row_batches(export_session: AsyncSession, batch_size: int):
+        return dao.iter_device_measurement_rows(
+            export_session, device_id, start_date, end_date, batch_size
+        )
+
+    return StreamingResponse(
+        export_measurements(
+            request, row_batches, export_format, device_id=device_id
+        ),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="{device_id}.{export_format.value}"'
+            )
+        },
     )
-    return measurements
 
 
 @router.get("/api/v1/devices/{device_id}/stats/", response_model=DeviceStatsResponse)
@@ -162,6 +538,10 @@ async def get_device_stats(
     session: AsyncSession = Depends(get_db),
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
+    use_rollups: bool = Query(
+        False, description="Answer from pre-aggregated rollups (no median)"
+    ),
+    accuracy: StatsAccuracy = Query(StatsAccuracy.EXACT),
 ):
     """Get statistical analysis for device measurements"""
     logger.info("get_device_stats: started", device_id=device_id)
@@ -172,6 +552,8 @@ async def get_device_stats(
             session=session,
             start_date=start_date,
             end_date=end_date,
+            use_rollups=use_rollups,
+            accuracy=accuracy,
         )
     except DeviceNotFoundException as e:
         logger.warning("get_device_stats: Device not found", device_id=device_id)
@@ -190,6 +572,76 @@ async def get_device_stats(
     return stats
 
 
+@router.post(
+    "/api/v1/devices/stats/batch/",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+async def get_devices_stats_batch(
+    batch: DeviceStatsBatchRequest,
+    request: Request,
+):
+    """Get statistics of many devices for one time window.
+
+    Streams NDJSON: a DeviceStatsResponse line per device with measurements
+    in the window, sent as soon as it is computed, then a `{"device_id",
+    "detail"}` line for every device that is missing or has no measurements.
+    """
+    logger.info("get_devices_stats_batch: started", devices=len(batch.device_ids))
+    return StreamingResponse(
+        stream_devices_stats(request, batch), media_type="application/x-ndjson"
+    )
+
+
+@router.get(
+    "/api/v1/devices/{device_id}/stats/series/",
+    response_model=DeviceStatsSeriesResponse,
+)
+async def get_device_stats_series(
+    device_id: uuid.UUID,
+    session: AsyncSession = Depends(get_db),
+    bucket: StatsBucket = Query(StatsBucket.HOUR),
+    start_date: Optional[datetime] = Query(None),
+    end_date: Optional[datetime] = Query(None),
+):
+    """Get min/max/mean/count of device measurements for every time bucket"""
+    logger.info(
+        "get_device_stats_series: started", device_id=device_id, bucket=bucket.value
+    )
+
+    try:
+        series = await dao.get_device_stats_series(
+            session=session,
+            device_id=device_id,
+            bucket=bucket,
+            start_date=start_date,
+            end_date=end_date,
+        )
+    except DeviceNotFoundException as e:
+        logger.warning("get_device_stats_series: Device not found", device_id=device_id)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=e.message,
+        )
+    except MeasurementNotFoundException as e:
+        logger.warning("get_device_stats_series: Measurement not found")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=e.message,
+        )
+    except StatsSeriesTooLargeException as e:
+        logger.warning("get_device_stats_series: Too many buckets")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=e.message,
+        )
+
+    logger.info(
+        "get_device_stats_series: completed", number_of_buckets=len(series.buckets)
+    )
+    return series
+
+
 @router.post(
     "/api/v1/devices/{device_id}/users/",
     response_model=DeviceWithUsersSchema,
@@ -0,0 +1,37 @@
+from pydantic import BaseModel
+
+
+class CacheStatsSchema(BaseModel):
+    """Counters of one in-process cache (see src/cache.py)."""
+
+    size: int
+    max_size: int
+    ttl: float
+    hits: int
+    misses: int
+    hit_ratio: float
+    evictions: int
+    expirations: int
+    invalidations: int
+
+
+class SharedCacheStatsSchema(BaseModel):
+    """Shared cache (see src/shared_cache.py) with this worker's counters."""
+
+    slots: int
+    slot_size: int
+    hits: int
+    misses: int
+    hit_ratio: float
+    retries: int
+    writes: int
+    generation: int
+
+
+class StatsCacheStatsSchema(BaseModel):
+    """Stats results cache (see src/stats_cache.py) of this worker."""
+
+    computations: int
+    coalesced: int
+    shared_hits: int
+    in_flight: int
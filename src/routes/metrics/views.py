@@ -0,0 +1,45 @@
+from typing import Dict, Optional
+from fastapi import APIRouter
+import structlog
+
+from src.cache import caches
+from src.routes.devices.ingest_buffer import ingest_buffer
+from src.routes.devices.schemas import IngestBufferStatsSchema
+from src.routes.metrics.schemas import (
+    CacheStatsSchema,
+    SharedCacheStatsSchema,
+    StatsCacheStatsSchema,
+)
+from src.shared_cache import get_shared_cache
+from src.stats_cache import stats_cache
+
+router = APIRouter(tags=["metrics"])
+logger = structlog.get_logger()
+
+
+@router.get("/api/v1/metrics/ingest/", response_model=IngestBufferStatsSchema)
+async def get_ingest_metrics():
+    """Get counters of the write-behind measurement ingest buffer"""
+    return ingest_buffer.stats()
+
+
+@router.get("/api/v1/metrics/cache/", response_model=Dict[str, CacheStatsSchema])
+async def get_cache_metrics():
+    """Get counters of the in-process read-through caches, by cache name"""
+    return {name: cache.stats() for name, cache in caches.items()}
+
+
+@router.get(
+    "/api/v1/metrics/cache/shared/",
+    response_model=Optional[SharedCacheStatsSchema],
+)
+async def get_shared_cache_metrics():
+    """Get counters of the cross-worker shared cache (null if disabled)"""
+    shared_cache = get_shared_cache()
+    return shared_cache.stats() if shared_cache is not None else None
+
+
+@router.get("/api/v1/metrics/cache/stats/", response_model=StatsCacheStatsSchema)
+async def get_stats_cache_metrics():
+    """Get coalescing counters of the stats results cache of this worker"""
+    return stats_cache.stats()
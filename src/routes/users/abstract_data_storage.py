@@ -1,13 +1,16 @@
 from abc import ABC, abstractmethod
 from datetime import datetime
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
 import uuid
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.routes.devices.schemas import MeasurementRow, StatsAccuracy
 from src.routes.users.schemas import (
+    USERS_PAGE_DEFAULT_LIMIT,
     FullUserSchema,
     UserAggregatedStatsResponse,
     UserDeviceStatsResponse,
+    UserPage,
     UserWithDevicesSchema,
     PartialUserSchema,
 )
@@ -38,8 +41,35 @@ class UserDataStorage(ABC):
     async def get_all_users(
         self,
         session: AsyncSession,
-    ) -> List[FullUserSchema]:
-        """Retrieve all users from the database."""
+        limit: int = USERS_PAGE_DEFAULT_LIMIT,
+        cursor: Optional[str] = None,
+        with_total: bool = False,
+    ) -> UserPage:
+        """Retrieve a page of users ordered by ID (keyset pagination).
+
+        Raises InvalidCursorException if the cursor is malformed.
+        """
+        pass
+
+    @abstractmethod
+    async def user_exists(
+        self,
+        session: AsyncSession,
+        user_id: uuid.UUID,
+    ) -> bool:
+        """Check whether a user with the given ID exists."""
+        pass
+
+    @abstractmethod
+    def iter_user_measurement_rows(
+        self,
+        session: AsyncSession,
+        user_id: uuid.UUID,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        batch_size: int,
+    ) -> AsyncIterator[List[MeasurementRow]]:
+        """Stream measurements of all user's devices in batches (server-side cursor)"""
         pass
 
     @abstractmethod
@@ -49,6 +79,8 @@ class UserDataStorage(ABC):
         user_id: uuid.UUID,
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None,
+        use_rollups: bool = False,
+        accuracy: StatsAccuracy = StatsAccuracy.EXACT,
     ) -> UserAggregatedStatsResponse:
         """Get aggregated statistics for all user's devices"""
         pass
@@ -60,6 +92,8 @@ class UserDataStorage(ABC):
         user_id: uuid.UUID,
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None,
+        use_rollups: bool = False,
+        accuracy: StatsAccuracy = StatsAccuracy.EXACT,
     ) -> UserDeviceStatsResponse:
         """Get statistics for each user's device separately"""
         pass
@@ -0,0 +1,12 @@
+from src.cache import TTLCache
+from src.routes.users.schemas import UserWithDevicesSchema
+from src.settings import settings
+
+# User with devices by user ID, invalidated by device membership writes
+user_cache: TTLCache[UserWithDevicesSchema] = TTLCache(
+    "users", settings.cache_max_size, settings.cache_ttl
+)
+# Users are never deleted: only existing IDs are cached, never invalidated
+user_exists_cache: TTLCache[bool] = TTLCache(
+    "user_ids", settings.cache_max_size, settings.cache_ttl
+)
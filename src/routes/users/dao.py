@@ -1,25 +1,77 @@
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Type,
+    TypeVar,
+)
 import uuid
-from sqlalchemy import select
+
+import numpy as np
+from sqlalchemy import and_, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from src.database.models import Device, Measurement, User
+from src.database.aggregates import (
+    AXES,
+    measurement_stats_columns,
+    stats_from_row,
+    supports_percentile,
+)
+from src.database.estimates import estimated_count
+from src.database.models import Measurement, User, user_device_association
+from src.database.rollups import get_rollup_stats, merge_stats
+from src.database.sketches import SketchBins, get_sketches, merge_bins, with_quantiles
+from src.database.tiers import (
+    cold_tiers_enabled,
+    iter_cold_rows,
+    merge_row_batches,
+    read_all_columns,
+    read_cold_columns,
+)
 from src.routes.users.abstract_data_storage import UserDataStorage
+from src.routes.users.cache import user_cache, user_exists_cache
 from src.routes.users.schemas import (
+    USERS_PAGE_DEFAULT_LIMIT,
     DeviceStats,
     FullUserSchema,
     PartialUserSchema,
     UserAggregatedStatsResponse,
     UserDeviceStatsResponse,
+    UserPage,
     UserWithDevicesSchema,
 )
 from src.routes.users.exceptions import (
     UserNotFoundException,
     UserAlreadyExistException,
 )
-from src.routes.devices.schemas import DeviceSchema, StatsValues
+from src.routes.devices.exceptions import InvalidCursorException
+from src.routes.devices.schemas import (
+    DeviceSchema,
+    MeasurementRow,
+    StatsAccuracy,
+    StatsValues,
+)
+from src.settings import settings
+from src.shared_cache import get_shared_cache
+from src.stats_cache import stats_cache
+from src.stats import Columns, describe, describe_groups, to_columns
+from src.utils import decode_cursor, encode_cursor
+
+S = TypeVar("S", UserAggregatedStatsResponse, UserDeviceStatsResponse)
+
+
+def _device_measurement_key(row: Sequence[Any]) -> Any:
+    """(device_id, timestamp, id) order of (id, device_id, timestamp, ...) rows."""
+    return row[1], row[2], row[0]
 
 
 class UserPostgreDAO(UserDataStorage):
@@ -29,18 +81,21 @@ class UserPostgreDAO(UserDataStorage):
         session: AsyncSession,
         user_data: PartialUserSchema,
     ) -> FullUserSchema:
-        existing_user = await session.execute(
-            select(User).where(User.name == user_data.name)
+        # One statement: the unique name index detects duplicates, no
+        # check-then-insert race and no refresh.
+        stmt = (
+            pg_insert(User)
+            .values(name=user_data.name)
+            .on_conflict_do_nothing(index_elements=[User.name])
+            .returning(User.id, User.name)
         )
-        if existing_user.scalar_one_or_none():
+        row = (await session.execute(stmt)).one_or_none()
+        if row is None:
+            await session.rollback()
             raise UserAlreadyExistException()
-
-        new_user = User(name=user_data.name)
-        session.add(new_user)
         await session.commit()
-        await session.refresh(new_user)
 
-        return FullUserSchema(id=new_user.id, name=new_user.name)
+        return FullUserSchema(id=row.id, name=row.name)
 
     async def get_user(
         self,
@@ -68,63 +123,211 @@ class UserPostgreDAO(UserDataStorage):
     async def get_all_users(
         self,
         session: AsyncSession,
-    ) -> List[FullUserSchema]:
-        result = await session.execute(select(User))
-        users = result.scalars().all()
+        limit: int = USERS_PAGE_DEFAULT_LIMIT,
+        cursor: Optional[str] = None,
+        with_total: bool = False,
+    ) -> UserPage:
+        # Keyset pagination over the primary key, bare columns
+        query = select(User.id, User.name)
+        total = await estimated_count(session, query) if with_total else None
+
+        if cursor:
+            query = query.where(User.id > self._decode_user_cursor(cursor))
+        query = query.order_by(User.id).limit(limit + 1)
+        rows = (await session.execute(query)).all()
+
+        users = [
+            FullUserSchema(id=user_id, name=name) for user_id, name in rows[:limit]
+        ]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = encode_cursor(users[-1].id)
+
+        return UserPage(users=users, next_cursor=next_cursor, total=total)
+
+    def _decode_user_cursor(self, cursor: str) -> uuid.UUID:
+        try:
+            (user_id,) = decode_cursor(cursor, 1)
+        except ValueError:
+            raise InvalidCursorException()
+        if not isinstance(user_id, str):
+            raise InvalidCursorException()
+        try:
+            return uuid.UUID(user_id)
+        except ValueError:
+            raise InvalidCursorException()
+
+    async def _ensure_user_exists(
+        self,
+        session: AsyncSession,
+        user_id: uuid.UUID,
+    ) -> None:
+        if not await self.user_exists(session, user_id):
+            raise UserNotFoundException()
+
+    async def user_exists(
+        self,
+        session: AsyncSession,
+        user_id: uuid.UUID,
+    ) -> bool:
+        stmt = select(User.id).where(User.id == user_id)
+        return (await session.execute(stmt)).scalar_one_or_none() is not None
+
+    async def iter_user_measurement_rows(
+        self,
+        session: AsyncSession,
+        user_id: uuid.UUID,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        batch_size: int,
+    ) -> AsyncIterator[List[MeasurementRow]]:
+        rows = self._iter_live_measurement_rows(
+            session, user_id, start_date, end_date, batch_size
+        )
+        if cold_tiers_enabled():
+            # Compacted and archived rows merged in (device_id, timestamp, id)
+            # order
+            device_ids = await self._get_device_ids(session, user_id)
+            cold = iter_cold_rows(session, device_ids, start_date, end_date)
+            rows = merge_row_batches([rows, cold], _device_measurement_key)
+        async for batch in rows:
+            yield batch
+
+    async def _iter_live_measurement_rows(
+        self,
+        session: AsyncSession,
+        user_id: uuid.UUID,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        batch_size: int,
+    ) -> AsyncGenerator[List[MeasurementRow], None]:
+        stmt = (
+            select(
+                Measurement.id,
+                Measurement.device_id,
+                Measurement.timestamp,
+                Measurement.x,
+                Measurement.y,
+                Measurement.z,
+            )
+            .join(
+                user_device_association,
+                user_device_association.c.device_id == Measurement.device_id,
+            )
+            .where(
+                user_device_association.c.user_id == user_id,
+                *self._window_conditions(start_date, end_date),
+            )
+            .order_by(Measurement.device_id, Measurement.timestamp, Measurement.id)
+        )
+        result = await session.stream(stmt.execution_options(yield_per=batch_size))
+        try:
+            async for partition in result.partitions():
+                yield [tuple(row) for row in partition]
+        finally:
+            await result.close()
+
+    async def _get_device_ids(
+        self,
+        session: AsyncSession,
+        user_id: uuid.UUID,
+    ) -> List[uuid.UUID]:
+        stmt = select(user_device_association.c.device_id).where(
+            user_device_association.c.user_id == user_id
+        )
+        return list((await session.scalars(stmt)).all())
+
+    def _window_conditions(
+        self,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+    ) -> List[Any]:
+        conditions = []
+        if start_date:
+            conditions.append(Measurement.timestamp >= start_date)
+        if end_date:
+            conditions.append(Measurement.timestamp <= end_date)
+        return conditions
 
-        return [FullUserSchema(id=user.id, name=user.name) for user in users]
+    async def _get_cold_values(
+        self,
+        session: AsyncSession,
+        user_id: uuid.UUID,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+    ) -> Optional[tuple[List[uuid.UUID], Dict[uuid.UUID, Columns]]]:
+        """The user's devices and values of all tiers when the window reaches
+        into compacted or archived samples, otherwise None: exact stats then
+        need the values of every tier instead of SQL aggregates.
+        """
+        if not cold_tiers_enabled():
+            return None
+        device_ids = await self._get_device_ids(session, user_id)
+        cold = await read_cold_columns(session, device_ids, start_date, end_date)
+        if not cold:
+            return None
+        values = await read_all_columns(session, device_ids, start_date, end_date, cold)
+        return device_ids, values
 
-    async def _get_user_measurements(
+    async def _get_user_medians(
         self,
         session: AsyncSession,
         user_id: uuid.UUID,
         start_date: Optional[datetime],
         end_date: Optional[datetime],
     ) -> tuple[
-        User, List[Device], Dict[uuid.UUID, List[Measurement]], List[Measurement]
+        Dict[str, Optional[float]], Dict[uuid.UUID, Dict[str, Optional[float]]]
     ]:
+        # Fallback for backends without percentile_cont: fetch bare columns of
+        # the window (no ORM objects) and compute medians with NumPy.
         stmt = (
-            select(User)
-            .where(User.id == user_id)
-            .options(selectinload(User.devices).selectinload(Device.measurements))
+            select(
+                Measurement.device_id, Measurement.x, Measurement.y, Measurement.z
+            )
+            .join(
+                user_device_association,
+                user_device_association.c.device_id == Measurement.device_id,
+            )
+            .where(
+                user_device_association.c.user_id == user_id,
+                *self._window_conditions(start_date, end_date),
+            )
         )
+        rows = (await session.execute(stmt)).all()
+        values = to_columns(rows, start=1)
 
-        user = (await session.scalars(stmt)).first()
-        if not user:
-            raise UserNotFoundException()
+        def medians(stats: Dict[str, Dict[str, Any]]) -> Dict[str, Optional[float]]:
+            return {axis: stats[axis]["median"] for axis in AXES}
+
+        device_stats = describe_groups([row.device_id for row in rows], values)
+        return medians(describe(values)), {
+            device_id: medians(stats) for device_id, stats in device_stats.items()
+        }
+
+    async def _get_user_rollup_stats(
+        self,
+        session: AsyncSession,
+        user_id: uuid.UUID,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        with_sketches: bool = False,
+    ) -> tuple[
+        List[uuid.UUID],
+        Dict[uuid.UUID, Dict[str, Dict[str, Any]]],
+        Dict[uuid.UUID, Dict[str, SketchBins]],
+    ]:
+        device_ids = await self._get_device_ids(session, user_id)
+        if not device_ids:
+            await self._ensure_user_exists(session, user_id)
+            return [], {}, {}
 
-        device_measurements_map = {}
-        all_measurements = []
-
-        for device in user.devices:
-            device_measurements = [
-                m
-                for m in device.measurements
-                if (not start_date or m.timestamp >= start_date)
-                and (not end_date or m.timestamp <= end_date)
-            ]
-            device_measurements_map[device.id] = device_measurements
-            all_measurements.extend(device_measurements)
-
-        return user, user.devices, device_measurements_map, all_measurements
-
-    async def _calculate_stats(self, values: List[float]) -> StatsValues:
-        if not values:
-            return StatsValues(min=0.0, max=0.0, count=0, sum=0.0, median=0.0)
-
-        sorted_values = sorted(values)
-        count = len(sorted_values)
-        return StatsValues(
-            min=min(sorted_values),
-            max=max(sorted_values),
-            count=count,
-            sum=sum(sorted_values),
-            median=(
-                sorted_values[count // 2]
-                if count % 2
-                else (sorted_values[count // 2 - 1] + sorted_values[count // 2]) / 2
-            ),
+        device_stats = await get_rollup_stats(session, device_ids, start_date, end_date)
+        sketches = (
+            await get_sketches(session, device_ids, start_date, end_date)
+            if with_sketches
+            else {}
         )
+        return device_ids, device_stats, sketches
 
     async def get_user_aggregated_stats(
         self,
@@ -132,21 +335,89 @@ class UserPostgreDAO(UserDataStorage):
         user_id: uuid.UUID,
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None,
+        use_rollups: bool = False,
+        accuracy: StatsAccuracy = StatsAccuracy.EXACT,
     ) -> UserAggregatedStatsResponse:
-        user, devices, _, all_measurements = await self._get_user_measurements(
-            session, user_id, start_date, end_date
+        approx = accuracy is StatsAccuracy.APPROX and (
+            settings.rollups_enabled and settings.sketches_enabled
         )
+        if approx or (use_rollups and settings.rollups_enabled):
+            device_ids, device_stats, sketches = await self._get_user_rollup_stats(
+                session, user_id, start_date, end_date, with_sketches=approx
+            )
+            merged = merge_stats(list(device_stats.values()))
+            if approx:
+                merged = {
+                    axis: with_quantiles(
+                        merged[axis],
+                        merge_bins(bins[axis] for bins in sketches.values()),
+                    )
+                    for axis in AXES
+                }
+            return UserAggregatedStatsResponse(
+                user_id=user_id,
+                total_devices=len(device_ids),
+                total_measurements=merged["x"]["count"],
+                period={"start": start_date, "end": end_date},
+                stats={axis: StatsValues(**merged[axis]) for axis in AXES},
+            )
+
+        cold = await self._get_cold_values(session, user_id, start_date, end_date)
+        if cold is not None:
+            device_ids, device_values = cold
+            all_values = np.hstack(list(device_values.values()))
+            all_stats = describe(all_values)
+            return UserAggregatedStatsResponse(
+                user_id=user_id,
+                total_devices=len(device_ids),
+                total_measurements=all_values.shape[1],
+                period={"start": start_date, "end": end_date},
+                stats={axis: StatsValues(**all_stats[axis]) for axis in AXES},
+            )
+
+        with_median = supports_percentile(session)
+
+        total_devices = (
+            select(func.count())
+            .select_from(user_device_association)
+            .where(user_device_association.c.user_id == user_id)
+            .scalar_subquery()
+        )
+        stmt = (
+            select(
+                total_devices.label("total_devices"),
+                *measurement_stats_columns(with_median),
+            )
+            .select_from(user_device_association)
+            .join(
+                Measurement,
+                Measurement.device_id == user_device_association.c.device_id,
+            )
+            .where(
+                user_device_association.c.user_id == user_id,
+                *self._window_conditions(start_date, end_date),
+            )
+        )
+        row = (await session.execute(stmt)).one()
+
+        if not row.total_devices:
+            await self._ensure_user_exists(session, user_id)
+
+        stats = {axis: StatsValues(**stats_from_row(row, axis)) for axis in AXES}
+
+        if not with_median and row.x_count:
+            medians, _ = await self._get_user_medians(
+                session, user_id, start_date, end_date
+            )
+            for axis in AXES:
+                stats[axis].median = medians[axis]
 
         return UserAggregatedStatsResponse(
             user_id=user_id,
-            total_devices=len(devices),
-            total_measurements=len(all_measurements),
+            total_devices=row.total_devices,
+            total_measurements=row.x_count,
             period={"start": start_date, "end": end_date},
-            stats={
-                "x": await self._calculate_stats([m.x for m in all_measurements]),
-                "y": await self._calculate_stats([m.y for m in all_measurements]),
-                "z": await self._calculate_stats([m.z for m in all_measurements]),
-            },
+            stats=stats,
         )
 
     async def get_user_devices_stats(
@@ -155,32 +426,213 @@ class UserPostgreDAO(UserDataStorage):
         user_id: uuid.UUID,
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None,
+        use_rollups: bool = False,
+        accuracy: StatsAccuracy = StatsAccuracy.EXACT,
     ) -> UserDeviceStatsResponse:
-        user, devices, device_measurements_map, all_measurements = (
-            await self._get_user_measurements(session, user_id, start_date, end_date)
+        approx = accuracy is StatsAccuracy.APPROX and (
+            settings.rollups_enabled and settings.sketches_enabled
         )
+        if approx or (use_rollups and settings.rollups_enabled):
+            device_ids, device_stats, sketches = await self._get_user_rollup_stats(
+                session, user_id, start_date, end_date, with_sketches=approx
+            )
+            empty = merge_stats([])
+            devices = []
+            for device_id in device_ids:
+                values = device_stats.get(device_id, empty)
+                if approx:
+                    bins = sketches.get(device_id, {})
+                    values = {
+                        axis: with_quantiles(values[axis], bins.get(axis, {}))
+                        for axis in AXES
+                    }
+                devices.append(
+                    DeviceStats(
+                        device_id=device_id,
+                        stats={axis: StatsValues(**values[axis]) for axis in AXES},
+                    )
+                )
+            return UserDeviceStatsResponse(
+                user_id=user_id,
+                total_devices=len(device_ids),
+                total_measurements=sum(
+                    stats["x"]["count"] for stats in device_stats.values()
+                ),
+                period={"start": start_date, "end": end_date},
+                devices=devices,
+            )
 
-        devices_stats = []
-        for device in devices:
-            measurements = device_measurements_map.get(device.id, [])
-            devices_stats.append(
-                DeviceStats(
-                    device_id=device.id,
-                    stats={
-                        "x": await self._calculate_stats([m.x for m in measurements]),
-                        "y": await self._calculate_stats([m.y for m in measurements]),
-                        "z": await self._calculate_stats([m.z for m in measurements]),
-                    },
+        cold = await self._get_cold_values(session, user_id, start_date, end_date)
+        if cold is not None:
+            device_ids, device_values = cold
+            no_values = np.empty((len(AXES), 0))
+            devices = []
+            for device_id in device_ids:
+                described = describe(device_values.get(device_id, no_values))
+                devices.append(
+                    DeviceStats(
+                        device_id=device_id,
+                        stats={axis: StatsValues(**described[axis]) for axis in AXES},
+                    )
                 )
+            return UserDeviceStatsResponse(
+                user_id=user_id,
+                total_devices=len(device_ids),
+                total_measurements=sum(
+                    values.shape[1] for values in device_values.values()
+                ),
+                period={"start": start_date, "end": end_date},
+                devices=devices,
             )
 
+        with_median = supports_percentile(session)
+
+        # Window conditions go to the join condition, so devices without
+        # measurements in the window are still reported (with zero stats).
+        stmt = (
+            select(
+                user_device_association.c.device_id,
+                *measurement_stats_columns(with_median),
+            )
+            .select_from(user_device_association)
+            .outerjoin(
+                Measurement,
+                and_(
+                    Measurement.device_id == user_device_association.c.device_id,
+                    *self._window_conditions(start_date, end_date),
+                ),
+            )
+            .where(user_device_association.c.user_id == user_id)
+            .group_by(user_device_association.c.device_id)
+        )
+        rows = (await session.execute(stmt)).all()
+
+        if not rows:
+            await self._ensure_user_exists(session, user_id)
+
+        device_medians: Dict[uuid.UUID, Dict[str, Optional[float]]] = {}
+        if not with_median and any(row.x_count for row in rows):
+            _, device_medians = await self._get_user_medians(
+                session, user_id, start_date, end_date
+            )
+
+        devices_stats = []
+        for row in rows:
+            stats = {axis: StatsValues(**stats_from_row(row, axis)) for axis in AXES}
+            for axis, median in device_medians.get(row.device_id, {}).items():
+                stats[axis].median = median
+            devices_stats.append(DeviceStats(device_id=row.device_id, stats=stats))
+
         return UserDeviceStatsResponse(
             user_id=user_id,
-            total_devices=len(devices),
-            total_measurements=len(all_measurements),
+            total_devices=len(rows),
+            total_measurements=sum(row.x_count for row in rows),
             period={"start": start_date, "end": end_date},
             devices=devices_stats,
         )
 
 
-dao = UserPostgreDAO()
+class CachedUserPostgreDAO(UserPostgreDAO):
+    """UserPostgreDAO with read-through caching of user lookups."""
+
+    async def get_user(
+        self,
+        session: AsyncSession,
+        user_id: uuid.UUID,
+    ) -> UserWithDevicesSchema:
+        user = user_cache.get(user_id)
+        if user is None:
+            user = await super().get_user(session, user_id)
+            user_cache.set(user_id, user)
+        return user
+
+    async def user_exists(
+        self,
+        session: AsyncSession,
+        user_id: uuid.UUID,
+    ) -> bool:
+        shared_cache = get_shared_cache()
+        if user_exists_cache.get(user_id):
+            return True
+        if shared_cache is not None and shared_cache.get(f"user_ids:{user_id}"):
+            user_exists_cache.set(user_id, True)
+            return True
+
+        exists = await super().user_exists(session, user_id)
+        if exists:
+            user_exists_cache.set(user_id, True)
+            if shared_cache is not None:
+                shared_cache.set(
+                    f"user_ids:{user_id}", b"1", settings.shared_cache_ttl
+                )
+        return exists
+
+    async def _cached_stats(
+        self,
+        session: AsyncSession,
+        key: str,
+        user_id: uuid.UUID,
+        end_date: Optional[datetime],
+        model: Type[S],
+        compute: Callable[[], Awaitable[S]],
+    ) -> S:
+        if not settings.stats_cache_enabled:
+            return await compute()
+        # Membership is cached too, the key covers the user's devices
+        user = await self.get_user(session, user_id)
+        return await stats_cache.get_or_compute(
+            f"{key}:{user_id}",
+            [device.id for device in user.devices],
+            end_date,
+            model,
+            compute,
+        )
+
+    async def get_user_aggregated_stats(
+        self,
+        session: AsyncSession,
+        user_id: uuid.UUID,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        use_rollups: bool = False,
+        accuracy: StatsAccuracy = StatsAccuracy.EXACT,
+    ) -> UserAggregatedStatsResponse:
+        async def compute() -> UserAggregatedStatsResponse:
+            return await super(CachedUserPostgreDAO, self).get_user_aggregated_stats(
+                session, user_id, start_date, end_date, use_rollups, accuracy
+            )
+
+        return await self._cached_stats(
+            session,
+            f"user_aggregated:{start_date}:{end_date}:{use_rollups}:{accuracy.value}",
+            user_id,
+            end_date,
+            UserAggregatedStatsResponse,
+            compute,
+        )
+
+    async def get_user_devices_stats(
+        self,
+        session: AsyncSession,
+        user_id: uuid.UUID,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        use_rollups: bool = False,
+        accuracy: StatsAccuracy = StatsAccuracy.EXACT,
+    ) -> UserDeviceStatsResponse:
+        async def compute() -> UserDeviceStatsResponse:
+            return await super(CachedUserPostgreDAO, self).get_user_devices_stats(
+                session, user_id, start_date, end_date, use_rollups, accuracy
+            )
+
+        return await self._cached_stats(
+            session,
+            f"user_devices:{start_date}:{end_date}:{use_rollups}:{accuracy.value}",
+            user_id,
+            end_date,
+            UserDeviceStatsResponse,
+            compute,
+        )
+
+
+dao = CachedUserPostgreDAO() if settings.cache_enabled else UserPostgreDAO()
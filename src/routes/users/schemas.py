@@ -5,6 +5,9 @@ import uuid
 
 from src.routes.devices.schemas import DeviceSchema, StatsValues
 
+USERS_PAGE_DEFAULT_LIMIT = 100
+USERS_PAGE_MAX_LIMIT = 1000
+
 
 class PartialUserSchema(BaseModel):
     name: str = Field(..., min_length=2, max_length=100)
@@ -17,6 +20,18 @@ class FullUserSchema(PartialUserSchema):
         from_attributes = True
 
 
+class UserPage(BaseModel):
+    """One page of users, ordered by ID.
+
+    `next_cursor` is None on the last page, `total` is an estimate of all
+    matching users and only set on request.
+    """
+
+    users: List[FullUserSchema]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+
 class UserUpdateSchema(BaseModel):
     name: Optional[str] = Field(None, min_length=2, max_length=100)
 
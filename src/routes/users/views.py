@@ -1,13 +1,34 @@
 from datetime import datetime
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 import uuid
 import structlog
 
 from src.database.database import get_db
+from src.routes.devices.exceptions import (
+    InvalidCursorException,
+    NotAcceptableException,
+)
+from src.routes.devices.export import (
+    EXPORT_MEDIA_TYPES,
+    export_measurements,
+    negotiate_export_format,
+)
+from src.routes.devices.schemas import ExportFormat, StatsAccuracy
 from src.routes.users.dao import dao
 from src.routes.users.schemas import (
+    USERS_PAGE_DEFAULT_LIMIT,
+    USERS_PAGE_MAX_LIMIT,
     FullUserSchema,
     UserAggregatedStatsResponse,
     UserDeviceStatsResponse,
@@ -70,14 +91,99 @@ async def get_user(
 
 
 @router.get("/api/v1/users/", response_model=List[FullUserSchema])
-async def get_all_users(session: AsyncSession = Depends(get_db)):
-    """Get list of all users."""
+async def get_all_users(
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_db),
+    limit: int = Query(USERS_PAGE_DEFAULT_LIMIT, ge=1, le=USERS_PAGE_MAX_LIMIT),
+    cursor: Optional[str] = Query(
+        None, description="Value of X-Next-Cursor returned with the previous page"
+    ),
+    total: bool = Query(False, description="Return an estimated number of users"),
+):
+    """Get a page of users.
+
+    If there are more, the cursor of the next page is returned in the
+    `X-Next-Cursor` header and the URL of the next page in the `Link` header.
+    With `total` the estimated number of users is returned in the
+    `X-Total-Count` header.
+    """
     logger.info("get_all_users: started")
 
-    users = await dao.get_all_users(session=session)
+    try:
+        page = await dao.get_all_users(
+            session=session, limit=limit, cursor=cursor, with_total=total
+        )
+    except InvalidCursorException as e:
+        logger.warning("get_all_users: Invalid cursor", cursor=cursor)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=e.message,
+        )
+
+    if page.next_cursor:
+        next_url = request.url.include_query_params(cursor=page.next_cursor)
+        response.headers["X-Next-Cursor"] = page.next_cursor
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    if page.total is not None:
+        response.headers["X-Total-Count"] = str(page.total)
+
+    logger.info("get_all_users: completed", user_count=len(page.users))
+    return page.users
+
+
+@router.get(
+    "/api/v1/users/{user_id}/measurements/export/",
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {media_type: {} for media_type in EXPORT_MEDIA_TYPES.values()}}
+    },
+)
+async def export_user_measurements(
+    user_id: uuid.UUID,
+    request: Request,
+    session: AsyncSession = Depends(get_db),
+    start_date: Optional[datetime] = Query(None),
+    end_date: Optional[datetime] = Query(None),
+    export_format: Optional[ExportFormat] = Query(
+        None, alias="format", description="Overrides the Accept header"
+    ),
+):
+    """Stream measurements of all user's devices (grouped by device, oldest first)"""
+    logger.info("export_user_measurements: started", user_id=user_id)
+
+    try:
+        export_format = negotiate_export_format(
+            export_format, request.headers.get("accept")
+        )
+    except NotAcceptableException as e:
+        logger.warning("export_user_measurements: Not acceptable")
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail=e.message,
+        )
+
+    if not await dao.user_exists(session, user_id):
+        logger.warning("export_user_measurements: User not found", user_id=user_id)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=UserNotFoundException().message,
+        )
+
+    def row_batches(export_session: AsyncSession, batch_size: int):
+        return dao.iter_user_measurement_rows(
+            export_session, user_id, start_date, end_date, batch_size
+        )
 
-    logger.info("get_all_users: completed", user_count=len(users))
-    return users
+    return StreamingResponse(
+        export_measurements(request, row_batches, export_format, user_id=user_id),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="{user_id}.{export_format.value}"'
+            )
+        },
+    )
 
 
 @router.get(
@@ -89,6 +195,10 @@ async def get_user_aggregated_stats(
     session: AsyncSession = Depends(get_db),
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
+    use_rollups: bool = Query(
+        False, description="Answer from pre-aggregated rollups (no median)"
+    ),
+    accuracy: StatsAccuracy = Query(StatsAccuracy.EXACT),
 ):
     """Get aggregated statistics for all user's devices"""
     logger.info(
@@ -104,6 +214,8 @@ async def get_user_aggregated_stats(
             user_id=user_id,
             start_date=start_date,
             end_date=end_date,
+            use_rollups=use_rollups,
+            accuracy=accuracy,
         )
     except UserNotFoundException as e:
         logger.warning("get_user_aggregated_stats: User not found", user_id=user_id)
@@ -125,6 +237,10 @@ async def get_user_devices_stats(
     session: AsyncSession = Depends(get_db),
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
+    use_rollups: bool = Query(
+        False, description="Answer from pre-aggregated rollups (no median)"
+    ),
+    accuracy: StatsAccuracy = Query(StatsAccuracy.EXACT),
 ):
     """Get statistics for each user's device separately"""
     logger.info(
@@ -140,6 +256,8 @@ async def get_user_devices_stats(
             user_id=user_id,
             start_date=start_date,
             end_date=end_date,
+            use_rollups=use_rollups,
+            accuracy=accuracy,
         )
     except UserNotFoundException as e:
         logger.warning("get_user_devices_stats: User not found", user_id=user_id)
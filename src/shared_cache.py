@@ -0,0 +1,260 @@
+"""Cache shared by all worker processes of a host, in a memory-mapped file.
+
+Hypercorn runs several worker processes; in-process caches (src/cache.py)
+are warmed and held once per worker. This tier lives in one file under
+`shared_cache_path` (tmpfs, e.g. /dev/shm) that every worker maps, so an
+entry computed by one worker is a hit in all of them.
+
+Layout: a header, `shared_cache_counters` generation counters and
+`shared_cache_slots` fixed-size slots. A key is hashed (BLAKE2b) to one slot
+(direct mapped: a colliding key simply replaces the entry) and the slot
+keeps the full digest to tell keys apart.
+
+Reads take no lock: every slot starts with a sequence number (seqlock) that
+a writer makes odd before and even after changing the slot. A reader copies
+the slot and accepts the copy only if the sequence number was even and did
+not change meanwhile. Writers of a slot and of a counter exclude each other
+with `fcntl` byte-range locks.
+
+Invalidation uses generation counters instead of finding and deleting
+entries: an entry may be tied to a counter (e.g. one per device, see
+`generation_key`) and stores its value at write time, `bump` makes all such
+entries stale at once. `invalidate_all` bumps the global generation in the
+header. Keys share counters (hashed), which only costs extra misses.
+
+Values are bytes; entries larger than a slot are not cached. Expiry uses
+the system-wide monotonic clock.
+"""
+
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import time
+from typing import Dict, Optional
+
+from src.settings import settings
+
+_MAGIC = b"GZCACHE1"
+# magic, global generation, slots, slot size, counters
+_HEADER = struct.Struct("<8sQIII")
+_HEADER_SIZE = 64
+_COUNTER = struct.Struct("<Q")
+# sequence, key digest, expires at, global generation, counter index,
+# counter generation, value length
+_SLOT = struct.Struct("<Q16sdQIQI")
+_NO_COUNTER = 0xFFFFFFFF
+_READ_ATTEMPTS = 4
+
+
+def _digest(value: str) -> bytes:
+    return hashlib.blake2b(value.encode(), digest_size=16).digest()
+
+
+class SharedCache:
+    def __init__(self, path: str, slots: int, slot_size: int, counters: int) -> None:
+        if slot_size <= _SLOT.size:
+            raise ValueError("shared cache slot size is too small")
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        self.counters = counters
+        self._counters_offset = _HEADER_SIZE
+        self._slots_offset = _HEADER_SIZE + counters * _COUNTER.size
+        size = self._slots_offset + slots * slot_size
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        # The first worker (or one started with another layout) initializes
+        # the file, the others wait on the lock and map it as is.
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, _HEADER_SIZE, 0)
+        try:
+            header = os.pread(self._fd, _HEADER.size, 0)
+            layout = (slots, slot_size, counters)
+            if len(header) < _HEADER.size or (
+                _HEADER.unpack(header)[0] != _MAGIC
+                or _HEADER.unpack(header)[2:] != layout
+            ):
+                self._initialize(size, bool(header))
+                os.pwrite(self._fd, _HEADER.pack(_MAGIC, 0, *layout), 0)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, _HEADER_SIZE, 0)
+        self._map = mmap.mmap(self._fd, size)
+
+        self.hits = 0
+        self.misses = 0
+        self.retries = 0
+        self.writes = 0
+
+    def _initialize(self, size: int, reused: bool) -> None:
+        # Never shrink: workers still running with another layout keep a
+        # valid (if useless) mapping instead of crashing on a truncated file.
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        if reused:
+            chunk = bytes(1 << 20)
+            for offset in range(0, size, len(chunk)):
+                os.pwrite(self._fd, chunk[:size - offset], offset)
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+    def global_generation(self) -> int:
+        """Current value of the generation bumped by `invalidate_all`."""
+        return _HEADER.unpack_from(self._map)[1]
+
+    def _counter_offset(self, index: int) -> int:
+        return self._counters_offset + index * _COUNTER.size
+
+    def _counter_index(self, generation_key: str) -> int:
+        return int.from_bytes(_digest(generation_key)[:4], "little") % self.counters
+
+    def generation(self, generation_key: str) -> int:
+        """Current value of the counter of `generation_key`."""
+        offset = self._counter_offset(self._counter_index(generation_key))
+        return _COUNTER.unpack_from(self._map, offset)[0]
+
+    def _increment(self, offset: int, size: int, value_offset: int) -> None:
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, size, offset)
+        try:
+            (value,) = _COUNTER.unpack_from(self._map, value_offset)
+            _COUNTER.pack_into(self._map, value_offset, value + 1)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, size, offset)
+
+    def bump(self, generation_key: str) -> None:
+        """Makes every entry tied to `generation_key` stale."""
+        offset = self._counter_offset(self._counter_index(generation_key))
+        self._increment(offset, _COUNTER.size, offset)
+
+    def invalidate_all(self) -> None:
+        # The global generation follows the 8 byte magic in the header
+        self._increment(0, _HEADER_SIZE, len(_MAGIC))
+
+    def _slot_offset(self, digest: bytes) -> int:
+        index = int.from_bytes(digest[4:12], "little") % self.slots
+        return self._slots_offset + index * self.slot_size
+
+    def get(self, key: str) -> Optional[bytes]:
+        digest = _digest(key)
+        offset = self._slot_offset(digest)
+        for _ in range(_READ_ATTEMPTS):
+            sequence = _SLOT.unpack_from(self._map, offset)[0]
+            if sequence & 1:
+                self.retries += 1
+                continue
+            slot = self._map[offset:offset + self.slot_size]
+            if _SLOT.unpack_from(self._map, offset)[0] != sequence:
+                self.retries += 1
+                continue
+
+            (
+                _,
+                slot_digest,
+                expires_at,
+                global_generation,
+                counter,
+                counter_generation,
+                length,
+            ) = _SLOT.unpack_from(slot)
+            if (
+                slot_digest != digest
+                or expires_at <= time.monotonic()
+                or global_generation != self.global_generation()
+                or (
+                    counter != _NO_COUNTER
+                    and counter_generation
+                    != _COUNTER.unpack_from(self._map, self._counter_offset(counter))[0]
+                )
+            ):
+                break
+            self.hits += 1
+            return slot[_SLOT.size:_SLOT.size + length]
+
+        self.misses += 1
+        return None
+
+    def set(
+        self,
+        key: str,
+        value: bytes,
+        ttl: float,
+        generation_key: Optional[str] = None,
+        generation: Optional[int] = None,
+    ) -> bool:
+        """Stores an entry, returns False if it does not fit into a slot.
+
+        Args:
+            key (str): Entry key
+            value (bytes): Entry value
+            ttl (float): Seconds until the entry expires
+            generation_key (Optional[str]): Tie the entry to this counter
+            generation (Optional[int]): Counter value read *before* the value
+                was computed, so a bump in between leaves the entry stale;
+                the current value if omitted
+        """
+        if len(value) > self.slot_size - _SLOT.size:
+            return False
+
+        counter = _NO_COUNTER
+        if generation_key is not None:
+            counter = self._counter_index(generation_key)
+            if generation is None:
+                generation = self.generation(generation_key)
+        digest = _digest(key)
+        offset = self._slot_offset(digest)
+
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, self.slot_size, offset)
+        try:
+            (sequence,) = _COUNTER.unpack_from(self._map, offset)
+            _COUNTER.pack_into(self._map, offset, sequence + 1)
+            self._map[offset + _SLOT.size:offset + _SLOT.size + len(value)] = value
+            _SLOT.pack_into(
+                self._map,
+                offset,
+                sequence + 1,
+                digest,
+                time.monotonic() + ttl,
+                self.global_generation(),
+                counter,
+                generation or 0,
+                len(value),
+            )
+            _COUNTER.pack_into(self._map, offset, sequence + 2)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, self.slot_size, offset)
+        self.writes += 1
+        return True
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "slots": self.slots,
+            "slot_size": self.slot_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "retries": self.retries,
+            "writes": self.writes,
+            "generation": self.global_generation(),
+        }
+
+
+_shared_cache: Optional[SharedCache] = None
+
+
+def get_shared_cache() -> Optional[SharedCache]:
+    """The shared cache of this process, None unless `shared_cache_enabled`.
+
+    Mapped on first use, so only processes that use it create the file.
+    """
+    global _shared_cache
+    if _shared_cache is None and settings.shared_cache_enabled:
+        _shared_cache = SharedCache(
+            settings.shared_cache_path,
+            settings.shared_cache_slots,
+            settings.shared_cache_slot_size,
+            settings.shared_cache_counters,
+        )
+    return _shared_cache
@@ -0,0 +1,208 @@
+"""Vectorised statistics over measurement columns.
+
+Measurements are held as one float64 array shaped (axes, samples), filled
+straight from (x, y, z) result rows, so every statistic is computed for all
+axes at once. Medians come from a single `np.partition` (O(n) selection)
+instead of a full sort.
+"""
+
+from typing import Any, Dict, Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from src.database.aggregates import AXES
+
+# float64 array shaped (len(AXES), samples)
+Columns = NDArray[np.float64]
+
+
+def to_columns(rows: Sequence[Sequence[Any]], start: int = 0) -> Columns:
+    """Transposes result rows into an (axes, samples) array.
+
+    Args:
+        rows: Result rows holding the x, y and z values
+        start (int): Position of the x value in a row, e.g. 1 for
+            (device_id, x, y, z) rows
+    """
+    if not rows:
+        return np.empty((len(AXES), 0))
+    columns = list(zip(*rows))[start:start + len(AXES)]
+    return np.array(columns, dtype=np.float64)
+
+
+def describe(
+    values: Columns,
+    extended: bool = False,
+    percentiles: Optional[Dict[str, float]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """Min, max, count, sum and median of every axis.
+
+    One partition places the minimum, the middle element(s) and the maximum
+    of every axis, the median matches `percentile_cont(0.5)`.
+
+    Args:
+        values (Columns): Measurement values, see `to_columns`
+        extended (bool): Also report `mean` and (population) `std`
+        percentiles (Optional[Dict[str, float]]): Named quantiles to report
+            under `percentiles`, e.g. {"p90": 0.9}
+
+    Returns:
+        Dict mapping axis name to its statistics, zeros for no samples.
+    """
+    count = values.shape[1]
+    axes_count = values.shape[0]
+
+    if count:
+        upper = count // 2
+        lower = upper if count % 2 else upper - 1
+        partitioned = np.partition(
+            values, sorted({0, lower, upper, count - 1}), axis=1
+        )
+        mins = partitioned[:, 0]
+        maxs = partitioned[:, -1]
+        medians = (partitioned[:, lower] + partitioned[:, upper]) / 2
+        sums = values.sum(axis=1)
+    else:
+        mins = maxs = medians = sums = np.zeros(axes_count)
+
+    result: Dict[str, Dict[str, Any]] = {}
+    for i, axis in enumerate(AXES[:axes_count]):
+        result[axis] = {
+            "min": float(mins[i]),
+            "max": float(maxs[i]),
+            "count": count,
+            "sum": float(sums[i]),
+            "median": float(medians[i]),
+        }
+
+    if extended:
+        means = sums / count if count else np.zeros(axes_count)
+        stds = values.std(axis=1) if count else np.zeros(axes_count)
+        for i, axis in enumerate(AXES[:axes_count]):
+            result[axis]["mean"] = float(means[i])
+            result[axis]["std"] = float(stds[i])
+
+    if percentiles:
+        quantiles = (
+            np.quantile(values, list(percentiles.values()), axis=1)
+            if count
+            else np.zeros((len(percentiles), axes_count))
+        )
+        for i, axis in enumerate(AXES[:axes_count]):
+            result[axis]["percentiles"] = {
+                name: float(quantiles[j, i]) for j, name in enumerate(percentiles)
+            }
+
+    return result
+
+
+def describe_groups(
+    keys: Sequence[Hashable],
+    values: Columns,
+    extended: bool = False,
+    percentiles: Optional[Dict[str, float]] = None,
+) -> Dict[Any, Dict[str, Dict[str, Any]]]:
+    """Same as `describe`, separately for every group of samples.
+
+    Args:
+        keys: Group key (e.g. device id) of every sample
+        values (Columns): Measurement values, one column per key
+    """
+    if not len(keys):
+        return {}
+
+    groups, inverse = np.unique(np.array(keys, dtype=object), return_inverse=True)
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.cumsum(np.bincount(inverse))[:-1]
+    return {
+        group: describe(group_values, extended, percentiles)
+        for group, group_values in zip(
+            groups, np.split(values[:, order], bounds, axis=1)
+        )
+    }
+
+
+def aggregate_groups(
+    keys: NDArray[np.int64],
+    values: Columns,
+) -> Tuple[NDArray[np.int64], NDArray[np.int64], Columns, Columns, Columns]:
+    """Count, sum, min and max of every axis per group of integer keys.
+
+    Args:
+        keys (NDArray): Group key (e.g. time bucket) of every sample
+        values (Columns): Sample values, one column per key
+
+    Returns:
+        Ascending distinct keys, their sample counts and the (axes, groups)
+        sums, minimums and maximums.
+    """
+    if not len(keys):
+        no_keys = np.empty(0, dtype=np.int64)
+        empty = np.empty((values.shape[0], 0))
+        return no_keys, no_keys, empty, empty, empty
+
+    order = np.argsort(keys, kind="stable")
+    keys, values = keys[order], values[:, order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    counts = np.diff(np.r_[starts, len(keys)])
+    return (
+        keys[starts],
+        counts,
+        np.add.reduceat(values, starts, axis=1),
+        np.minimum.reduceat(values, starts, axis=1),
+        np.maximum.reduceat(values, starts, axis=1),
+    )
+
+
+def lttb(times: NDArray[np.float64], values: Columns, threshold: int) -> NDArray:
+    """Largest-Triangle-Three-Buckets downsampling of a multi-axis series.
+
+    Keeps the first and the last point and from every bucket in between the
+    point spanning the largest triangle with the point kept from the
+    previous bucket and the average of the next bucket. Areas of all axes
+    are summed, so one point (with one timestamp) is kept for all axes.
+
+    Args:
+        times (NDArray): Ascending sample times, e.g. seconds
+        values (Columns): Sample values, one column per time
+        threshold (int): Number of points to keep, at least 3
+
+    Returns:
+        NDArray: Ascending indices of the kept points
+    """
+    count = len(times)
+    if threshold >= count:
+        return np.arange(count)
+    if threshold < 3:
+        raise ValueError("threshold must be at least 3")
+
+    # threshold - 2 buckets over the points between the first and the last
+    bounds = np.linspace(1, count - 1, threshold - 1).astype(np.int64)
+    sizes = np.diff(bounds)
+    averages = np.hstack(
+        [
+            np.add.reduceat(values[:, :-1], bounds[:-1], axis=1) / sizes,
+            values[:, -1:],
+        ]
+    )
+    time_averages = np.append(
+        np.add.reduceat(times[:-1], bounds[:-1]) / sizes, times[-1]
+    )
+
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, count - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = bounds[bucket], bounds[bucket + 1]
+        anchor = values[:, previous:previous + 1]
+        time_span = time_averages[bucket + 1] - times[previous]
+        value_span = averages[:, bucket + 1:bucket + 2] - anchor
+        # Doubled triangle areas of the bucket's points, summed over the axes
+        areas = np.abs(
+            time_span * (values[:, start:end] - anchor)
+            - (times[start:end] - times[previous]) * value_span
+        ).sum(axis=0)
+        previous = start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    return kept
@@ -0,0 +1,217 @@
+"""Cache of stats results with ingest-aware invalidation and request coalescing.
+
+Stats endpoints (`/api/v1/devices/{id}/stats/`, `/api/v1/users/{id}/stats/...`)
+aggregate every measurement of a window on each request. Results are cached
+by endpoint, entity and window:
+
+- A window is closed when it ended more than `stats_cache_closed_after`
+  seconds ago. Measurements arrive with timestamps close to the server time,
+  so its result is practically immutable and cached for
+  `stats_cache_closed_ttl` seconds.
+- Other windows (no end, or ending about now) are cached for
+  `stats_cache_open_ttl` seconds and invalidated by every committed
+  measurement write of their devices.
+
+Invalidation uses per-device versions that are part of the cache key: a
+committed write bumps the device's live version, and also its history
+version if one of its timestamps is older than `stats_cache_closed_after`
+(a late write that changes closed windows). Open windows are keyed by live
+versions, closed windows by history versions; entries of old versions are
+never read again and age out of the LRU. Versions are read *before* the
+result is computed, so a write that commits meanwhile leaves the new entry
+stale instead of hiding itself.
+
+With the shared cache enabled (src/shared_cache.py) versions are its
+generation counters and results are stored there too, so all workers of a
+host share them and see each other's writes; otherwise versions are
+counters of this process.
+
+Identical concurrent requests are coalesced (single-flight): the first one
+computes the result, the others await it instead of running the same
+aggregation.
+"""
+
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta
+import hashlib
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Type,
+    TypeVar,
+    cast,
+)
+import uuid
+
+from pydantic import BaseModel
+
+from src.cache import TTLCache
+from src.settings import settings
+from src.shared_cache import get_shared_cache
+from src.utils import to_naive_local_time
+
+M = TypeVar("M", bound=BaseModel)
+
+
+def _live_key(device_id: uuid.UUID) -> str:
+    return f"device:{device_id}"
+
+
+def _history_key(device_id: uuid.UUID) -> str:
+    return f"device-history:{device_id}"
+
+
+class StatsResultCache:
+    def __init__(self, max_size: int, closed_after: float) -> None:
+        self.closed_after = timedelta(seconds=closed_after)
+        self._results: TTLCache[BaseModel] = TTLCache(
+            "stats", max_size, settings.stats_cache_open_ttl
+        )
+        self._in_flight: Dict[str, "asyncio.Future[BaseModel]"] = {}
+        self._live: Dict[uuid.UUID, int] = defaultdict(int)
+        self._history: Dict[uuid.UUID, int] = defaultdict(int)
+        self._epoch = 0
+        self.computations = 0
+        self.coalesced = 0
+        self.shared_hits = 0
+
+    def is_closed(self, end_date: Optional[datetime]) -> bool:
+        """Whether no (timely) measurement can fall into a window ending then."""
+        if end_date is None:
+            return False
+        return to_naive_local_time(end_date) <= datetime.now() - self.closed_after
+
+    def _versions(self, device_ids: Iterable[uuid.UUID], closed: bool) -> List[int]:
+        shared_cache = get_shared_cache()
+        if shared_cache is not None:
+            version_key = _history_key if closed else _live_key
+            return [
+                shared_cache.global_generation(),
+                *(shared_cache.generation(version_key(id_)) for id_ in device_ids),
+            ]
+        versions = self._history if closed else self._live
+        return [self._epoch, *(versions[device_id] for device_id in device_ids)]
+
+    def _key(self, key: str, device_ids: List[uuid.UUID], closed: bool) -> str:
+        versions = self._versions(device_ids, closed)
+        digest = hashlib.blake2b(digest_size=16)
+        for device_id, version in zip([None, *device_ids], versions):
+            digest.update(f"{device_id}={version};".encode())
+        return f"stats:{key}:{digest.hexdigest()}"
+
+    def measurements_changed(self, changes: Mapping[uuid.UUID, datetime]) -> None:
+        """Bumps versions after a commit; `changes` maps device IDs to the
+        earliest timestamp written.
+        """
+        shared_cache = get_shared_cache()
+        closed_before = datetime.now() - self.closed_after
+        for device_id, earliest in changes.items():
+            late = earliest <= closed_before
+            if shared_cache is not None:
+                shared_cache.bump(_live_key(device_id))
+                if late:
+                    shared_cache.bump(_history_key(device_id))
+            self._live[device_id] += 1
+            if late:
+                self._history[device_id] += 1
+
+    def invalidate_all(self) -> None:
+        """Drops every result, e.g. after measurements were deleted."""
+        self._epoch += 1
+        self._results.clear()
+        shared_cache = get_shared_cache()
+        if shared_cache is not None:
+            shared_cache.invalidate_all()
+
+    async def get_or_compute(
+        self,
+        key: str,
+        device_ids: List[uuid.UUID],
+        end_date: Optional[datetime],
+        model: Type[M],
+        compute: Callable[[], Awaitable[M]],
+    ) -> M:
+        """Cached result of `compute`, computed once for concurrent requests.
+
+        Args:
+            key (str): Endpoint, entity and window (and any other parameter
+                the result depends on)
+            device_ids (List[uuid.UUID]): Devices whose measurements the
+                result is computed from
+            end_date (Optional[datetime]): End of the window
+            model (Type[M]): Result type, to decode shared cache entries
+            compute (Callable[[], Awaitable[M]]): Computes the result;
+                exceptions propagate to all coalesced requests and are not
+                cached
+        """
+        closed = self.is_closed(end_date)
+        ttl = (
+            settings.stats_cache_closed_ttl if closed else settings.stats_cache_open_ttl
+        )
+        key = self._key(key, device_ids, closed)
+        shared_cache = get_shared_cache()
+
+        while True:
+            result = self._results.get(key)
+            if result is not None:
+                return cast(M, result)
+            if shared_cache is not None:
+                data = shared_cache.get(key)
+                if data is not None:
+                    result = model.model_validate_json(data)
+                    self._results.set(key, result, ttl)
+                    self.shared_hits += 1
+                    return result
+
+            future = self._in_flight.get(key)
+            if future is None:
+                break
+            self.coalesced += 1
+            try:
+                return cast(M, await asyncio.shield(future))
+            except asyncio.CancelledError:
+                # The computing request was cancelled (client went away):
+                # look again and compute it here.
+                if not future.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        self.computations += 1
+        try:
+            computed = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Mark it retrieved: there may be no request waiting for it
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+        future.set_result(computed)
+
+        self._results.set(key, computed, ttl)
+        if shared_cache is not None:
+            shared_cache.set(key, computed.model_dump_json().encode(), ttl)
+        return computed
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "computations": self.computations,
+            "coalesced": self.coalesced,
+            "shared_hits": self.shared_hits,
+            "in_flight": len(self._in_flight),
+        }
+
+
+stats_cache = StatsResultCache(
+    settings.stats_cache_max_size, settings.stats_cache_closed_after
+)
@@ -1,3 +1,12 @@
+import base64
+import binascii
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Any, List
+
 import tomli
 
 
@@ -9,3 +18,55 @@ def get_service_name():
         print(e)
         name = "test-name"
     return name
+
+
+def to_naive_local_time(value: datetime) -> datetime:
+    """Converts an aware datetime to naive local time, as measurements are stored.
+
+    Naive datetimes are returned unchanged.
+    """
+    if value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
+
+
+def encode_cursor(*values: Any) -> str:
+    """Packs the sort key of the last returned row into an opaque page cursor.
+
+    Values are JSON encoded (datetimes and UUIDs as strings) and base64url
+    encoded without padding.
+    """
+    payload = json.dumps(values, default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Unpacks a cursor made by `encode_cursor` into its `size` raw values.
+
+    Raises:
+        ValueError: The cursor is malformed
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(payload)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("malformed cursor")
+
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("malformed cursor")
+    return values
+
+
+def uuid7() -> uuid.UUID:
+    """Time-ordered UUID version 7 (RFC 9562).
+
+    The first 48 bits hold the Unix time in milliseconds and the rest is
+    random, so new ids land at the right edge of a B-tree index instead of
+    random pages.
+    """
+    milliseconds = time.time_ns() // 1_000_000
+    value = (milliseconds & ((1 << 48) - 1)) << 80
+    value |= int.from_bytes(os.urandom(10), "big")
+    value = (value & ~(0xF << 76)) | (0x7 << 76)  # version
+    value = (value & ~(0x3 << 62)) | (0x2 << 62)  # variant
+    return uuid.UUID(int=value)
@@ -0,0 +1,74 @@
+from datetime import datetime
+import uuid
+
+import pytest
+
+from src.routes.devices.dao import DevicePostgreDAO
+from src.routes.devices.exceptions import InvalidCursorException
+from src.routes.users.dao import UserPostgreDAO
+from src.utils import decode_cursor, encode_cursor, uuid7
+
+
+def test_cursor_round_trip():
+    timestamp = datetime(2025, 2, 10, 12, 30, 15, 250000)
+    measurement_id = uuid7()
+    cursor = encode_cursor(timestamp, measurement_id)
+    assert "=" not in cursor
+    assert decode_cursor(cursor, 2) == [str(timestamp), str(measurement_id)]
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    ["", "!!!", encode_cursor("a", "b")[:-3], "bm90IGpzb24", encode_cursor(1, 2, 3)],
+)
+def test_decode_cursor_rejects_malformed_cursors(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, 2)
+
+
+def test_decode_cursor_rejects_non_list_payload():
+    # base64url of '{"a":1}'
+    with pytest.raises(ValueError):
+        decode_cursor("eyJhIjoxfQ", 1)
+
+
+def test_measurement_cursor():
+    dao = DevicePostgreDAO()
+    timestamp = datetime(2025, 2, 10, 12, 30, 15, 250000)
+    measurement_id = uuid7()
+    assert dao._decode_measurement_cursor(
+        encode_cursor(timestamp, measurement_id)
+    ) == (timestamp, measurement_id)
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "!!!",
+        encode_cursor(datetime(2025, 2, 10)),
+        encode_cursor(1, str(uuid.uuid4())),
+        encode_cursor(str(datetime(2025, 2, 10)), None),
+        encode_cursor("yesterday", str(uuid.uuid4())),
+        encode_cursor(datetime(2025, 2, 10), "not-a-uuid"),
+    ],
+)
+def test_measurement_cursor_rejects_invalid_cursors(cursor):
+    with pytest.raises(InvalidCursorException):
+        DevicePostgreDAO()._decode_measurement_cursor(cursor)
+
+
+def test_device_cursor():
+    dao = DevicePostgreDAO()
+    assert dao._decode_device_cursor(encode_cursor("SN-0001")) == "SN-0001"
+    for cursor in ["!!!", encode_cursor(1), encode_cursor("SN-0001", "SN-0002")]:
+        with pytest.raises(InvalidCursorException):
+            dao._decode_device_cursor(cursor)
+
+
+def test_user_cursor():
+    dao = UserPostgreDAO()
+    user_id = uuid.uuid4()
+    assert dao._decode_user_cursor(encode_cursor(user_id)) == user_id
+    for cursor in ["!!!", encode_cursor(1), encode_cursor(None), encode_cursor("a")]:
+        with pytest.raises(InvalidCursorException):
+            dao._decode_user_cursor(cursor)
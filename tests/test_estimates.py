@@ -0,0 +1,64 @@
+import asyncio
+from typing import Any, List, Tuple
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql.asyncpg import PGDialect_asyncpg
+
+from src.database.estimates import estimated_count
+from src.database.models import Device
+
+
+class Result:
+    def __init__(self, plan: Any) -> None:
+        self.plan = plan
+
+    def scalar_one(self) -> Any:
+        return self.plan
+
+
+class Connection:
+    def __init__(self, plan: Any) -> None:
+        self.plan = plan
+        self.calls: List[Tuple[str, Any]] = []
+
+    async def exec_driver_sql(self, statement: str, parameters: Any) -> Result:
+        self.calls.append((statement, parameters))
+        return Result(self.plan)
+
+
+class Bind:
+    dialect = PGDialect_asyncpg()
+
+
+class Session:
+    def __init__(self, plan: Any) -> None:
+        self.connection_ = Connection(plan)
+
+    def get_bind(self) -> Bind:
+        return Bind()
+
+    async def connection(self) -> Connection:
+        return self.connection_
+
+
+def devices(prefix: str) -> Any:
+    return select(Device.id, Device.serial_number).where(
+        Device.serial_number.startswith(prefix, autoescape=True)
+    )
+
+
+@pytest.mark.parametrize("prefix", [":x", "a:b", "'; select 1; --", "50%_:off"])
+def test_prefixes_are_bound_not_parsed(prefix):
+    session = Session([{"Plan": {"Plan Rows": 7}}])
+    assert asyncio.run(estimated_count(session, devices(prefix))) == 7  # type: ignore
+
+    [(statement, parameters)] = session.connection_.calls
+    assert statement.startswith("EXPLAIN (FORMAT JSON) SELECT")
+    assert prefix not in statement
+    assert any(prefix.replace("%", "/%").replace("_", "/_") == p for p in parameters)
+
+
+def test_json_text_plans_are_parsed():
+    session = Session('[{"Plan": {"Plan Rows": 42}}]')
+    assert asyncio.run(estimated_count(session, devices("x"))) == 42  # type: ignore
@@ -0,0 +1,92 @@
+import uuid
+
+import numpy as np
+import pytest
+
+from src.gorilla import (
+    block_count,
+    decode_block_ids,
+    decode_block_timestamps,
+    decode_block_values,
+    decode_ids,
+    decode_timestamps,
+    decode_values,
+    encode_block,
+    encode_ids,
+    encode_timestamps,
+    encode_values,
+)
+from src.utils import uuid7
+
+
+def sample_block(count: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    start = 1_739_224_800_000_000  # 2025-02-10T22:00:00 in microseconds
+    steps = rng.choice([500_000, 500_000, 501_000, 0], size=count)
+    timestamps = start + np.cumsum(steps)
+    values = np.vstack(
+        [
+            np.round(rng.normal(size=count).cumsum(), 3),
+            np.round(rng.uniform(-5, 5, size=count), 2),
+            np.full(count, 9.81),
+        ]
+    )
+    ids = [uuid7() for _ in range(count)]
+    return timestamps, values, ids
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 1000])
+def test_block_round_trip(count):
+    timestamps, values, ids = sample_block(count)
+    data = encode_block(timestamps, values, ids)
+    assert block_count(data) == count
+    assert decode_block_timestamps(data).tolist() == timestamps.tolist()
+    decoded = decode_block_values(data)
+    assert decoded.dtype == np.float64
+    assert decoded.tobytes() == values.tobytes()
+    assert decode_block_ids(data) == ids
+
+
+def test_empty_block():
+    data = encode_block([], np.empty((3, 0)), [])
+    assert block_count(data) == 0
+    assert decode_block_timestamps(data).shape == (0,)
+    assert decode_block_values(data).shape == (3, 0)
+    assert decode_block_ids(data) == []
+
+
+def test_ids_of_any_version_round_trip():
+    ids = [uuid.UUID(int=0), uuid.UUID(int=2**128 - 1), uuid.UUID(int=2**127)]
+    ids += [uuid.uuid4() for _ in range(100)]
+    assert decode_ids(encode_ids(ids), len(ids)) == ids
+
+
+def test_timestamps_with_large_and_negative_deltas():
+    timestamps = [0, 10, 10, 2**40, 2**40 + 1, 2**62]
+    decoded = decode_timestamps(encode_timestamps(timestamps), len(timestamps))
+    assert decoded.tolist() == timestamps
+    negative = [-5, -3, 7]
+    assert decode_timestamps(encode_timestamps(negative), 3).tolist() == negative
+
+
+def test_values_keep_every_bit_pattern():
+    values = np.array([0.0, -0.0, np.inf, -np.inf, np.nan, 5e-324, 1.7e308, 1.5])
+    decoded = decode_values(encode_values(values), len(values))
+    assert decoded.tobytes() == values.tobytes()
+
+
+def test_regular_blocks_compress_well():
+    timestamps = 1_739_224_800_000_000 + np.arange(7200) * 500_000
+    values = np.vstack([np.zeros(7200), np.ones(7200), np.full(7200, 9.81)])
+    ids = [uuid7() for _ in range(7200)]
+    # 48 raw bytes per sample, of which the random half of the id is 8
+    assert len(encode_block(timestamps, values, ids)) < 7200 * 10
+
+
+def test_corrupt_blocks_are_rejected():
+    timestamps, values, ids = sample_block(10)
+    data = encode_block(timestamps, values, ids)
+    with pytest.raises(ValueError):
+        block_count(b"XXXX" + data[4:])
+    with pytest.raises(ValueError):
+        decode_timestamps(encode_timestamps(timestamps), 11)
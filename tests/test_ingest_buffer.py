@@ -0,0 +1,76 @@
+import asyncio
+from typing import List
+import uuid
+
+from src.routes.devices.ingest_buffer import MeasurementIngestBuffer
+from src.routes.devices.schemas import MeasurementCreateSchema, MeasurementRow
+
+DEVICE = uuid.uuid4()
+SAMPLE = MeasurementCreateSchema(x=1.0, y=2.0, z=3.0)
+
+
+def make_buffer(drain_timeout: float = 5.0) -> MeasurementIngestBuffer:
+    return MeasurementIngestBuffer(
+        max_queue_size=100,
+        flush_max_size=10,
+        flush_interval=0.01,
+        drain_timeout=drain_timeout,
+    )
+
+
+def test_stop_writes_queued_samples():
+    buffer = make_buffer()
+    written: List[MeasurementRow] = []
+
+    async def write(rows: List[MeasurementRow]) -> int:
+        written.extend(rows)
+        return len(rows)
+
+    buffer._write = write  # type: ignore
+
+    async def main() -> None:
+        buffer.start()
+        for _ in range(25):
+            buffer.put(DEVICE, SAMPLE)
+        await buffer.stop()
+
+    asyncio.run(main())
+    assert len(written) == 25
+    assert buffer.flushed_total == 25 and buffer.dropped_total == 0
+    assert not buffer.is_running
+
+
+def test_stop_does_not_wait_for_a_dead_flusher():
+    buffer = make_buffer(drain_timeout=60)
+
+    async def main() -> None:
+        buffer.start()
+        assert buffer._task is not None
+        buffer._task.cancel()
+        await asyncio.sleep(0)
+        for _ in range(5):
+            buffer._queue.put_nowait((None,) * 6)  # type: ignore
+            buffer.enqueued_total += 1
+        await asyncio.wait_for(buffer.stop(), 1)
+
+    asyncio.run(main())
+    assert buffer.dropped_total == 5
+
+
+def test_stop_gives_up_on_a_hung_flush():
+    buffer = make_buffer(drain_timeout=0.05)
+
+    async def write(rows: List[MeasurementRow]) -> int:
+        await asyncio.sleep(60)
+        return len(rows)
+
+    buffer._write = write  # type: ignore
+
+    async def main() -> None:
+        buffer.start()
+        for _ in range(15):
+            buffer.put(DEVICE, SAMPLE)
+        await asyncio.wait_for(buffer.stop(), 1)
+
+    asyncio.run(main())
+    assert buffer.flushed_total == 0 and buffer.dropped_total == 15
@@ -0,0 +1,86 @@
+import pytest
+
+from src.shared_cache import SharedCache
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "shared-cache")
+
+
+@pytest.fixture
+def cache(path):
+    cache = SharedCache(path, slots=64, slot_size=256, counters=16)
+    yield cache
+    cache.close()
+
+
+def test_set_and_get(cache):
+    assert cache.get("a") is None
+    assert cache.set("a", b"value", ttl=60)
+    assert cache.get("a") == b"value"
+    assert cache.set("a", b"other", ttl=60)
+    assert cache.get("a") == b"other"
+    assert (cache.hits, cache.misses, cache.writes) == (2, 1, 2)
+
+
+def test_entries_larger_than_a_slot_are_not_cached(cache):
+    assert not cache.set("a", bytes(256), ttl=60)
+    assert cache.get("a") is None
+
+
+def test_expired_entries_are_misses(cache):
+    cache.set("a", b"value", ttl=0)
+    assert cache.get("a") is None
+
+
+def test_colliding_keys_replace_each_other(path):
+    cache = SharedCache(path, slots=1, slot_size=256, counters=1)
+    cache.set("a", b"1", ttl=60)
+    cache.set("b", b"2", ttl=60)
+    assert cache.get("a") is None
+    assert cache.get("b") == b"2"
+    cache.close()
+
+
+def test_bump_makes_tied_entries_stale(cache):
+    cache.set("a", b"1", ttl=60, generation_key="device:1")
+    cache.set("b", b"2", ttl=60)
+    cache.bump("device:1")
+    assert cache.get("a") is None
+    assert cache.get("b") == b"2"
+
+
+def test_bump_while_computing_leaves_the_entry_stale(cache):
+    generation = cache.generation("device:1")
+    cache.bump("device:1")
+    cache.set("a", b"1", ttl=60, generation_key="device:1", generation=generation)
+    assert cache.get("a") is None
+
+
+def test_invalidate_all(cache):
+    cache.set("a", b"1", ttl=60)
+    cache.invalidate_all()
+    assert cache.global_generation() == 1
+    assert cache.get("a") is None
+
+
+def test_workers_share_entries_and_generations(path, cache):
+    other = SharedCache(path, slots=64, slot_size=256, counters=16)
+    cache.set("a", b"1", ttl=60, generation_key="device:1")
+    assert other.get("a") == b"1"
+    other.bump("device:1")
+    assert cache.get("a") is None
+    other.close()
+
+
+def test_another_layout_reinitializes_the_file(path, cache):
+    cache.set("a", b"1", ttl=60)
+    other = SharedCache(path, slots=32, slot_size=256, counters=16)
+    assert other.get("a") is None
+    other.close()
+
+
+def test_slot_size_must_fit_the_slot_header(path):
+    with pytest.raises(ValueError):
+        SharedCache(path, slots=1, slot_size=8, counters=1)
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from src.database.sketches import (
+    APPROX_PERCENTILES,
+    SketchBins,
+    SketchMapping,
+    get_quantiles,
+    merge_bins,
+    sketch_mapping,
+    with_quantiles,
+)
+
+# Rounding of the float log may cost a little beyond the accuracy bound
+TOLERANCE = 1e-9
+
+
+def sketch(values: np.ndarray) -> SketchBins:
+    keys, counts = np.unique(sketch_mapping.keys(values), return_counts=True)
+    return dict(zip(keys.tolist(), counts.tolist()))
+
+
+def sample_values(seed: int, count: int = 20000) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    magnitudes = rng.lognormal(mean=0.0, sigma=3.0, size=count)
+    return magnitudes * rng.choice([-1.0, 1.0], size=count)
+
+
+def test_mapping_relative_error():
+    accuracy = sketch_mapping.relative_accuracy
+    values = sample_values(1)
+    for value in values[:2000].tolist():
+        estimate = sketch_mapping.value(sketch_mapping.key(value))
+        assert abs(estimate - value) <= (accuracy + TOLERANCE) * abs(value)
+
+
+def test_mapping_keys_keep_order_and_zero():
+    values = np.sort(np.concatenate([sample_values(2), [0.0, 1e-12, -1e-12]]))
+    keys = sketch_mapping.keys(values)
+    assert np.all(np.diff(keys) >= 0)
+    assert sketch_mapping.key(0.0) == sketch_mapping.key(1e-12) == 0
+    assert sketch_mapping.value(0) == 0.0
+
+
+def test_vectorised_keys_match_scalar_keys():
+    mapping = SketchMapping(0.02)
+    values = np.concatenate([sample_values(3, 5000), [0.0, 1.0, -1.0, 1e-10]])
+    assert mapping.keys(values).tolist() == [mapping.key(v) for v in values.tolist()]
+
+
+@pytest.mark.parametrize("seed", [4, 5, 6])
+def test_quantiles_within_relative_accuracy(seed):
+    accuracy = sketch_mapping.relative_accuracy
+    values = sample_values(seed)
+    ordered = np.sort(values)
+    estimates = get_quantiles(sketch(values))
+    for name, quantile in APPROX_PERCENTILES.items():
+        exact = ordered[int(quantile * (len(values) - 1))]
+        assert abs(estimates[name] - exact) <= (accuracy + TOLERANCE) * abs(exact)
+
+
+def test_merged_sketches_equal_sketch_of_all_values():
+    first, second = sample_values(7, 3000), sample_values(8, 5000)
+    merged = merge_bins([sketch(first), sketch(second)])
+    assert merged == sketch(np.concatenate([first, second]))
+    assert get_quantiles(merged) == get_quantiles(
+        sketch(np.concatenate([first, second]))
+    )
+
+
+def test_quantiles_of_empty_sketch():
+    assert get_quantiles({}) == {name: 0.0 for name in APPROX_PERCENTILES}
+
+
+def test_with_quantiles_clamps_into_exact_range():
+    values = np.array([10.0, 10.0, 10.0])
+    stats = {"min": 10.0, "max": 10.0, "count": 3, "sum": 30.0}
+    result = with_quantiles(stats, sketch(values))
+    assert result["median"] == 10.0
+    assert result["percentiles"] == {name: 10.0 for name in APPROX_PERCENTILES}
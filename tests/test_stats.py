@@ -0,0 +1,135 @@
+import numpy as np
+import pytest
+
+from src.stats import aggregate_groups, describe, describe_groups, lttb, to_columns
+
+
+def random_columns(seed: int, count: int) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=(3, count))
+
+
+def test_to_columns():
+    rows = [("a", 1.0, 2.0, 3.0), ("b", 4.0, 5.0, 6.0)]
+    assert to_columns(rows, start=1).tolist() == [[1.0, 4.0], [2.0, 5.0], [3.0, 6.0]]
+    assert to_columns([]).shape == (3, 0)
+
+
+@pytest.mark.parametrize("count", [1, 2, 7, 1000, 1001])
+def test_describe_matches_numpy(count):
+    values = random_columns(count, count)
+    result = describe(values, extended=True, percentiles={"p90": 0.9})
+    for i, axis in enumerate("xyz"):
+        stats = result[axis]
+        assert stats["count"] == count
+        assert stats["min"] == values[i].min()
+        assert stats["max"] == values[i].max()
+        assert stats["sum"] == pytest.approx(values[i].sum())
+        # Same as SQL percentile_cont(0.5): mean of the middle elements
+        assert stats["median"] == pytest.approx(np.median(values[i]))
+        assert stats["mean"] == pytest.approx(values[i].mean())
+        assert stats["std"] == pytest.approx(values[i].std())
+        assert stats["percentiles"]["p90"] == pytest.approx(
+            np.quantile(values[i], 0.9)
+        )
+
+
+def test_describe_without_samples():
+    result = describe(np.empty((3, 0)), extended=True, percentiles={"p50": 0.5})
+    assert result["x"] == {
+        "min": 0.0,
+        "max": 0.0,
+        "count": 0,
+        "sum": 0.0,
+        "median": 0.0,
+        "mean": 0.0,
+        "std": 0.0,
+        "percentiles": {"p50": 0.0},
+    }
+
+
+def test_describe_groups_matches_describe_of_every_group():
+    values = random_columns(1, 50)
+    keys = ["a", "b", "c", "b", "a"] * 10
+    result = describe_groups(keys, values)
+    assert sorted(result) == ["a", "b", "c"]
+    for group in result:
+        mask = np.array([key == group for key in keys])
+        assert result[group] == describe(values[:, mask])
+    assert describe_groups([], np.empty((3, 0))) == {}
+
+
+def test_aggregate_groups():
+    keys = np.array([5, 1, 5, 3, 1, 5])
+    values = random_columns(2, 6)
+    unique, counts, sums, mins, maxs = aggregate_groups(keys, values)
+    assert unique.tolist() == [1, 3, 5]
+    assert counts.tolist() == [2, 1, 3]
+    for j, key in enumerate(unique.tolist()):
+        group = values[:, keys == key]
+        assert sums[:, j] == pytest.approx(group.sum(axis=1))
+        assert mins[:, j].tolist() == group.min(axis=1).tolist()
+        assert maxs[:, j].tolist() == group.max(axis=1).tolist()
+
+
+def test_aggregate_groups_without_samples():
+    unique, counts, sums, mins, maxs = aggregate_groups(
+        np.empty(0, dtype=np.int64), np.empty((3, 0))
+    )
+    assert len(unique) == len(counts) == 0
+    assert sums.shape == mins.shape == maxs.shape == (3, 0)
+
+
+def reference_lttb(times, values, threshold):
+    # Point by point LTTB over the same buckets as src.stats.lttb
+    count = len(times)
+    bounds = np.linspace(1, count - 1, threshold - 1).astype(np.int64).tolist()
+    kept = [0]
+    for bucket in range(threshold - 2):
+        start, end = bounds[bucket], bounds[bucket + 1]
+        if bucket + 2 < len(bounds):
+            next_start, next_end = end, bounds[bucket + 2]
+        else:
+            next_start, next_end = count - 1, count
+        next_time = np.mean(times[next_start:next_end])
+        next_values = values[:, next_start:next_end].mean(axis=1)
+        anchor = kept[-1]
+        best, best_area = start, -1.0
+        for i in range(start, end):
+            area = 0.0
+            for axis in range(values.shape[0]):
+                a_t, a_v = times[anchor], values[axis, anchor]
+                b_t, b_v = times[i], values[axis, i]
+                c_t, c_v = next_time, next_values[axis]
+                area += abs((b_t - a_t) * (c_v - a_v) - (c_t - a_t) * (b_v - a_v))
+            if area > best_area:
+                best, best_area = i, area
+        kept.append(best)
+    kept.append(count - 1)
+    return kept
+
+
+@pytest.mark.parametrize("count, threshold", [(100, 10), (1000, 37), (50, 49)])
+def test_lttb_matches_reference(count, threshold):
+    rng = np.random.default_rng(count)
+    times = np.cumsum(rng.uniform(0.5, 1.5, size=count))
+    values = rng.normal(size=(3, count)).cumsum(axis=1)
+    kept = lttb(times, values, threshold)
+    assert kept.tolist() == reference_lttb(times, values, threshold)
+    assert len(kept) == threshold
+    assert np.all(np.diff(kept) > 0)
+
+
+def test_lttb_keeps_spikes():
+    times = np.arange(1000, dtype=np.float64)
+    values = np.zeros((3, 1000))
+    values[1, 417] = 100.0
+    assert 417 in lttb(times, values, 20).tolist()
+
+
+def test_lttb_small_series_and_threshold():
+    times = np.arange(5, dtype=np.float64)
+    values = np.zeros((3, 5))
+    assert lttb(times, values, 5).tolist() == [0, 1, 2, 3, 4]
+    assert lttb(times, values, 10).tolist() == [0, 1, 2, 3, 4]
+    with pytest.raises(ValueError):
+        lttb(times, values, 2)
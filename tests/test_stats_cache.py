@@ -0,0 +1,146 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional
+import uuid
+
+from pydantic import BaseModel
+import pytest
+
+from src.stats_cache import StatsResultCache
+
+DEVICE = uuid.uuid4()
+OTHER_DEVICE = uuid.uuid4()
+
+
+class Result(BaseModel):
+    value: int
+
+
+def counting_compute() -> Callable[[], Awaitable[Result]]:
+    calls = 0
+
+    async def compute() -> Result:
+        nonlocal calls
+        calls += 1
+        return Result(value=calls)
+
+    return compute
+
+
+@pytest.fixture
+def cache():
+    return StatsResultCache(max_size=100, closed_after=300)
+
+
+def get(
+    cache: StatsResultCache,
+    compute: Callable[[], Awaitable[Result]],
+    end_date: Optional[datetime] = None,
+    device_ids: Optional[List[uuid.UUID]] = None,
+) -> int:
+    result = asyncio.run(
+        cache.get_or_compute(
+            "stats", device_ids or [DEVICE], end_date, Result, compute
+        )
+    )
+    return result.value
+
+
+def test_is_closed(cache):
+    assert not cache.is_closed(None)
+    assert not cache.is_closed(datetime.now())
+    assert cache.is_closed(datetime.now() - timedelta(hours=1))
+
+
+def test_results_are_cached(cache):
+    compute = counting_compute()
+    assert get(cache, compute) == 1
+    assert get(cache, compute) == 1
+    assert cache.computations == 1
+
+
+def test_writes_invalidate_open_windows_of_their_devices(cache):
+    compute = counting_compute()
+    get(cache, compute)
+    cache.measurements_changed({OTHER_DEVICE: datetime.now()})
+    assert get(cache, compute) == 1
+    cache.measurements_changed({DEVICE: datetime.now()})
+    assert get(cache, compute) == 2
+
+
+def test_only_late_writes_invalidate_closed_windows(cache):
+    compute = counting_compute()
+    end_date = datetime.now() - timedelta(hours=1)
+    get(cache, compute, end_date)
+    cache.measurements_changed({DEVICE: datetime.now()})
+    assert get(cache, compute, end_date) == 1
+    cache.measurements_changed({DEVICE: datetime.now() - timedelta(days=1)})
+    assert get(cache, compute, end_date) == 2
+
+
+def test_invalidate_all(cache):
+    compute = counting_compute()
+    get(cache, compute, datetime.now() - timedelta(hours=1))
+    cache.invalidate_all()
+    assert get(cache, compute, datetime.now() - timedelta(hours=1)) == 2
+
+
+def test_concurrent_requests_are_coalesced(cache):
+    calls = 0
+
+    async def compute() -> Result:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return Result(value=calls)
+
+    async def run():
+        return await asyncio.gather(
+            *(
+                cache.get_or_compute("stats", [DEVICE], None, Result, compute)
+                for _ in range(5)
+            )
+        )
+
+    assert [result.value for result in asyncio.run(run())] == [1] * 5
+    assert cache.computations == 1
+    assert cache.coalesced == 4
+
+
+def test_errors_reach_coalesced_requests_and_are_not_cached(cache):
+    async def failing() -> Result:
+        await asyncio.sleep(0.01)
+        raise RuntimeError("database is down")
+
+    async def run():
+        return await asyncio.gather(
+            *(
+                cache.get_or_compute("stats", [DEVICE], None, Result, failing)
+                for _ in range(3)
+            ),
+            return_exceptions=True,
+        )
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(run()))
+    assert cache.stats()["in_flight"] == 0
+    assert get(cache, counting_compute()) == 1
+
+
+def test_waiter_computes_when_the_computing_request_is_cancelled(cache):
+    async def slow() -> Result:
+        await asyncio.sleep(10)
+        return Result(value=0)
+
+    async def run() -> Result:
+        first = asyncio.create_task(
+            cache.get_or_compute("stats", [DEVICE], None, Result, slow)
+        )
+        await asyncio.sleep(0)
+        second = asyncio.create_task(
+            cache.get_or_compute("stats", [DEVICE], None, Result, counting_compute())
+        )
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()).value == 1
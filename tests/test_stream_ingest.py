@@ -0,0 +1,111 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, List, Optional
+
+import pytest
+
+from src.routes.devices.exceptions import UnsupportedMediaTypeException
+from src.routes.devices.stream_ingest import (
+    STREAM_INGEST_MAX_LINE_LENGTH,
+    CsvLineParser,
+    get_line_parser,
+    iter_lines,
+    parse_ndjson_line,
+)
+
+
+def split_lines(chunks: List[bytes]) -> List[Optional[bytes]]:
+    async def body() -> AsyncIterator[bytes]:
+        for chunk in chunks:
+            yield chunk
+
+    async def collect() -> List[Optional[bytes]]:
+        return [line async for line in iter_lines(body())]
+
+    return asyncio.run(collect())
+
+
+def test_iter_lines_joins_lines_split_across_chunks():
+    assert split_lines([b"a,b\nc", b",d\n", b"e"]) == [b"a,b", b"c,d", b"e"]
+
+
+def test_iter_lines_ignores_trailing_whitespace():
+    assert split_lines([b"a\n", b"  "]) == [b"a"]
+
+
+def test_iter_lines_reports_oversized_lines():
+    long_line = b"x" * (STREAM_INGEST_MAX_LINE_LENGTH + 1)
+    assert split_lines([b"a\n", long_line, b"\nb\n"]) == [b"a", None, b"b"]
+    assert split_lines([long_line[:10], long_line[10:]]) == [None]
+
+
+def test_parse_ndjson_line():
+    assert parse_ndjson_line(
+        b'{"x": 1, "y": 2.5, "z": -3, "timestamp": "2025-02-10T12:00:00"}'
+    ) == (datetime(2025, 2, 10, 12), 1.0, 2.5, -3.0)
+    assert parse_ndjson_line(b'{"x": 1, "y": 2, "z": 3}') == (None, 1.0, 2.0, 3.0)
+
+
+def test_parse_ndjson_line_converts_aware_timestamps_to_local_time():
+    timestamp = datetime(2025, 2, 10, 12, tzinfo=timezone(timedelta(hours=3)))
+    line = f'{{"x": 1, "y": 2, "z": 3, "timestamp": "{timestamp.isoformat()}"}}'
+    parsed = parse_ndjson_line(line.encode())[0]
+    assert parsed is not None and parsed.tzinfo is None
+    assert parsed == timestamp.astimezone().replace(tzinfo=None)
+
+
+@pytest.mark.parametrize(
+    "line, error",
+    [
+        (b'{"x": 1, "y": 2}', KeyError),
+        (b'{"x": true, "y": 2, "z": 3}', ValueError),
+        (b'{"x": NaN, "y": 2, "z": 3}', ValueError),
+        (b'{"x": "a", "y": 2, "z": 3}', ValueError),
+        (b'{"x": 1, "y": 2, "z": 3, "timestamp": "yesterday"}', ValueError),
+        (b"not json", ValueError),
+    ],
+)
+def test_parse_ndjson_line_rejects_invalid_lines(line, error):
+    with pytest.raises(error):
+        parse_ndjson_line(line)
+
+
+def test_csv_parser_default_columns():
+    parse = CsvLineParser()
+    assert parse(b"1, 2, 3, 2025-02-10T12:00:00") == (
+        datetime(2025, 2, 10, 12),
+        1.0,
+        2.0,
+        3.0,
+    )
+    assert parse(b"4,5,6") == (None, 4.0, 5.0, 6.0)
+
+
+def test_csv_parser_header_reorders_columns():
+    parse = CsvLineParser()
+    assert parse(b"timestamp,z,y,x") is None
+    assert parse(b"2025-02-10T12:00:00,3,2,1") == (
+        datetime(2025, 2, 10, 12),
+        1.0,
+        2.0,
+        3.0,
+    )
+    # Only the first line may be a header
+    with pytest.raises(ValueError):
+        parse(b"timestamp,z,y,x")
+
+
+def test_csv_parser_rejects_invalid_lines():
+    parse = CsvLineParser()
+    with pytest.raises(ValueError):
+        parse(b"1,2,inf")
+    with pytest.raises(KeyError):
+        parse(b"1,2")
+
+
+def test_get_line_parser():
+    assert get_line_parser("application/x-ndjson") is parse_ndjson_line
+    assert get_line_parser("Application/JSONL; charset=utf-8") is parse_ndjson_line
+    assert isinstance(get_line_parser("text/csv; charset=utf-8"), CsvLineParser)
+    with pytest.raises(UnsupportedMediaTypeException):
+        get_line_parser("application/json")